@@ -3,6 +3,7 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { jsPDF } from 'jspdf';
 import './LogSheet.css'; // Assuming you have a CSS file for styling
+import { primaryPinHeaders } from '../primaryPin.js';
 
 function LogSheetDisplay({ tripId }) {
     const [dailyLogs, setDailyLogs] = useState(null);
@@ -646,7 +647,8 @@ function LogSheetDisplay({ tripId }) {
             setError(null); // Clear previous errors
             try {
                 // Ensure this URL is correct for your backend API
-                const response = await fetch(`${backendApiUrl}trips/${tripId}/logs/`);
+                // Right after a calculation, read the logs from the primary database (see primaryPin.js)
+                const response = await fetch(`${backendApiUrl}trips/${tripId}/logs/`, { headers: primaryPinHeaders() });
                 if (!response.ok) {
                     if (response.status === 404) {
                         throw new Error(`Logs not found for Trip ID: ${tripId}.`);
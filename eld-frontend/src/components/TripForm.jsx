@@ -3,6 +3,7 @@
 import React, { useState } from 'react';
 import axios from 'axios';
 import MapDisplay from './MapDisplay.jsx'; // Import the new MapDisplay component
+import { rememberPrimaryPin } from '../primaryPin.js';
 
 /**
  * TripForm component for entering trip details and initiating trip calculation.
@@ -20,6 +21,9 @@ function TripForm({ onTripCreatedAndCalculated }) {
   const [tripResults, setTripResults] = useState(null);
   const [isLoading, setIsLoading] = useState(false); // State for loading indicator
   const [buttonHovered, setButtonHovered] = useState(false); // State for button hover effect
+  // Autocomplete suggestions per location field, and the coordinates of a picked suggestion
+  const [suggestions, setSuggestions] = useState({ current: [], pickup: [], dropoff: [] });
+  const [pickedCoords, setPickedCoords] = useState({ current: null, pickup: null, dropoff: null });
 
   const API_BASE_URL = import.meta.env.VITE_APP_API_URL;
   // Fallback for local development if the variable isn't set (though .env.development should handle this)
@@ -27,8 +31,77 @@ function TripForm({ onTripCreatedAndCalculated }) {
 
   const backendApiUrl = API_BASE_URL || FALLBACK_LOCAL_API_URL;
 
+  /**
+   * Runs the route and log calculation through the server-sent progress stream, showing
+   * each phase as it completes. Resolves with the same data calculate_route_and_logs returns.
+   * The stream is a POST (it rewrites the trip's logs), so it is read with fetch rather
+   * than EventSource, which can only GET.
+   */
+  const calculateWithProgress = async (tripId) => {
+    const response = await fetch(`${backendApiUrl}trips/${tripId}/calculate_stream/`, {
+      method: 'POST',
+      headers: { Accept: 'text/event-stream' }, // Errors, even a 404, then arrive as an "error" event
+    });
+    rememberPrimaryPin(response.headers); // So the logs are then read back from the primary
+    const handlers = {
+      geocoded: () => setMessage(`Trip ID ${tripId} created. Locations found, calculating route...`),
+      routed: (route) => setMessage(`Trip ID ${tripId}: route found (${Math.round(route.total_distance_km)} km). Scheduling logs...`),
+      day: (day) => setMessage(`Trip ID ${tripId}: day ${day.day} (${day.date}) scheduled...`),
+      saved: () => setMessage(`Trip ID ${tripId}: logs saved.`),
+    };
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+      // Events are separated by a blank line; lines starting with ':' are keep-alive comments
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const lines = buffer.slice(0, boundary).split('\n');
+        buffer = buffer.slice(boundary + 2);
+        const name = lines.find((line) => line.startsWith('event: '))?.slice('event: '.length);
+        const data = lines.find((line) => line.startsWith('data: '))?.slice('data: '.length);
+        if (!name || data === undefined) {
+          continue;
+        }
+        const payload = JSON.parse(data);
+        if (name === 'done') {
+          reader.cancel();
+          return { data: payload };
+        }
+        if (name === 'error') {
+          reader.cancel();
+          throw new Error(payload.error || payload.detail || `Calculation failed (HTTP ${response.status}).`);
+        }
+        handlers[name]?.(payload);
+      }
+    }
+    throw new Error(response.ok ? 'Lost connection to the calculation progress stream.' : `Calculation failed (HTTP ${response.status}).`);
+  };
 
-
+  /**
+   * Updates a location field and looks up matching known places. Picking one of the
+   * suggestions keeps its coordinates, which are sent with the trip so the backend doesn't
+   * have to geocode that location.
+   */
+  const handleLocationChange = async (field, value, setValue) => {
+    setValue(value);
+    const picked = suggestions[field].find((place) => place.name === value);
+    setPickedCoords((coords) => ({ ...coords, [field]: picked ? { latitude: picked.latitude, longitude: picked.longitude } : null }));
+    if (picked || value.trim().length < 2) {
+      return;
+    }
+    try {
+      const response = await axios.get(`${backendApiUrl}trips/autocomplete/`, { params: { q: value } });
+      setSuggestions((current) => ({ ...current, [field]: response.data }));
+    } catch (error) {
+      console.error('Autocomplete failed:', error); // Typing still works without suggestions
+    }
+  };
 
   const handleSubmit = async (event) => {
     event.preventDefault(); // Prevent default form submission behavior
@@ -42,6 +115,12 @@ function TripForm({ onTripCreatedAndCalculated }) {
       dropoff_location: dropoffLocation,
       current_cycle_used_hrs: parseFloat(currentCycleUsedHrs), // Ensure numerical type
     };
+    Object.entries(pickedCoords).forEach(([field, coords]) => {
+      if (coords) {
+        tripData[`${field}_latitude`] = coords.latitude;
+        tripData[`${field}_longitude`] = coords.longitude;
+      }
+    });
 
     try {
       // Step 1: Create the trip by sending data to the backend API
@@ -50,17 +129,24 @@ function TripForm({ onTripCreatedAndCalculated }) {
         tripData
       );
 
+      rememberPrimaryPin(createTripResponse.headers);
       console.log('Trip created successfully:', createTripResponse.data);
       setMessage(`Trip ID ${createTripResponse.data.id} created successfully! Now calculating route and logs...`);
 
       // Extract the dynamically generated tripId from the first response
       const tripId = createTripResponse.data.id;
 
-      // Step 2: Calculate route and ELD logs using the obtained tripId
-      const calculateLogsResponse = await axios.post(
-        `${backendApiUrl}trips/${tripId}/calculate_route_and_logs/` // Ensure this URL matches your backend
-      );
+      // Step 2: Calculate route and ELD logs using the obtained tripId, with live progress
+      // where the browser can read streamed responses
+      const calculateLogsResponse = window.ReadableStream && window.TextDecoder
+        ? await calculateWithProgress(tripId)
+        : await axios.post(
+            `${backendApiUrl}trips/${tripId}/calculate_route_and_logs/` // Ensure this URL matches your backend
+          );
 
+      if (calculateLogsResponse.headers) {
+        rememberPrimaryPin(calculateLogsResponse.headers); // The streamed calculation keeps its own
+      }
       console.log('Route and ELD logs calculated:', calculateLogsResponse.data);
       setMessage(`Trip ID ${tripId} created, route calculated, and ELD logs generated successfully!`);
 
@@ -78,6 +164,7 @@ function TripForm({ onTripCreatedAndCalculated }) {
       setPickupLocation('');
       setDropoffLocation('');
       setCurrentCycleUsedHrs('');
+      setPickedCoords({ current: null, pickup: null, dropoff: null });
 
     } catch (error) {
       // Improved error handling to display relevant messages
@@ -158,7 +245,9 @@ function TripForm({ onTripCreatedAndCalculated }) {
             type="text"
             id="currentLocation"
             value={currentLocation}
-            onChange={(e) => setCurrentLocation(e.target.value)}
+            onChange={(e) => handleLocationChange('current', e.target.value, setCurrentLocation)}
+            list="currentLocationSuggestions"
+            autoComplete="off"
             required
             disabled={isLoading}
             placeholder="e.g., New York, NY"
@@ -174,6 +263,9 @@ function TripForm({ onTripCreatedAndCalculated }) {
             onFocus={(e) => e.target.style.borderColor = '#3b82f6'}
             onBlur={(e) => e.target.style.borderColor = '#e2e8f0'}
           />
+          <datalist id="currentLocationSuggestions">
+            {suggestions.current.map((place) => <option key={place.name} value={place.name} />)}
+          </datalist>
         </div>
 
         {/* Pickup Location */}
@@ -192,7 +284,9 @@ function TripForm({ onTripCreatedAndCalculated }) {
             type="text"
             id="pickupLocation"
             value={pickupLocation}
-            onChange={(e) => setPickupLocation(e.target.value)}
+            onChange={(e) => handleLocationChange('pickup', e.target.value, setPickupLocation)}
+            list="pickupLocationSuggestions"
+            autoComplete="off"
             required
             disabled={isLoading}
             placeholder="e.g., Chicago, IL"
@@ -208,6 +302,9 @@ function TripForm({ onTripCreatedAndCalculated }) {
             onFocus={(e) => e.target.style.borderColor = '#3b82f6'}
             onBlur={(e) => e.target.style.borderColor = '#e2e8f0'}
           />
+          <datalist id="pickupLocationSuggestions">
+            {suggestions.pickup.map((place) => <option key={place.name} value={place.name} />)}
+          </datalist>
         </div>
 
         {/* Dropoff Location */}
@@ -226,7 +323,9 @@ function TripForm({ onTripCreatedAndCalculated }) {
             type="text"
             id="dropoffLocation"
             value={dropoffLocation}
-            onChange={(e) => setDropoffLocation(e.target.value)}
+            onChange={(e) => handleLocationChange('dropoff', e.target.value, setDropoffLocation)}
+            list="dropoffLocationSuggestions"
+            autoComplete="off"
             required
             disabled={isLoading}
             placeholder="e.g., Los Angeles, CA"
@@ -242,6 +341,9 @@ function TripForm({ onTripCreatedAndCalculated }) {
             onFocus={(e) => e.target.style.borderColor = '#3b82f6'}
             onBlur={(e) => e.target.style.borderColor = '#e2e8f0'}
           />
+          <datalist id="dropoffLocationSuggestions">
+            {suggestions.dropoff.map((place) => <option key={place.name} value={place.name} />)}
+          </datalist>
         </div>
 
         {/* Current Cycle Used Hours */}
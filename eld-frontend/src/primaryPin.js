@@ -0,0 +1,24 @@
+/**
+ * Read-your-writes with database read replicas. After a write, the backend returns an
+ * X-Primary-Pin header: the time until which this client's reads must go to the primary
+ * database, which already has the write. Sending it back on reads keeps them there; the
+ * backend's own cookie isn't sent on cross-origin requests.
+ */
+let primaryPin = null;
+
+/**
+ * Keeps the pin from a write's response headers (fetch Headers or axios headers).
+ */
+export const rememberPrimaryPin = (headers) => {
+  const pin = typeof headers?.get === 'function' ? headers.get('X-Primary-Pin') : headers?.['x-primary-pin'];
+  if (pin) {
+    primaryPin = pin;
+  }
+};
+
+/**
+ * Headers to send on reads: the pin while it is still valid, otherwise none.
+ */
+export const primaryPinHeaders = () => (
+  primaryPin && Number(primaryPin) * 1000 > Date.now() ? { 'X-Primary-Pin': primaryPin } : {}
+);
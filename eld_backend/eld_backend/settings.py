@@ -159,16 +159,18 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
-from dotenv import load_dotenv
 from pathlib import Path
-import dj_database_url # Import for database configuration
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Load environment variables from .env file during local development.
 # Render automatically injects its environment variables, so this only runs locally.
-load_dotenv(os.path.join(BASE_DIR, '.env'))
+# python-dotenv is only imported when there is a .env file, to keep cold starts cheap.
+if os.path.exists(os.path.join(BASE_DIR, '.env')):
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BASE_DIR, '.env'))
 
 
 # Quick-start development settings - unsuitable for production
@@ -191,6 +193,17 @@ ALLOWED_HOSTS = [host.strip() for host in ALLOWED_HOSTS_STR.split(',') if host.s
 
 # OpenRouteService API Key
 ORS_API_KEY = os.environ.get('ORS_API_KEY')
+# OpenRouteService endpoint. Point it at a stand-in (e.g. the stub started by `manage.py loadtest`)
+# to exercise route calculation without calling the real service.
+ORS_BASE_URL = os.environ.get('ORS_BASE_URL', 'https://api.openrouteservice.org').rstrip('/')
+# Local truck stop / fuel station dataset (CSV or GeoJSON, see trips/facilities.py) used to place
+# planned fuel and rest stops at real facilities. Without it, stops are placed on the route itself.
+TRUCK_STOPS_DATASET = os.environ.get('TRUCK_STOPS_DATASET')
+# Maximum distance (km) from the route position a facility may be to be used for a stop.
+FACILITY_CORRIDOR_KM = float(os.environ.get('FACILITY_CORRIDOR_KM', 5))
+# Places (CSV: name,state,latitude,longitude) used to estimate a route offline when geocoding fails,
+# see trips/estimate.py. Defaults to the bundled list of major US cities.
+GAZETTEER_DATASET = os.environ.get('GAZETTEER_DATASET', os.path.join(BASE_DIR, 'trips', 'data', 'gazetteer.csv'))
 # Consider adding a check if ORS_API_KEY is None and DEBUG is False, to raise an error
 # if not ORS_API_KEY and not DEBUG:
 #    raise ValueError("ORS_API_KEY environment variable not set in production.")
@@ -222,6 +235,9 @@ CORS_ALLOWED_ORIGINS = [
 ]
 # Optional: If you need to allow credentials (cookies, auth headers) in CORS requests
 CORS_ALLOW_CREDENTIALS = True
+# The frontend reads the primary pin after a write and sends it back on reads (see trips/db_routing.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-primary-pin')
+CORS_EXPOSE_HEADERS = ['X-Primary-Pin']
 
 
 MIDDLEWARE = [
@@ -258,14 +274,103 @@ WSGI_APPLICATION = 'eld_backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-# Configure database for production using dj-database-url for PostgreSQL
+# Configure database for production using dj-database-url for PostgreSQL (DATABASE_URL)
 # For local development, it will default to SQLite as specified
-DATABASES = {
-    'default': dj_database_url.config(
-        default=f'sqlite:///{BASE_DIR / "db.sqlite3"}',
-        conn_max_age=600
-    )
+# dj-database-url is only imported when DATABASE_URL is set, to keep cold starts cheap.
+if os.environ.get('DATABASE_URL'):
+    import dj_database_url # Import for database configuration
+    DATABASES = {
+        'default': dj_database_url.config(conn_max_age=600)
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'CONN_MAX_AGE': 600,
+        }
+    }
+
+# Read replicas: comma-separated database URLs in the DATABASE_URL format, e.g. a Postgres
+# streaming replica, or locally a copy of the SQLite file kept fresh by `manage.py sync_sqlite_replicas`.
+# Read-only trip endpoints are served from a replica; writes, and a client's reads for
+# PRIMARY_PIN_SECONDS after it wrote a trip (so it sees what it wrote despite replication lag),
+# go to 'default'. See trips/db_routing.py.
+DATABASE_REPLICAS = []
+for replica_url in filter(None, map(str.strip, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    import dj_database_url
+    alias = f'replica_{len(DATABASE_REPLICAS)}'
+    DATABASES[alias] = dj_database_url.parse(replica_url, conn_max_age=600)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'} # Tests read what they wrote
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['trips.db_routing.PrimaryReplicaRouter']
+PRIMARY_PIN_SECONDS = float(os.environ.get('PRIMARY_PIN_SECONDS', 5))
+
+# SQLite (the default local and single-host deployment) is shared by several gunicorn workers.
+# WAL lets readers run alongside the single writer, busy_timeout/timeout make writers wait for
+# the lock instead of failing with "database is locked", and BEGIN IMMEDIATE takes the write lock
+# up front so a transaction never has to upgrade a read lock mid-way (which fails immediately).
+# synchronous=NORMAL is durable across application crashes in WAL mode and much cheaper than FULL.
+SQLITE_BUSY_TIMEOUT_SECONDS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_SECONDS', 20))
+for database in DATABASES.values():
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        continue
+    database.setdefault('OPTIONS', {}).update({
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_SECONDS * 1000};'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': SQLITE_BUSY_TIMEOUT_SECONDS,
+    })
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Run tests against a file database so concurrency tests exercise the same locking as production
+    # (the default in-memory shared-cache test database uses table locks that ignore busy_timeout).
+    DATABASES['default']['TEST'] = {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_BACKEND picks the backend for cached trip responses and graph geometry:
+# 'locmem' (default, per worker process), 'file' or 'db' (both shared between workers).
+# The 'db' backend needs its table created once with `python manage.py createcachetable`.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'eld-cache'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'eld_cache_table'),
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem').lower()
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError(f"CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}, got '{CACHE_BACKEND}'.")
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+    }
 }
+# How long (seconds) serialized trip detail and logs responses stay cached.
+# Entries are keyed by the trip's updated_at, so a saved or recalculated trip is never served from
+# an older entry; entries of old versions just expire.
+TRIP_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('TRIP_RESPONSE_CACHE_TIMEOUT', 60 * 60))
+
+# Status changes older than this many days are moved to compressed per trip-day rows by
+# `manage.py archive_logs` (see trips/archive.py). Reads are unaffected, only slower for old days.
+LOG_ARCHIVE_AFTER_DAYS = int(os.environ.get('LOG_ARCHIVE_AFTER_DAYS', 30))
+
+
+# Single-flight coordination of calculate_route_and_logs
+# Lock and result files live in SINGLE_FLIGHT_DIR, which must be shared by all worker processes
+# on a host (defaults to <tmp>/eld-singleflight).
+SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR')
+# How long a second request waits for the calculation in flight before giving up with 409.
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.environ.get('SINGLE_FLIGHT_WAIT_SECONDS', 120))
+# How long a finished result is reused by identical requests (double-clicks, retries).
+SINGLE_FLIGHT_RESULT_TTL = float(os.environ.get('SINGLE_FLIGHT_RESULT_TTL', 30))
+
+# Staff users can profile any trip request with an `X-Profile: 1` header or `?profile=1`
+# (see trips/profiling.py). The newest PROFILE_RING_SIZE reports are kept, viewable in the admin.
+PROFILE_RING_SIZE = int(os.environ.get('PROFILE_RING_SIZE', 50))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eld_backend.settings')
 
 application = get_wsgi_application()
+
+# Import the URLconf (and with it DRF and the trips views) while the worker boots rather than
+# on its first request. This moves the cost rather than removing it: a fresh instance takes as
+# long to its first response either way. With gunicorn's preload_app (see gunicorn.conf.py) it is
+# paid once in the master, and workers forked later (restarts, recycling) start warm.
+# Nothing here may touch the database: connections must not be shared with forked workers.
+# Set WARM_START=False to disable.
+if os.environ.get('WARM_START', 'True').lower() == 'true':
+    from django.urls import get_resolver
+    get_resolver().url_patterns
@@ -0,0 +1,7 @@
+# eld_backend/gunicorn.conf.py
+# Picked up automatically when gunicorn is started from this directory.
+
+# Load the application once in the master before forking, so workers forked later (e.g. after a
+# crash or a max_requests recycle) start with everything already imported. A fresh instance still
+# pays the import cost once, in the master.
+preload_app = True
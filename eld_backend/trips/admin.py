@@ -1,3 +1,33 @@
+# eld_backend/trips/admin.py
 from django.contrib import admin
+from django.utils.html import format_html
+from .models import RequestProfile
 
-# Register your models here.
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the profiles recorded for staff requests (see trips/profiling.py).
+    """
+    list_display = ('created_at', 'method', 'path', 'action', 'status_code', 'duration_ms', 'user')
+    list_filter = ('action', 'method')
+    search_fields = ('path',)
+    fields = ('created_at', 'user', 'method', 'path', 'action', 'status_code', 'duration_ms', 'time_by_area', 'formatted_report')
+    readonly_fields = fields
+
+    @admin.display(description="Time by area (own time)")
+    def time_by_area(self, profile):
+        return format_html(
+            "<pre>{}</pre>",
+            "\n".join(f"{area:<12}{ms:>10.1f} ms" for area, ms in profile.area_ms.items()),
+        )
+
+    @admin.display(description="Report")
+    def formatted_report(self, profile):
+        return format_html("<pre>{}</pre>", profile.report)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,137 @@
+# eld_backend/trips/archive.py
+"""
+Hot/cold storage of duty status changes.
+
+Recent status changes live in DutyStatusEvent (the hot table). `manage.py archive_logs`
+moves every trip-day older than the archive horizon into one ArchivedLogDay row, so the
+hot table and its index only hold the weeks drivers and dispatch actually look at.
+
+A day is packed column by column: the event count, the timestamps as little-endian int64
+microsecond deltas (the first one from the Unix epoch), then one status code byte per
+event, all zlib-compressed. Readers put the archived events in front of the hot ones and
+materialize the log exactly as before.
+
+Like trips/audit.py, this module doesn't import the models at import time.
+"""
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import itemgetter
+from django.utils import timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# Status codes are stored in archived rows: only ever append to this tuple
+ARCHIVE_STATUSES = ('DRIVING', 'ON_DUTY_NOT_DRIVING', 'OFF_DUTY', 'SLEEPER_BERTH')
+STATUS_CODES = {status: code for code, status in enumerate(ARCHIVE_STATUSES)}
+COMPRESSION_LEVEL = 9 # Written once, read rarely
+
+
+def _microseconds(moment):
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def pack_events(events):
+    """
+    Packs [(timestamp, status)] (aware datetimes, in time order) into a compressed blob.
+    """
+    count = len(events)
+    deltas, previous = [], 0
+    for timestamp, _ in events:
+        current = _microseconds(timestamp)
+        deltas.append(current - previous)
+        previous = current
+    payload = (
+        struct.pack('<I', count)
+        + struct.pack(f'<{count}q', *deltas)
+        + bytes(STATUS_CODES[status] for _, status in events)
+    )
+    return zlib.compress(payload, COMPRESSION_LEVEL)
+
+
+def unpack_events(blob):
+    """
+    The [(timestamp, status)] packed by pack_events, with UTC timestamps.
+    """
+    payload = zlib.decompress(bytes(blob)) # Postgres returns memoryview for bytea
+    (count,) = struct.unpack_from('<I', payload)
+    deltas = struct.unpack_from(f'<{count}q', payload, 4)
+    codes = payload[4 + 8 * count:]
+    events, current = [], 0
+    for delta, code in zip(deltas, codes):
+        current += delta
+        events.append((EPOCH + timedelta(microseconds=current), ARCHIVE_STATUSES[code]))
+    return events
+
+
+def trip_archived_events(trip):
+    """
+    A trip's archived status changes in time order. Uses prefetched archived_days when
+    the queryset has them.
+    """
+    events = []
+    for day in trip.archived_days.all():
+        events.extend(unpack_events(day.events))
+    return events
+
+
+def archived_events_by_trip(trip_ids):
+    """
+    {trip_id: [(timestamp, status)]} for the trips among trip_ids that have archived days,
+    in one query.
+    """
+    from .models import ArchivedLogDay
+    rows = (
+        ArchivedLogDay.objects.filter(trip_id__in=trip_ids)
+        .order_by('trip_id', 'log_date')
+        .values_list('trip_id', 'events')
+    )
+    archived = {}
+    for trip_id, trip_rows in groupby(rows, key=itemgetter(0)):
+        archived[trip_id] = [event for _, blob in trip_rows for event in unpack_events(blob)]
+    return archived
+
+
+def archive_cutoff(days):
+    """
+    Local midnight `days` days ago: status changes before it are archived, so whole days move.
+    """
+    today = timezone.localdate()
+    return timezone.make_aware(datetime.combine(today - timedelta(days=days), datetime.min.time()))
+
+
+def archive_trips(trip_ids, cutoff, batch_size=5000):
+    """
+    Moves the status changes before `cutoff` of the given trips into ArchivedLogDay rows,
+    merging with any day archived before. The trips are locked like a log regeneration, so
+    the two never interleave. Returns (days, events) archived.
+    """
+    from django.db import transaction
+    from .models import Trip, DutyStatusEvent, ArchivedLogDay
+
+    with transaction.atomic():
+        list(Trip.objects.select_for_update().filter(pk__in=trip_ids).values_list('pk', flat=True))
+        old_events = DutyStatusEvent.objects.filter(trip_id__in=trip_ids, timestamp__lt=cutoff)
+        rows = old_events.order_by('trip_id', 'timestamp').values_list('trip_id', 'timestamp', 'status')
+
+        days = {}
+        for row in rows.iterator(chunk_size=batch_size):
+            days.setdefault((row[0], timezone.localtime(row[1]).date()), []).append(row[1:])
+        if not days:
+            return 0, 0
+        existing = ArchivedLogDay.objects.filter(
+            trip_id__in={trip_id for trip_id, _ in days}, log_date__in={log_date for _, log_date in days},
+        )
+        merged_ids = []
+        for day in existing:
+            if (day.trip_id, day.log_date) in days:
+                days[day.trip_id, day.log_date] = sorted(unpack_events(day.events) + days[day.trip_id, day.log_date])
+                merged_ids.append(day.pk)
+        ArchivedLogDay.objects.filter(pk__in=merged_ids).delete()
+        ArchivedLogDay.objects.bulk_create([
+            ArchivedLogDay(trip_id=trip_id, log_date=log_date, event_count=len(events), events=pack_events(events))
+            for (trip_id, log_date), events in days.items()
+        ], batch_size=batch_size)
+        archived_events = old_events.delete()[0]
+    return len(days), archived_events
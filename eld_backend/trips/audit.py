@@ -0,0 +1,242 @@
+# eld_backend/trips/audit.py
+"""
+Hours-of-service audit of stored logs.
+
+HOSAudit checks one trip's segments in a single pass in start-time order, keeping only
+running totals: driving and window start of the current shift (a shift ends after
+MIN_OFF_DUTY_HOURS of consecutive off-duty/sleeper time), driving since the last break
+and the on-duty hours inside the trailing cycle window. feed_events turns a trip's raw status
+changes into those segments and checks the stream itself: changes that don't come after the
+previous one, and changes at or after the end of the log, which no segment would show.
+
+audit_trip_chunk is the unit of work of `manage.py audit_hos`: it streams the status
+changes of a batch of trips and replaces their findings in bulk. This module doesn't import the
+models at import time, so worker processes can load it before Django is set up.
+"""
+from collections import deque, namedtuple
+from datetime import timedelta
+from itertools import chain, groupby
+from operator import itemgetter
+from .archive import archived_events_by_trip
+
+HOSRules = namedtuple('HOSRules', [
+    'max_driving_hours', # Per shift
+    'max_duty_window_hours', # No driving after this long since the shift started
+    'max_cycle_hours',
+    'cycle_days',
+    'min_off_duty_hours', # Consecutive rest that starts a new shift
+    'min_break_hours', # Non-driving time that resets the break clock
+    'max_driving_before_break_hours',
+])
+
+DRIVING = 'DRIVING'
+REST_STATUSES = ('OFF_DUTY', 'SLEEPER_BERTH')
+
+
+def _hours(delta):
+    return delta.total_seconds() / 3600
+
+
+class HOSAudit:
+    """
+    Feed one trip's segments in start-time order, then read `findings`: a list of dicts
+    with rule, occurred_at, observed_hours, limit_hours and detail. A violation that keeps
+    going (e.g. driving on past the limit) is one finding whose observed_hours grows.
+    """
+    def __init__(self, rules, prior_cycle_hours=0.0):
+        self.rules = rules
+        self.findings = []
+        self.segments = 0
+        # Hours worked before the trip are assumed to have ended just before its first entry
+        self._prior_cycle_hours = prior_cycle_hours
+        self._first_start = None
+        self._rest_run = 0.0 # Consecutive off-duty/sleeper hours
+        self._non_driving_run = 0.0 # Consecutive hours of anything but driving
+        self._shift_start = None
+        self._shift_driving = 0.0
+        self._driving_since_break = 0.0
+        self._open = {} # rule -> finding still being extended in the current shift/episode
+        self._cycle_segments = deque() # On-duty (start, end, hours) inside the cycle window
+        self._cycle_hours = 0.0
+
+    def _record(self, rule, occurred_at, observed_hours, limit_hours, detail=''):
+        finding = {
+            "rule": rule, "occurred_at": occurred_at, "observed_hours": round(observed_hours, 4),
+            "limit_hours": limit_hours, "detail": detail,
+        }
+        self.findings.append(finding)
+        return finding
+
+    def _extend(self, rule, occurred_at, observed_hours, limit_hours, detail=''):
+        """
+        Records a violation of `rule`, or raises the observed hours of the one already open.
+        """
+        finding = self._open.get(rule)
+        if finding is None:
+            self._open[rule] = self._record(rule, occurred_at, observed_hours, limit_hours, detail)
+        else:
+            finding["observed_hours"] = round(max(finding["observed_hours"], observed_hours), 4)
+
+    def feed(self, start, end, status):
+        rules = self.rules
+        self.segments += 1
+        if self._first_start is None:
+            self._first_start = start
+
+        hours = _hours(end - start)
+        if status in REST_STATUSES:
+            self._rest(hours)
+            return
+
+        self._rest_run = 0.0
+        if self._shift_start is None:
+            self._shift_start = start
+        self._add_cycle_hours(start, end, hours)
+
+        if status != DRIVING:
+            self._non_driving_run += hours
+            if self._non_driving_run >= rules.min_break_hours:
+                self._driving_since_break = 0.0
+                self._open.pop('BREAK_REQUIRED', None)
+            return
+
+        self._non_driving_run = 0.0
+        self._shift_driving += hours
+        self._driving_since_break += hours
+
+        if self._shift_driving > rules.max_driving_hours:
+            over = self._shift_driving - rules.max_driving_hours
+            self._extend('DRIVING_LIMIT', max(start, end - timedelta(hours=over)), self._shift_driving,
+                         rules.max_driving_hours, "Driving hours in the shift")
+
+        window_end = self._shift_start + timedelta(hours=rules.max_duty_window_hours)
+        if end > window_end:
+            self._extend('DUTY_WINDOW', max(start, window_end), _hours(end - self._shift_start),
+                         rules.max_duty_window_hours, "Hours since the shift started, at the end of driving")
+
+        if self._driving_since_break > rules.max_driving_before_break_hours:
+            over = self._driving_since_break - rules.max_driving_before_break_hours
+            self._extend('BREAK_REQUIRED', max(start, end - timedelta(hours=over)), self._driving_since_break,
+                         rules.max_driving_before_break_hours, "Driving hours without a break")
+
+    def feed_events(self, events, log_end_time):
+        """
+        Feeds a trip's status changes [(timestamp, status)] in stored order, each lasting until
+        the next and the last until log_end_time. A change at or before the previous one (a
+        duplicate timestamp, or a day both archived and still in the hot table) is a LOG_OVERLAP
+        finding and skipped; changes at or after log_end_time, or with no log end at all, are
+        one LOG_AFTER_END finding.
+        """
+        previous = None
+        for timestamp, status in events:
+            if log_end_time is None or timestamp >= log_end_time:
+                self._extend('LOG_AFTER_END', timestamp, _hours(timestamp - log_end_time) if log_end_time else 0.0,
+                             0.0, "Status changes after the end of the log" if log_end_time else "The log has no end time")
+                continue
+            if previous is not None:
+                if timestamp <= previous[0]:
+                    self._record('LOG_OVERLAP', timestamp, _hours(previous[0] - timestamp), 0.0,
+                                 "Status change at or before the previous one")
+                    continue
+                self.feed(previous[0], timestamp, previous[1])
+            previous = (timestamp, status)
+        if previous is not None:
+            self.feed(previous[0], log_end_time, previous[1])
+
+    def _rest(self, hours):
+        self._rest_run += hours
+        self._non_driving_run += hours
+        if self._non_driving_run >= self.rules.min_break_hours:
+            self._driving_since_break = 0.0
+            self._open.pop('BREAK_REQUIRED', None)
+        if self._rest_run >= self.rules.min_off_duty_hours:
+            self._shift_start = None
+            self._shift_driving = 0.0
+            self._open.pop('DRIVING_LIMIT', None)
+            self._open.pop('DUTY_WINDOW', None)
+
+    def _add_cycle_hours(self, start, end, hours):
+        """
+        Two-pointer sliding window: segments leave the deque once the window has passed them,
+        and only the oldest one can be partly outside it.
+        """
+        rules = self.rules
+        self._cycle_segments.append((start, end, hours))
+        self._cycle_hours += hours
+        window_start = end - timedelta(days=rules.cycle_days)
+        while self._cycle_segments[0][1] <= window_start:
+            self._cycle_hours -= self._cycle_segments.popleft()[2]
+        oldest_start = self._cycle_segments[0][0]
+        in_window = self._cycle_hours - max(0.0, _hours(window_start - oldest_start))
+        if window_start < self._first_start:
+            in_window += self._prior_cycle_hours
+
+        if in_window > rules.max_cycle_hours:
+            over = in_window - rules.max_cycle_hours
+            self._extend('CYCLE_LIMIT', max(start, end - timedelta(hours=over)), in_window,
+                         rules.max_cycle_hours, f"On-duty hours in {rules.cycle_days} days")
+        else:
+            self._open.pop('CYCLE_LIMIT', None)
+
+
+def init_worker():
+    """
+    Pool initializer: set Django up in spawned workers and drop any database connection
+    inherited from a forked parent.
+    """
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    from django.db import connections
+    connections.close_all()
+
+
+def _trip_events(rows, archived):
+    """
+    Yields (trip_id, iterable of (timestamp, status)) from rows of (trip_id, timestamp, status) grouped
+    by trip, each trip's archived events first.
+    """
+    for trip_id, trip_rows in groupby(rows, key=itemgetter(0)):
+        yield trip_id, chain(archived.pop(trip_id, ()), (row[1:] for row in trip_rows))
+    # Trips whose status changes have all been archived have no hot rows
+    yield from archived.items()
+
+
+def audit_trip_chunk(task):
+    """
+    Audits the trips in task = (trip_ids, rules, batch_size) and replaces their findings.
+    Hot status changes are streamed in batch_size chunks, ordered so each trip's are
+    contiguous, after the trip's archived ones (see HOSAudit.feed_events).
+    Returns (trips, segments, {rule: findings}).
+    """
+    from django.db import transaction
+    from .models import Trip, DutyStatusEvent, AuditFinding
+
+    trip_ids, rules, batch_size = task
+    trips = {
+        trip_id: (current_cycle_used or 0.0, log_end_time)
+        for trip_id, current_cycle_used, log_end_time
+        in Trip.objects.filter(pk__in=trip_ids).values_list('pk', 'current_cycle_used', 'log_end_time')
+    }
+    rows = (
+        DutyStatusEvent.objects.filter(trip_id__in=trips.keys())
+        .order_by('trip_id', 'timestamp')
+        .values_list('trip_id', 'timestamp', 'status')
+        .iterator(chunk_size=batch_size)
+    )
+
+    findings, segments, counts = [], 0, {}
+    for trip_id, events in _trip_events(rows, archived_events_by_trip(trips.keys())):
+        prior_cycle_hours, log_end_time = trips[trip_id]
+        audit = HOSAudit(rules, prior_cycle_hours)
+        audit.feed_events(events, log_end_time)
+        segments += audit.segments
+        for finding in audit.findings:
+            counts[finding["rule"]] = counts.get(finding["rule"], 0) + 1
+            findings.append(AuditFinding(trip_id=trip_id, **finding))
+
+    with transaction.atomic():
+        AuditFinding.objects.filter(trip_id__in=trips.keys()).delete()
+        AuditFinding.objects.bulk_create(findings, batch_size=batch_size)
+    return len(trips), segments, counts
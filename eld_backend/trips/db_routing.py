@@ -0,0 +1,91 @@
+# eld_backend/trips/db_routing.py
+"""
+Read/write splitting between the primary database ('default') and the read replicas in
+settings.DATABASE_REPLICAS.
+
+Replica reads are opt-in per request: TripViewSet enables them for its read-only actions,
+and everything else (writes, calculations, the admin, migrations) stays on the primary.
+All reads of a request go to the same replica, so they see one consistent point in time.
+
+Replicas lag behind the primary, so TripViewSet pins a client that has just written to the
+primary for PRIMARY_PIN_SECONDS, and it reads back what it wrote. The pin is returned both
+as a cookie (for same-site clients) and as an X-Primary-Pin header holding the time it
+expires, which cross-origin clients send back on their reads. Neither depends on the cache
+being shared between workers.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+PRIMARY = 'default'
+REPLICA_APP_LABELS = ('trips',) # Sessions, auth and the db cache table always use the primary
+PIN_COOKIE = 'db_primary_pin'
+PIN_HEADER = 'X-Primary-Pin'
+
+# The replica a request reads from, or None. A ContextVar rather than a thread-local so it
+# doesn't leak into threads or tasks the request starts.
+_replica = ContextVar('replica', default=None)
+
+
+def replica_reads_enabled():
+    return _replica.get() is not None
+
+
+@contextmanager
+def reading_from_replicas(enabled=True):
+    token = _replica.set(random.choice(settings.DATABASE_REPLICAS) if enabled and settings.DATABASE_REPLICAS else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def allow_replica_reads():
+    """
+    Sends reads to a randomly picked replica until the enclosing reading_from_replicas() block ends.
+    """
+    if settings.DATABASE_REPLICAS:
+        _replica.set(random.choice(settings.DATABASE_REPLICAS))
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads of trips models to the request's replica while replica reads are enabled;
+    every write, and every read outside of them, goes to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is not None and model._meta.app_label in REPLICA_APP_LABELS:
+            return replica
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Replicas hold the same data as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and are never migrated themselves
+        return db == PRIMARY
+
+
+def pin_to_primary(response):
+    """
+    Keeps the client's reads on the primary for PRIMARY_PIN_SECONDS, through the cookie and
+    the X-Primary-Pin header (see the module docstring).
+    """
+    timeout = settings.PRIMARY_PIN_SECONDS
+    response[PIN_HEADER] = f"{time.time() + timeout:.3f}"
+    response.set_cookie(PIN_COOKIE, '1', max_age=timeout, httponly=True, samesite='Lax')
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    try:
+        return float(request.headers.get(PIN_HEADER, 0)) > time.time()
+    except ValueError:
+        return False
@@ -0,0 +1,151 @@
+# eld_backend/trips/estimate.py
+"""
+Offline route estimates for when geocoding or routing through ORS fails.
+
+Locations are resolved from earlier successful geocodes (kept in the cache) or from the
+bundled gazetteer of US cities (settings.GAZETTEER_DATASET, CSV: name,state,latitude,longitude).
+Each leg's road distance is the great-circle distance times a detour factor, and its
+duration follows an HGV speed profile: slow for the first kilometres out of and into a
+city, highway speed for the rest. The geometry is the straight line through the stops.
+
+Everything is in-memory arithmetic, so an estimate costs microseconds.
+"""
+import csv
+import hashlib
+import os
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import cache
+from .facilities import haversine_km
+
+GEOCODE_CACHE_TIMEOUT = 60 * 60 * 24 * 90 # Places don't move
+COUNTRY_SUFFIXES = ('usa', 'us', 'united states', 'united states of america')
+
+# Road distance over great-circle distance: high for short urban hops, lower between
+# distant cities connected by interstates (New York-Chicago is 1.11). Interpolated
+# linearly between these points.
+DETOUR_FACTORS = ((0, 1.4), (50, 1.3), (300, 1.2), (1000, 1.15))
+# HGV speed profile: the first and last URBAN_KM of a leg are driven on city streets and
+# arterials, the rest at highway cruising speed.
+URBAN_KM = 15
+URBAN_SPEED_KMH = 35
+HIGHWAY_SPEED_KMH = 88 # ~55 mph, typical governed truck speed including grades and traffic
+
+
+class RouteUnavailable(Exception):
+    """
+    A location needed for the route could not be found online or offline.
+    """
+
+
+def normalize_location(name):
+    """
+    Lookup key for a free-text location: lowercase, without periods, country suffix or ZIP
+    code, e.g. 'St. Louis, MO 63101, USA' -> 'st louis, mo'.
+    """
+    parts = [re.sub(r'\s+', ' ', part.replace('.', '')).strip().lower() for part in (name or '').split(',')]
+    parts = [part for part in parts if part]
+    while len(parts) > 1 and parts[-1] in COUNTRY_SUFFIXES:
+        parts.pop()
+    if len(parts) > 1:
+        parts[-1] = re.sub(r'\s*\d{5}(-\d{4})?$', '', parts[-1]) # State followed by a ZIP code
+    return ', '.join(part for part in parts if part)
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer():
+    """
+    [(name, [lon, lat])] of the gazetteer places, names as 'City, ST'. Loaded on first use.
+    """
+    path = settings.GAZETTEER_DATASET
+    if not path or not os.path.exists(path):
+        print(f"Gazetteer not found at '{path}'. Offline route estimates only use cached geocodes.")
+        return []
+    with open(path, newline='', encoding='utf-8') as dataset:
+        return [
+            (f"{row['name'].strip()}, {row['state'].strip()}", [float(row['longitude']), float(row['latitude'])])
+            for row in csv.DictReader(dataset)
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer():
+    """
+    {normalized 'city, st' or unambiguous 'city': [lon, lat]}.
+    """
+    places, by_city = {}, {}
+    for name, coords in load_gazetteer():
+        key = normalize_location(name)
+        places[key] = coords
+        by_city.setdefault(key.split(', ')[0], []).append(coords)
+    for city, matches in by_city.items():
+        if len(matches) == 1: # 'Portland' alone could be Oregon or Maine
+            places.setdefault(city, matches[0])
+    return places
+
+
+def _geocode_key(name):
+    # Hashed: names have spaces and any characters, which memcached keys can't
+    return "geocode:" + hashlib.sha256(normalize_location(name).encode()).hexdigest()
+
+
+def remember_location(name, coords):
+    """
+    Keeps a successful geocode ([lon, lat]) for offline estimates.
+    """
+    if normalize_location(name):
+        cache.set(_geocode_key(name), list(coords), GEOCODE_CACHE_TIMEOUT)
+
+
+def locate(name):
+    """
+    [lon, lat] for a location from an earlier geocode or the gazetteer, or None.
+    """
+    key = normalize_location(name)
+    if not key:
+        return None
+    coords = cache.get(_geocode_key(name))
+    if coords is None:
+        gazetteer = get_gazetteer()
+        coords = gazetteer.get(key) or gazetteer.get(key.split(', ')[0])
+    return coords
+
+
+def detour_factor(straight_km):
+    for (low_km, low_factor), (high_km, high_factor) in zip(DETOUR_FACTORS, DETOUR_FACTORS[1:]):
+        if straight_km < high_km:
+            return low_factor + (high_factor - low_factor) * (straight_km - low_km) / (high_km - low_km)
+    return DETOUR_FACTORS[-1][1]
+
+
+def driving_hours(road_km):
+    urban_km = min(road_km, 2 * URBAN_KM)
+    return urban_km / URBAN_SPEED_KMH + (road_km - urban_km) / HIGHWAY_SPEED_KMH
+
+
+def estimate_leg(origin, destination):
+    """
+    (road_km, driving_hours) between two [lon, lat] points.
+    """
+    straight_km = haversine_km(origin[1], origin[0], destination[1], destination[0])
+    road_km = straight_km * detour_factor(straight_km)
+    return road_km, driving_hours(road_km)
+
+
+def estimate_route(points):
+    """
+    route_info fields (path_coordinates, total_distance_km, total_duration_hours_driving)
+    for driving through the [lon, lat] points in order, plus "estimated": True.
+    """
+    total_km = total_hours = 0.0
+    for origin, destination in zip(points, points[1:]):
+        road_km, hours = estimate_leg(origin, destination)
+        total_km += road_km
+        total_hours += hours
+    return {
+        "path_coordinates": [list(point) for point in points],
+        "total_distance_km": total_km,
+        "total_duration_hours_driving": total_hours,
+        "estimated": True,
+    }
@@ -0,0 +1,191 @@
+# eld_backend/trips/facilities.py
+"""
+Truck stop / fuel station lookup for placing planned stops at real facilities.
+
+The dataset is a local file named by settings.TRUCK_STOPS_DATASET, either
+- CSV with a header row: name,type,latitude,longitude
+- GeoJSON FeatureCollection of Point features with "name" and "type" properties.
+`type` is free text such as "fuel", "truck_stop" or "rest_area".
+
+Facilities are bucketed in a fixed lat/lon grid, so a nearest lookup only scans the
+handful of cells covering the search radius instead of the whole dataset.
+"""
+import bisect
+import csv
+import json
+import math
+import os
+from collections import namedtuple
+from functools import lru_cache
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+GRID_CELL_DEGREES = 0.1 # ~11 km cells; a 5 km corridor lookup scans a 3x3 block
+FUEL_FACILITY_TYPES = ('fuel', 'truck_stop') # Facility types a fuel stop may snap to
+
+Facility = namedtuple('Facility', ['name', 'type', 'latitude', 'longitude'])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class FacilityIndex:
+    def __init__(self, facilities=()):
+        self._cells = {}
+        self.size = 0
+        for facility in facilities:
+            self.add(facility)
+
+    @staticmethod
+    def _cell(latitude, longitude):
+        return (math.floor(latitude / GRID_CELL_DEGREES), math.floor(longitude / GRID_CELL_DEGREES))
+
+    def add(self, facility):
+        self._cells.setdefault(self._cell(facility.latitude, facility.longitude), []).append(facility)
+        self.size += 1
+
+    def nearest(self, latitude, longitude, max_km, types=None):
+        """
+        Returns (facility, distance_km) for the closest facility within max_km,
+        optionally restricted to the given types, or (None, None).
+        """
+        lat_cells = math.ceil(max_km / (KM_PER_DEGREE_LAT * GRID_CELL_DEGREES))
+        # Longitude degrees shrink towards the poles, so more cells are needed there
+        km_per_degree_lon = KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01)
+        lon_cells = math.ceil(max_km / (km_per_degree_lon * GRID_CELL_DEGREES))
+
+        best, best_km = None, None
+        center_row, center_col = self._cell(latitude, longitude)
+        for row in range(center_row - lat_cells, center_row + lat_cells + 1):
+            for col in range(center_col - lon_cells, center_col + lon_cells + 1):
+                for facility in self._cells.get((row, col), ()):
+                    if types and facility.type not in types:
+                        continue
+                    distance_km = haversine_km(latitude, longitude, facility.latitude, facility.longitude)
+                    if distance_km <= max_km and (best_km is None or distance_km < best_km):
+                        best, best_km = facility, distance_km
+        return best, best_km
+
+
+def load_facilities(path):
+    """
+    Reads facilities from a CSV or GeoJSON file (see module docstring).
+    """
+    if path.lower().endswith(('.geojson', '.json')):
+        with open(path, encoding='utf-8') as dataset:
+            features = json.load(dataset).get('features', [])
+        return [
+            Facility(
+                name=feature.get('properties', {}).get('name', 'Unnamed facility'),
+                type=feature.get('properties', {}).get('type', 'fuel'),
+                latitude=float(feature['geometry']['coordinates'][1]), # GeoJSON is [lon, lat]
+                longitude=float(feature['geometry']['coordinates'][0]),
+            )
+            for feature in features
+            if feature.get('geometry', {}).get('type') == 'Point'
+        ]
+    with open(path, newline='', encoding='utf-8') as dataset:
+        return [
+            Facility(
+                name=row['name'],
+                type=row.get('type') or 'fuel',
+                latitude=float(row['latitude']),
+                longitude=float(row['longitude']),
+            )
+            for row in csv.DictReader(dataset)
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_facility_index():
+    """
+    The process-wide index, built on first use. Empty if no dataset is configured.
+    """
+    path = settings.TRUCK_STOPS_DATASET
+    if not path:
+        return FacilityIndex()
+    if not os.path.exists(path):
+        print(f"Truck stop dataset not found at '{path}'. Planned stops will not be snapped.")
+        return FacilityIndex()
+    index = FacilityIndex(load_facilities(path))
+    print(f"Loaded {index.size} truck stops and fuel stations from '{path}'.")
+    return index
+
+
+class RoutePath:
+    """
+    Cumulative distances along a route geometry ([lon, lat] points, as returned by ORS),
+    so positions at a given distance can be found by bisection.
+    """
+    def __init__(self, path_coordinates):
+        self.points = path_coordinates
+        self.cumulative_km = [0.0]
+        for start, end in zip(path_coordinates, path_coordinates[1:]):
+            self.cumulative_km.append(self.cumulative_km[-1] + haversine_km(start[1], start[0], end[1], end[0]))
+
+    @property
+    def length_km(self):
+        return self.cumulative_km[-1]
+
+    def point_at(self, distance_km):
+        """
+        Returns (latitude, longitude) at distance_km along the route, or None for an empty path.
+        """
+        if not self.points:
+            return None
+        distance_km = min(max(distance_km, 0.0), self.length_km)
+        i = bisect.bisect_left(self.cumulative_km, distance_km)
+        if i == 0:
+            return self.points[0][1], self.points[0][0]
+        segment_km = self.cumulative_km[i] - self.cumulative_km[i - 1]
+        fraction = (distance_km - self.cumulative_km[i - 1]) / segment_km if segment_km else 0.0
+        start, end = self.points[i - 1], self.points[i]
+        return start[1] + (end[1] - start[1]) * fraction, start[0] + (end[0] - start[0]) * fraction
+
+
+def snap_stop(stop, route_path, distance_km, types=None):
+    """
+    Places a planned stop dict at the nearest facility within the corridor around the
+    route position distance_km from the start. Without a facility in range, the stop
+    is left at the route position itself. Returns the stop.
+    """
+    position = route_path.point_at(distance_km)
+    if position is None:
+        return stop
+    latitude, longitude = position
+    facility, offset_km = get_facility_index().nearest(latitude, longitude, settings.FACILITY_CORRIDOR_KM, types)
+    if facility is None:
+        stop.update({"latitude": latitude, "longitude": longitude})
+        return stop
+    stop.update({
+        "location": facility.name,
+        "facility_type": facility.type,
+        "latitude": facility.latitude,
+        "longitude": facility.longitude,
+        "offset_from_route_km": round(offset_km, 2),
+    })
+    return stop
+
+
+def plan_fuel_stops(route_path, total_distance_km, interval_km, duration_hours):
+    """
+    A fuel stop every interval_km of the route, each placed at the nearest fuel-capable
+    facility in the corridor (or on the route itself when there is none).
+    """
+    fuel_stops = []
+    for i in range(1, int(total_distance_km // interval_km) + 1):
+        fuel_stop = {
+            "type": "fuel",
+            "location": f"Route Km {i * interval_km}",
+            "duration_hrs": duration_hours,
+            "latitude": None, # Filled in by snap_stop
+            "longitude": None
+        }
+        # The routing distance and the haversine path length differ slightly, so scale to the path
+        distance_along_path_km = route_path.length_km * (i * interval_km) / total_distance_km
+        fuel_stops.append(snap_stop(fuel_stop, route_path, distance_along_path_km, FUEL_FACILITY_TYPES))
+    return fuel_stops
@@ -0,0 +1,104 @@
+# eld_backend/trips/graph.py
+from datetime import datetime, time
+from django.core.cache import cache
+from django.utils import timezone
+from .models import DutyStatus
+from .segments import get_trip_segments
+
+# Row order of the four-row duty graph, top to bottom (matches LogSheet.jsx)
+GRAPH_ROWS = [
+    DutyStatus.OFF_DUTY,
+    DutyStatus.SLEEPER_BERTH,
+    DutyStatus.DRIVING,
+    DutyStatus.ON_DUTY_NOT_DRIVING,
+]
+ROW_INDEX = {status: index for index, status in enumerate(GRAPH_ROWS)}
+HOURS_PER_DAY = 24
+GRAPH_CACHE_TIMEOUT = 60 * 60 * 24 # Geometry only changes when the trip version changes
+
+
+def graph_cache_key(trip):
+    """
+    Cache key for a trip's graph geometry. The trip's updated_at acts as its
+    version, so regenerating the logs (which touches the trip) retires old entries.
+    """
+    return f"trip-graph:{trip.pk}:{trip.updated_at.timestamp()}"
+
+
+def _hours_into_day(moment, day_start):
+    hours = (timezone.localtime(moment) - day_start).total_seconds() / 3600
+    return round(min(max(hours, 0.0), HOURS_PER_DAY), 4) # Clamp to the 0-24h grid
+
+
+def _add_vertex(vertices, x, row):
+    if vertices and vertices[-1] == [x, row]:
+        return
+    # Drop the middle point of three collinear points on the same row
+    if len(vertices) >= 2 and vertices[-1][1] == row and vertices[-2][1] == row:
+        vertices[-1] = [x, row]
+        return
+    vertices.append([x, row])
+
+
+def build_day_graph(day, entries):
+    """
+    Builds the step line of the duty graph for one day.
+
+    `vertices` are [hour, row] pairs (hour in 0-24, row index into GRAPH_ROWS),
+    ready to be joined with straight lines. The line starts at midnight on the
+    Off Duty row and runs to the end of the day, like the paper log.
+    """
+    day_start = timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+    totals = {status.value: 0.0 for status in GRAPH_ROWS}
+
+    vertices = [[0.0, ROW_INDEX[DutyStatus.OFF_DUTY]]]
+    for entry in sorted(entries, key=lambda e: e.start_time):
+        row = ROW_INDEX.get(entry.status)
+        if row is None:
+            continue # Unknown status, nothing to draw
+        x1 = _hours_into_day(entry.start_time, day_start)
+        x2 = _hours_into_day(entry.end_time, day_start)
+        previous_row = vertices[-1][1]
+        _add_vertex(vertices, x1, previous_row) # Horizontal run to the start of this entry
+        _add_vertex(vertices, x1, row) # Vertical jump to the new status
+        _add_vertex(vertices, x2, row)
+        totals[entry.status] += x2 - x1
+
+    last_x, last_row = vertices[-1]
+    if last_x < HOURS_PER_DAY:
+        _add_vertex(vertices, float(HOURS_PER_DAY), last_row)
+
+    totals = {status: round(hours, 2) for status, hours in totals.items()}
+    return {
+        "date": day.isoformat(),
+        "rows": [status.value for status in GRAPH_ROWS],
+        "vertices": vertices,
+        "totals": totals,
+        "total_on_duty": round(totals[DutyStatus.DRIVING] + totals[DutyStatus.ON_DUTY_NOT_DRIVING], 2),
+    }
+
+
+def build_trip_graphs(entries):
+    """
+    Groups log entries by log_date and builds the graph for each day.
+    Returns a dict keyed by ISO date, in the same shape as the `logs` action.
+    """
+    entries_by_date = {}
+    for entry in entries:
+        entries_by_date.setdefault(entry.log_date, []).append(entry)
+    return {
+        day.isoformat(): build_day_graph(day, day_entries)
+        for day, day_entries in sorted(entries_by_date.items())
+    }
+
+
+def get_trip_graphs(trip):
+    """
+    Returns the per-day graphs for a trip, computing them only once per trip version.
+    """
+    key = graph_cache_key(trip)
+    graphs = cache.get(key)
+    if graphs is None:
+        graphs = build_trip_graphs(get_trip_segments(trip))
+        cache.set(key, graphs, GRAPH_CACHE_TIMEOUT)
+    return graphs
@@ -0,0 +1,121 @@
+# eld_backend/trips/intervals.py
+"""
+Point-in-time and window queries over duty status segments, batched across trips.
+
+Each trip's log entries are materialized once per trip version (updated_at) into a
+sorted interval list kept in process memory and answered by bisection, so a query costs
+O(log n + k) per trip instead of a scan of the trip's whole log.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+from .models import Trip, DutyStatusEvent
+from .segments import materialize
+from .archive import archived_events_by_trip
+
+INTERVAL_CACHE_SIZE = 1000 # Trips kept in memory per worker process
+MAX_TRIPS_PER_QUERY = 500
+
+
+class TripIntervals:
+    """
+    A trip's segments sorted by start time. Segments of a generated log don't overlap,
+    but `max_ends` (running maximum of end times) keeps lookups correct even if they do.
+    """
+    def __init__(self, segments):
+        self.segments = segments # Segment tuples, sorted by start_time
+        self.starts = [segment.start_time for segment in segments]
+        self.max_ends = []
+        for segment in segments:
+            self.max_ends.append(max(segment.end_time, self.max_ends[-1]) if self.max_ends else segment.end_time)
+
+    def _candidates(self, start, end_index):
+        # Segments before this index all end at or before `start`
+        first = bisect.bisect_right(self.max_ends, start)
+        return self.segments[first:end_index]
+
+    def at(self, moment):
+        last = bisect.bisect_right(self.starts, moment)
+        for segment in self._candidates(moment, last):
+            if segment.end_time > moment:
+                return segment
+        return None
+
+    def overlapping(self, start, end):
+        last = bisect.bisect_left(self.starts, end)
+        return [segment for segment in self._candidates(start, last) if segment.end_time > start]
+
+
+class IntervalCache:
+    def __init__(self, max_trips=INTERVAL_CACHE_SIZE):
+        self.max_trips = max_trips
+        self._entries = OrderedDict() # trip_id -> (updated_at, TripIntervals)
+        self._lock = threading.Lock()
+
+    def get_many(self, trip_ids):
+        """
+        Returns {trip_id: TripIntervals} for the existing trips among trip_ids, with one
+        query for the trip versions and one each for the archived and hot status changes of
+        stale or unseen trips.
+        """
+        versions, log_ends = {}, {}
+        for trip_id, updated_at, log_end_time in Trip.objects.filter(pk__in=trip_ids).values_list('pk', 'updated_at', 'log_end_time'):
+            versions[trip_id], log_ends[trip_id] = updated_at, log_end_time
+        result, stale = {}, []
+        with self._lock:
+            for trip_id, updated_at in versions.items():
+                cached = self._entries.get(trip_id)
+                if cached and cached[0] == updated_at:
+                    self._entries.move_to_end(trip_id)
+                    result[trip_id] = cached[1]
+                else:
+                    stale.append(trip_id)
+
+        if stale:
+            archived = archived_events_by_trip(stale)
+            events_by_trip = {trip_id: archived.get(trip_id, []) for trip_id in stale}
+            rows = (
+                DutyStatusEvent.objects.filter(trip_id__in=stale)
+                .order_by('trip_id', 'timestamp')
+                .values_list('trip_id', 'timestamp', 'status')
+            )
+            for trip_id, trip_rows in groupby(rows, key=itemgetter(0)):
+                events_by_trip[trip_id] = events_by_trip[trip_id] + [row[1:] for row in trip_rows]
+            with self._lock:
+                for trip_id, events in events_by_trip.items():
+                    intervals = TripIntervals(materialize(events, log_ends[trip_id]))
+                    result[trip_id] = intervals
+                    self._entries[trip_id] = (versions[trip_id], intervals)
+                    self._entries.move_to_end(trip_id)
+                while len(self._entries) > self.max_trips:
+                    self._entries.popitem(last=False)
+        return result
+
+
+interval_cache = IntervalCache()
+
+
+def _segment_data(segment):
+    return {"id": segment.id, "start_time": segment.start_time, "end_time": segment.end_time, "status": segment.status}
+
+
+def status_at(trip_ids, moment):
+    """
+    {trip_id: segment data or None} for what each trip's driver was doing at `moment`.
+    """
+    return {
+        trip_id: (_segment_data(segment) if (segment := intervals.at(moment)) else None)
+        for trip_id, intervals in interval_cache.get_many(trip_ids).items()
+    }
+
+
+def segments_overlapping(trip_ids, start, end):
+    """
+    {trip_id: [segment data, ...]} for the segments of each trip overlapping [start, end).
+    """
+    return {
+        trip_id: [_segment_data(segment) for segment in intervals.overlapping(start, end)]
+        for trip_id, intervals in interval_cache.get_many(trip_ids).items()
+    }
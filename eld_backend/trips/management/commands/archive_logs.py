@@ -0,0 +1,50 @@
+# eld_backend/trips/management/commands/archive_logs.py
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from trips.archive import archive_cutoff, archive_trips
+from trips.models import DutyStatusEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves status changes older than the archive horizon out of the hot DutyStatusEvent table "
+        "into compressed per trip-day ArchivedLogDay rows. Logs read the same afterwards; "
+        "run it periodically (e.g. daily) to keep the hot table small."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.LOG_ARCHIVE_AFTER_DAYS,
+                            help=f"Archive days older than this many days (default: {settings.LOG_ARCHIVE_AFTER_DAYS}).")
+        parser.add_argument('--trips-per-batch', type=int, default=200, help="Trips archived per transaction.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows fetched and inserted per database round trip.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError("--days must not be negative.")
+        if min(options['trips_per_batch'], options['batch_size']) < 1:
+            raise CommandError("--trips-per-batch and --batch-size must be at least 1.")
+
+        cutoff = archive_cutoff(options['days'])
+        trip_ids = list(
+            DutyStatusEvent.objects.filter(timestamp__lt=cutoff)
+            .order_by('trip_id').values_list('trip_id', flat=True).distinct()
+        )
+        if not trip_ids:
+            self.stdout.write(f"Nothing to archive before {cutoff:%Y-%m-%d %H:%M %Z}.")
+            return
+
+        started = time.perf_counter()
+        per_batch = options['trips_per_batch']
+        total_days = total_events = 0
+        for i in range(0, len(trip_ids), per_batch):
+            days, events = archive_trips(trip_ids[i:i + per_batch], cutoff, options['batch_size'])
+            total_days += days
+            total_events += events
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {min(i + per_batch, len(trip_ids))}/{len(trip_ids)} trips, {total_events} status changes")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total_events} status changes of {len(trip_ids)} trips into {total_days} trip-days "
+            f"before {cutoff:%Y-%m-%d %H:%M %Z} in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,85 @@
+# eld_backend/trips/management/commands/audit_hos.py
+import multiprocessing
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from trips import views
+from trips.audit import HOSRules, init_worker, audit_trip_chunk
+from trips.models import Trip, HOSRule
+
+
+class Command(BaseCommand):
+    help = (
+        "Audits stored log entries against the hours-of-service rules used to generate them "
+        "and writes the violations to the AuditFinding table, replacing earlier findings of "
+        "the audited trips. Trips are split into batches audited by a pool of processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', help="Comma-separated trip ids to audit (default: all trips).")
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count).")
+        parser.add_argument('--trips-per-task', type=int, default=200, help="Trips audited per unit of work.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows fetched and inserted per database round trip.")
+
+    def handle(self, *args, **options):
+        rules = HOSRules(
+            max_driving_hours=views.MAX_DRIVING_HOURS_DAY,
+            max_duty_window_hours=views.MAX_ON_DUTY_HOURS_DAY,
+            max_cycle_hours=views.MAX_ON_DUTY_HOURS_CYCLE,
+            cycle_days=views.CYCLE_DAYS,
+            min_off_duty_hours=views.MIN_OFF_DUTY_HOURS,
+            min_break_hours=views.MIN_BREAK_HOURS,
+            max_driving_before_break_hours=views.MAX_DRIVING_HOURS_BEFORE_BREAK,
+        )
+        if min(options['processes'], options['trips_per_task'], options['batch_size']) < 1:
+            raise CommandError("--processes, --trips-per-task and --batch-size must be at least 1.")
+
+        trips = Trip.objects.order_by('pk')
+        if options['trips']:
+            try:
+                trips = trips.filter(pk__in=[int(trip_id) for trip_id in options['trips'].split(',') if trip_id.strip()])
+            except ValueError:
+                raise CommandError("--trips must be a comma-separated list of trip ids.")
+        trip_ids = list(trips.values_list('pk', flat=True))
+        per_task = options['trips_per_task']
+        tasks = [(trip_ids[i:i + per_task], rules, options['batch_size']) for i in range(0, len(trip_ids), per_task)]
+        if not tasks:
+            self.stdout.write("No trips to audit.")
+            return
+
+        processes = min(options['processes'], len(tasks))
+        started = time.perf_counter()
+        audited_trips = audited_segments = 0
+        counts = {}
+
+        if processes == 1:
+            results = map(audit_trip_chunk, tasks)
+            pool = None
+        else:
+            # Workers open their own connections; a connection must not be shared across a fork
+            connections.close_all()
+            pool = multiprocessing.get_context().Pool(processes, initializer=init_worker)
+            results = pool.imap_unordered(audit_trip_chunk, tasks)
+        try:
+            for done, (chunk_trips, chunk_segments, chunk_counts) in enumerate(results, start=1):
+                audited_trips += chunk_trips
+                audited_segments += chunk_segments
+                for rule, count in chunk_counts.items():
+                    counts[rule] = counts.get(rule, 0) + count
+                if options['verbosity'] > 1 or done == len(tasks) or done % 50 == 0:
+                    self.stdout.write(f"  {done}/{len(tasks)} batches, {audited_segments} segments")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Audited {audited_trips} trips ({audited_segments} segments) in {elapsed:.1f}s "
+            f"with {processes} process{'es' if processes > 1 else ''}"
+            f" ({audited_segments / elapsed if elapsed else 0:,.0f} segments/s)."
+        ))
+        self.stdout.write(self.style.MIGRATE_HEADING("Findings"))
+        for rule in HOSRule:
+            self.stdout.write(f"  {rule.label:<42}{counts.get(rule.value, 0):>8}")
@@ -0,0 +1,355 @@
+# eld_backend/trips/management/commands/loadtest.py
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from trips.estimate import load_gazetteer
+from trips.ors_stub import StubORSServer
+
+ENDPOINTS = ('create', 'calculate', 'logs') # The TripForm flow, in order
+PERCENTILES = (50, 95, 99)
+SERVER_START_TIMEOUT_SECONDS = 30
+
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already sorted list, or None if it is empty.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100)) # ceil(n * p / 100)
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples, duration_seconds):
+    """
+    samples: [(latency_seconds, ok)] for one endpoint at one concurrency level.
+    """
+    latencies_ms = sorted(latency * 1000 for latency, _ in samples)
+    summary = {
+        "requests": len(samples),
+        "errors": sum(1 for _, ok in samples if not ok),
+        "throughput_rps": round(len(samples) / duration_seconds, 2) if duration_seconds else None,
+        "latency_ms": {f"p{p}": round(percentile(latencies_ms, p), 1) if latencies_ms else None for p in PERCENTILES},
+    }
+    summary["latency_ms"]["mean"] = round(sum(latencies_ms) / len(latencies_ms), 1) if latencies_ms else None
+    summary["latency_ms"]["max"] = round(latencies_ms[-1], 1) if latencies_ms else None
+    return summary
+
+
+@lru_cache(maxsize=1)
+def gazetteer_names():
+    return [name for name, _ in load_gazetteer()]
+
+
+def flow_trip():
+    """
+    The trip a flow creates, between three gazetteer cities picked at random so flows plan
+    different routes. The offline estimator knows these cities, so with --ors-error-rate the
+    failed ORS requests exercise the degraded path (estimated routes) as they would for real
+    trips, instead of leaving locations that can't be found.
+    """
+    current, pickup, dropoff = random.sample(gazetteer_names(), 3)
+    return {"current_location": current, "pickup_location": pickup, "dropoff_location": dropoff, "current_cycle_used": 10.0}
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests trip planning end to end: each flow creates a trip, calculates its route "
+        "and logs and fetches the logs, as the frontend does. Runs against a local ORS stub "
+        "with configurable latency and error injection at increasing concurrency levels and "
+        "writes throughput and p50/p95/p99 latency per endpoint as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help=(
+            "API root of an already running backend, e.g. http://127.0.0.1:8000/api/. It must be started "
+            "with ORS_BASE_URL pointing at the stub (see --ors-port). By default a backend is started on a "
+            "scratch database."
+        ))
+        parser.add_argument('--server', choices=['gunicorn', 'runserver'], help=(
+            "Server for the started backend. Defaults to gunicorn when installed, else runserver."
+        ))
+        parser.add_argument('--workers', type=int, default=4, help="gunicorn workers for the started backend.")
+        parser.add_argument('--levels', default='1,2,4,8,16', help="Comma-separated concurrency levels.")
+        parser.add_argument('--flows', type=int, default=40, help="Trip flows measured per concurrency level.")
+        parser.add_argument('--warmup', type=int, default=2, help="Unmeasured flows run before the first level.")
+        parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout in seconds.")
+        parser.add_argument('--ors-port', type=int, default=0, help="Port of the ORS stub (default: any free port).")
+        parser.add_argument('--ors-latency-ms', type=float, default=100, help="Delay added to every ORS stub response.")
+        parser.add_argument('--ors-jitter-ms', type=float, default=0, help="Random +/- variation of the ORS delay.")
+        parser.add_argument('--ors-error-rate', type=float, default=0.0, help="Fraction of ORS stub requests answered with 503.")
+        parser.add_argument('--serve-ors', action='store_true', help="Only run the ORS stub until interrupted.")
+        parser.add_argument('--output', help="Results file (default: loadtest-<timestamp>.json).")
+        parser.add_argument('--baseline', help="Earlier results file to compare against.")
+        parser.add_argument('--regression-threshold', type=float, default=10.0, help=(
+            "Percent drop in throughput or rise in p95 latency against --baseline that counts as a regression."
+        ))
+        parser.add_argument('--fail-on-regression', action='store_true', help="Exit with an error if a regression is found.")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['levels'].split(',') if level.strip()]
+        except ValueError:
+            raise CommandError("--levels must be comma-separated integers, e.g. 1,2,4,8.")
+        if not levels or min(levels) < 1:
+            raise CommandError("--levels needs at least one concurrency level of 1 or more.")
+        if not 0 <= options['ors_error_rate'] <= 1:
+            raise CommandError("--ors-error-rate must be between 0 and 1.")
+        if len(gazetteer_names()) < 3:
+            raise CommandError(f"Trips are planned between gazetteer cities; none found at {settings.GAZETTEER_DATASET}.")
+
+        ors = StubORSServer(
+            ('127.0.0.1', options['ors_port']),
+            latency_ms=options['ors_latency_ms'], jitter_ms=options['ors_jitter_ms'], error_rate=options['ors_error_rate'],
+        ).start()
+        self.stdout.write(f"ORS stub listening on {ors.url}")
+
+        backend = None
+        scratch_dir = None
+        try:
+            if options['serve_ors']:
+                self.stdout.write("Serving until interrupted (Ctrl+C).")
+                while True:
+                    time.sleep(3600)
+
+            if options['url']:
+                api_url = options['url'].rstrip('/') + '/'
+                server_info = {"url": api_url, "started_by_loadtest": False}
+            else:
+                scratch_dir = tempfile.TemporaryDirectory(prefix='eld-loadtest-')
+                backend, api_url, server_info = self._start_backend(options, ors.url, scratch_dir.name)
+
+            for _ in range(options['warmup']):
+                self._run_flow(api_url, options['timeout'])
+
+            results = []
+            for level in levels:
+                result = self._run_level(api_url, level, options['flows'], options['timeout'])
+                results.append(result)
+                self._print_level(result)
+        except KeyboardInterrupt:
+            return
+        finally:
+            if backend is not None:
+                backend.terminate()
+                try:
+                    backend.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    backend.kill()
+            ors.shutdown()
+            if scratch_dir is not None:
+                scratch_dir.cleanup()
+
+        report = {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "config": {
+                "levels": levels,
+                "flows_per_level": options['flows'],
+                "ors_latency_ms": options['ors_latency_ms'],
+                "ors_jitter_ms": options['ors_jitter_ms'],
+                "ors_error_rate": options['ors_error_rate'],
+            },
+            "server": server_info,
+            "ors_requests": dict(sorted(ors.counts.items())),
+            "levels": results,
+        }
+        output = options['output'] or f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        with open(output, 'w', encoding='utf-8') as results_file:
+            json.dump(report, results_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options['baseline']:
+            regressions = self._compare(report, options['baseline'], options['regression_threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} regression(s) against {options['baseline']}.")
+
+    def _start_backend(self, options, ors_url, scratch_dir):
+        """
+        Starts the backend on a scratch SQLite database with ORS pointed at the stub.
+        Returns (process, api_url, server_info).
+        """
+        server = options['server']
+        if server is None:
+            try:
+                import gunicorn # noqa: F401
+                server = 'gunicorn'
+            except ImportError:
+                server = 'runserver'
+
+        port = free_port()
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'eld_backend.settings'),
+            DATABASE_URL=f"sqlite:///{os.path.join(scratch_dir, 'loadtest.sqlite3')}",
+            ORS_BASE_URL=ors_url,
+            ORS_API_KEY='loadtest',
+            SINGLE_FLIGHT_DIR=os.path.join(scratch_dir, 'singleflight'),
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+        )
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        migrate = subprocess.run(
+            [sys.executable, manage_py, 'migrate', '--noinput'], capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if migrate.returncode != 0:
+            raise CommandError(f"Migrating the scratch database failed:\n{migrate.stderr[-2000:]}")
+
+        if server == 'gunicorn':
+            command = [
+                sys.executable, '-m', 'gunicorn', settings.WSGI_APPLICATION.rsplit('.', 1)[0],
+                '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']), '--timeout', str(int(options['timeout'])),
+            ]
+        else:
+            command = [sys.executable, manage_py, 'runserver', f'127.0.0.1:{port}', '--noreload']
+        log = open(os.path.join(scratch_dir, 'server.log'), 'w')
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=settings.BASE_DIR)
+
+        import requests
+        api_url = f"http://127.0.0.1:{port}/api/"
+        deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+        while True:
+            if process.poll() is not None:
+                log.close()
+                with open(log.name, encoding='utf-8') as server_log:
+                    raise CommandError(f"Backend exited on start:\n{server_log.read()[-2000:]}")
+            try:
+                requests.get(api_url, timeout=2)
+                break
+            except requests.exceptions.ConnectionError:
+                if time.monotonic() > deadline:
+                    process.kill()
+                    raise CommandError(f"Backend did not start within {SERVER_START_TIMEOUT_SECONDS}s.")
+                time.sleep(0.2)
+        self.stdout.write(f"Started {server} backend on {api_url}")
+        server_info = {"url": api_url, "started_by_loadtest": True, "server": server}
+        if server == 'gunicorn':
+            server_info["workers"] = options['workers']
+        return process, api_url, server_info
+
+    def _run_flow(self, api_url, timeout, session=None):
+        """
+        One trip as TripForm.jsx submits it. Returns {endpoint: (latency_seconds, ok)} for the
+        requests made; later steps are skipped once one fails.
+        """
+        import requests
+        session = session or requests.Session()
+        trip = flow_trip()
+        samples = {}
+
+        def timed(endpoint, method, url, **kwargs):
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+                ok = response.ok
+            except requests.exceptions.RequestException:
+                response, ok = None, False
+            samples[endpoint] = (time.perf_counter() - started, ok)
+            return response if ok else None
+
+        created = timed('create', 'POST', f"{api_url}trips/", json=trip)
+        if created is None:
+            return samples
+        trip_id = created.json()['id']
+        if timed('calculate', 'POST', f"{api_url}trips/{trip_id}/calculate_route_and_logs/") is None:
+            return samples
+        timed('logs', 'GET', f"{api_url}trips/{trip_id}/logs/")
+        return samples
+
+    def _run_level(self, api_url, concurrency, flows, timeout):
+        import requests
+        local = threading.local()
+
+        def flow(_):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            return self._run_flow(api_url, timeout, local.session)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            flow_samples = list(pool.map(flow, range(flows)))
+        duration = time.perf_counter() - started
+
+        completed = sum(1 for samples in flow_samples if all(samples.get(endpoint, (0, False))[1] for endpoint in ENDPOINTS))
+        return {
+            "concurrency": concurrency,
+            "flows": flows,
+            "completed_flows": completed,
+            "duration_seconds": round(duration, 3),
+            "flows_per_second": round(completed / duration, 3),
+            "endpoints": {
+                endpoint: summarize([samples[endpoint] for samples in flow_samples if endpoint in samples], duration)
+                for endpoint in ENDPOINTS
+            },
+        }
+
+    def _print_level(self, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Concurrency {result['concurrency']}: {result['completed_flows']}/{result['flows']} flows in "
+            f"{result['duration_seconds']:.1f}s, {result['flows_per_second']:.2f} flows/s"
+        ))
+        self.stdout.write(f"  {'endpoint':<12}{'req':>6}{'err':>6}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for endpoint, summary in result['endpoints'].items():
+            latency = summary['latency_ms']
+            fmt = lambda value: f"{value:8.1f}ms" if value is not None else f"{'-':>10}"
+            self.stdout.write(
+                f"  {endpoint:<12}{summary['requests']:>6}{summary['errors']:>6}{summary['throughput_rps'] or 0:>9.2f}"
+                f"{fmt(latency['p50'])}{fmt(latency['p95'])}{fmt(latency['p99'])}"
+            )
+
+    def _compare(self, report, baseline_path, threshold):
+        """
+        Prints throughput and p95 changes per level against an earlier report.
+        Returns the number of changes beyond the threshold.
+        """
+        try:
+            with open(baseline_path, encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {baseline_path}: {e}")
+        baseline_levels = {level['concurrency']: level for level in baseline.get('levels', [])}
+
+        change = lambda old, new: (new - old) / old * 100 if old else 0.0
+        regressions = 0
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Against {baseline_path} (revision {baseline.get('revision')})"))
+        for level in report['levels']:
+            before = baseline_levels.get(level['concurrency'])
+            if before is None:
+                continue
+            checks = [("flows/s", before['flows_per_second'], level['flows_per_second'], -1)]
+            for endpoint, summary in level['endpoints'].items():
+                old_p95 = before['endpoints'].get(endpoint, {}).get('latency_ms', {}).get('p95')
+                if old_p95 is not None and summary['latency_ms']['p95'] is not None:
+                    checks.append((f"{endpoint} p95", old_p95, summary['latency_ms']['p95'], 1))
+            for name, old, new, worse_direction in checks:
+                delta = change(old, new)
+                regressed = delta * worse_direction > threshold
+                regressions += regressed
+                line = f"  c={level['concurrency']:<4}{name:<16}{old:>10}{new:>10}{delta:>+9.1f}%"
+                self.stdout.write(self.style.ERROR(line + "  REGRESSION") if regressed else line)
+        return regressions
@@ -0,0 +1,168 @@
+# eld_backend/trips/management/commands/profile_startup.py
+import json
+import os
+import subprocess
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is already imported. Boots the project the way a
+# WSGI server does, times each phase and serves one request. argv: path, time.time() at spawn.
+CHILD_SCRIPT = r'''
+import json, sys, time, wsgiref.util
+from importlib import import_module
+
+phases = {}
+app_timings = {}
+started = time.perf_counter()
+
+from django.conf import settings
+settings.INSTALLED_APPS # Importing the settings module happens on first access
+phases["settings"] = time.perf_counter() - started
+
+# Boot must not touch the database (connections would be shared with forked workers)
+from django.db.backends.signals import connection_created
+db_connections = {"boot": 0, "first_response": 0}
+current_phase = "boot"
+def count_connection(sender, **kwargs):
+    db_connections[current_phase] += 1
+connection_created.connect(count_connection, weak=False)
+
+from django.apps.config import AppConfig
+original_create = AppConfig.create.__func__
+
+def timed_create(cls, entry):
+    # Time importing the app module, its models module and its ready() hook separately
+    t = time.perf_counter()
+    app_config = original_create(cls, entry)
+    timing = app_timings.setdefault(app_config.label, {"import": 0.0, "models": 0.0, "ready": 0.0})
+    timing["import"] = time.perf_counter() - t
+    import_models, ready = app_config.import_models, app_config.ready
+    def timed_import_models():
+        t = time.perf_counter()
+        import_models()
+        timing["models"] = time.perf_counter() - t
+    def timed_ready():
+        t = time.perf_counter()
+        ready()
+        timing["ready"] = time.perf_counter() - t
+    app_config.import_models, app_config.ready = timed_import_models, timed_ready
+    return app_config
+
+AppConfig.create = classmethod(timed_create)
+
+t = time.perf_counter()
+wsgi_module, application_name = settings.WSGI_APPLICATION.rsplit(".", 1)
+application = getattr(import_module(wsgi_module), application_name)
+phases["wsgi_application"] = time.perf_counter() - t
+
+host = next((h.lstrip(".") for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+environ = {"PATH_INFO": sys.argv[1], "HTTP_HOST": host, "HTTP_ACCEPT": "application/json"}
+wsgiref.util.setup_testing_defaults(environ)
+response_status = []
+current_phase = "first_response"
+t = time.perf_counter()
+body = b"".join(application(environ, lambda status, headers, exc_info=None: response_status.append(status)))
+phases["first_response"] = time.perf_counter() - t
+phases["total"] = time.perf_counter() - started
+# From spawning the interpreter (in the parent) to the response: what a fresh worker's first
+# client waits for, including interpreter startup
+time_to_first_response = time.time() - float(sys.argv[2])
+
+print(json.dumps({
+    "time_to_first_response": time_to_first_response, "phases": phases, "apps": app_timings,
+    "db_connections": db_connections, "status": response_status[0], "bytes": len(body),
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Parses `python -X importtime` output into (module, self_us, cumulative_us, depth) rows.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def run_child(path, importtime=False):
+    """
+    Boots the project once in a fresh interpreter. Returns (report, stderr).
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'eld_backend.settings'))
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', CHILD_SCRIPT, path, repr(time.time())]
+    child = subprocess.run(command, capture_output=True, text=True, env=env, cwd=os.getcwd())
+    if child.returncode != 0:
+        raise CommandError(f"Startup run failed:\n{child.stderr[-2000:]}")
+    return json.loads(child.stdout.strip().splitlines()[-1]), child.stderr
+
+
+class Command(BaseCommand):
+    help = (
+        "Boots the project in fresh interpreters and reports where cold-start time goes: the "
+        "time to the first response, settings, per-app import/models/ready cost, WSGI setup, "
+        "the first response itself and the most expensive module imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/', help="Path requested for the first response (default /api/).")
+        parser.add_argument('--runs', type=int, default=3, help="Fresh interpreters timed; the median run is reported (default 3).")
+        parser.add_argument('--top', type=int, default=15, help="Number of modules and packages to list.")
+        parser.add_argument('--json', action='store_true', help="Print the full report as JSON.")
+
+    def handle(self, *args, **options):
+        # Timed without -X importtime, which slows imports down; one more run breaks them down
+        runs = sorted((run_child(options['path'])[0] for _ in range(max(1, options['runs']))),
+                      key=lambda run: run["time_to_first_response"])
+        report = runs[len(runs) // 2]
+        report["runs_time_to_first_response"] = [run["time_to_first_response"] for run in runs]
+        _, stderr = run_child(options['path'], importtime=True)
+
+        modules = parse_importtime(stderr)
+        packages = {}
+        for name, self_us, _, _ in modules:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+        report["packages_ms"] = {
+            package: round(us / 1000, 2)
+            for package, us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]
+        }
+        report["modules_ms"] = [
+            {"module": name, "self": round(self_us / 1000, 2), "cumulative": round(cumulative_us / 1000, 2)}
+            for name, self_us, cumulative_us, _ in sorted(modules, key=lambda m: -m[2])[:options['top']]
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        ms = lambda seconds: f"{seconds * 1000:8.1f} ms"
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Time to first response (median of {len(runs)} fresh interpreters)"))
+        self.stdout.write(f"  {'spawn to response':<20}{ms(report['time_to_first_response'])}"
+                          f"  (runs: {', '.join(f'{seconds * 1000:.0f}' for seconds in report['runs_time_to_first_response'])} ms)")
+        self.stdout.write(self.style.MIGRATE_HEADING("Startup phases (median run)"))
+        for phase, seconds in report["phases"].items():
+            self.stdout.write(f"  {phase:<20}{ms(seconds)}")
+        self.stdout.write(f"  first response: {report['status']}, {report['bytes']} bytes from {options['path']}")
+        db_connections = report["db_connections"]
+        self.stdout.write(f"  database connections opened: {db_connections['boot']} while booting, "
+                          f"{db_connections['first_response']} by the first response")
+        if db_connections['boot']:
+            self.stdout.write(self.style.WARNING("  Booting touched the database: forked workers would share the connection."))
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Apps (import / models / ready)"))
+        for label, timing in report["apps"].items():
+            self.stdout.write(f"  {label:<20}{ms(timing['import'])}{ms(timing['models'])}{ms(timing['ready'])}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Import time by top-level package (self time)"))
+        for package, package_ms in report["packages_ms"].items():
+            self.stdout.write(f"  {package:<40}{package_ms:8.1f} ms")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Most expensive imports (cumulative)"))
+        for module in report["modules_ms"]:
+            self.stdout.write(f"  {module['module']:<50}{module['cumulative']:8.1f} ms")
@@ -0,0 +1,45 @@
+# eld_backend/trips/management/commands/sync_sqlite_replicas.py
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+SQLITE_ENGINE = 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the primary SQLite database onto the SQLite read replicas in DATABASE_REPLICA_URLS, "
+        "once or every --interval seconds. Stands in for database replication when trying out "
+        "replica-served reads locally; with --interval the replicas lag the primary by up to that long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Keep copying every this many seconds until interrupted.")
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        replicas = [settings.DATABASES[alias] for alias in settings.DATABASE_REPLICAS]
+        if not replicas:
+            raise CommandError("No read replicas configured; set DATABASE_REPLICA_URLS.")
+        if any(database['ENGINE'] != SQLITE_ENGINE for database in [primary] + replicas):
+            raise CommandError("The primary and every replica must be SQLite databases.")
+        if options['interval'] is not None and options['interval'] <= 0:
+            raise CommandError("--interval must be positive.")
+
+        connections.close_all() # Replica files are replaced underneath any open connection
+        while True:
+            started = time.perf_counter()
+            # The backup API copies a consistent snapshot even while the primary is being written
+            with sqlite3.connect(primary['NAME']) as source:
+                for replica in replicas:
+                    with sqlite3.connect(replica['NAME']) as target:
+                        source.backup(target)
+                    target.close()
+            source.close()
+            if options['verbosity'] > 1 or options['interval'] is None:
+                self.stdout.write(f"Copied {primary['NAME']} to {len(replicas)} replica(s) in {time.perf_counter() - started:.2f}s.")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
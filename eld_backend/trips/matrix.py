@@ -0,0 +1,76 @@
+# eld_backend/trips/matrix.py
+"""
+Road distance/duration matrix between trip locations.
+
+Every ordered pair of coordinates is cached individually (road distances don't change
+often), so a trip whose stops were all seen before is planned without any ORS call and
+trips sharing depots or customers reuse each other's pairs. Missing pairs are fetched
+with a single ORS matrix request for all locations. If ORS is unavailable, pairs are
+estimated offline (see trips/estimate.py) and are not cached.
+"""
+import json
+from django.conf import settings
+from django.core.cache import cache
+from .estimate import estimate_leg
+
+ORS_MATRIX_PATH = "/v2/matrix/driving-hgv"
+MATRIX_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _pair_key(origin, destination):
+    return f"matrix:{origin[0]:.5f},{origin[1]:.5f}:{destination[0]:.5f},{destination[1]:.5f}"
+
+
+def _fetch_ors_matrix(coordinates, api_key):
+    """
+    One ORS matrix request for all locations. Returns (distances_km, durations_hours)
+    with None for unreachable pairs, or None if the request failed.
+    """
+    import requests # Imported on first use rather than at worker start
+
+    headers = {
+        "Accept": "application/json",
+        "Authorization": api_key,
+        "Content-Type": "application/json; charset=utf-8"
+    }
+    body = {"locations": coordinates, "metrics": ["distance", "duration"], "units": "km"}
+    try:
+        print(f"Requesting distance matrix for {len(coordinates)} locations.")
+        response = requests.post(settings.ORS_BASE_URL + ORS_MATRIX_PATH, headers=headers, data=json.dumps(body), timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        durations = [[None if seconds is None else seconds / 3600 for seconds in row] for row in data['durations']]
+        return data['distances'], durations
+    except (requests.exceptions.RequestException, KeyError, TypeError, ValueError) as e:
+        print(f"Distance matrix error with OpenRouteService: {e}. Estimating distances instead.")
+        return None
+
+
+def get_matrix(coordinates, api_key):
+    """
+    Returns (distances_km, durations_hours) as n x n lists for [lon, lat] coordinates.
+    """
+    n = len(coordinates)
+    pairs = [(i, j) for i in range(n) for j in range(n) if i != j]
+    keys = {(i, j): _pair_key(coordinates[i], coordinates[j]) for i, j in pairs}
+    cached = cache.get_many(keys.values())
+
+    fetched = None
+    if len(cached) < len(pairs):
+        fetched = _fetch_ors_matrix(coordinates, api_key)
+
+    distances = [[0.0] * n for _ in range(n)]
+    durations = [[0.0] * n for _ in range(n)]
+    to_cache = {}
+    for i, j in pairs:
+        key = keys[(i, j)]
+        if key in cached:
+            distances[i][j], durations[i][j] = cached[key]
+        elif fetched and fetched[0][i][j] is not None and fetched[1][i][j] is not None:
+            distances[i][j], durations[i][j] = fetched[0][i][j], fetched[1][i][j]
+            to_cache[key] = (distances[i][j], durations[i][j])
+        else:
+            distances[i][j], durations[i][j] = estimate_leg(coordinates[i], coordinates[j])
+    if to_cache:
+        cache.set_many(to_cache, MATRIX_CACHE_TIMEOUT)
+    return distances, durations
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_alter_logentry_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_distance_km', models.FloatField()),
+                ('total_duration_hours_driving', models.FloatField()),
+                ('encoded_geometry', models.TextField(blank=True, default='')),
+                ('stops', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='route', to='trips.trip')),
+            ],
+        ),
+    ]
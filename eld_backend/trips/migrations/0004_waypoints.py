@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0003_route'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trip',
+            name='dropoff_location',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='pickup_location',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='Waypoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=255)),
+                ('stop_type', models.CharField(choices=[('PICKUP', 'Pickup'), ('DROPOFF', 'Drop-off')], default='DROPOFF', max_length=20)),
+                ('shipment', models.CharField(blank=True, help_text='Pairs pickups with their drop-offs', max_length=50)),
+                ('sequence', models.PositiveIntegerField(default=0)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waypoints', to='trips.trip')),
+            ],
+            options={
+                'ordering': ['sequence', 'id'],
+            },
+        ),
+    ]
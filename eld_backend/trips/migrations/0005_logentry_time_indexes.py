@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_waypoints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['trip', 'start_time'], name='logentry_trip_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['trip', 'end_time'], name='logentry_trip_end_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_logentry_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditFinding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.CharField(choices=[('DRIVING_LIMIT', '11-hour driving limit'), ('DUTY_WINDOW', '14-hour duty window'), ('BREAK_REQUIRED', '30-minute break after 8 hours driving'), ('CYCLE_LIMIT', '70-hour/8-day limit'), ('LOG_GAP', 'Gap between log entries'), ('LOG_OVERLAP', 'Overlapping log entries')], max_length=30)),
+                ('occurred_at', models.DateTimeField()),
+                ('observed_hours', models.FloatField()),
+                ('limit_hours', models.FloatField()),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('audited_at', models.DateTimeField(auto_now_add=True)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_findings', to='trips.trip')),
+            ],
+            options={
+                'ordering': ['trip', 'occurred_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:18
+
+import django.db.models.deletion
+from itertools import groupby
+from operator import attrgetter
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 5000
+
+
+def entries_to_events(apps, schema_editor):
+    """
+    Keeps only the entries that change the status, and each trip's last end time.
+    """
+    Trip = apps.get_model('trips', 'Trip')
+    LogEntry = apps.get_model('trips', 'LogEntry')
+    DutyStatusEvent = apps.get_model('trips', 'DutyStatusEvent')
+
+    events, trips = [], []
+    entries = LogEntry.objects.order_by('trip_id', 'start_time').iterator(chunk_size=BATCH_SIZE)
+    for trip_id, trip_entries in groupby(entries, key=attrgetter('trip_id')):
+        status, log_end_time = None, None
+        for entry in trip_entries:
+            if entry.status != status:
+                events.append(DutyStatusEvent(trip_id=trip_id, timestamp=entry.start_time, status=entry.status))
+                status = entry.status
+            log_end_time = max(log_end_time, entry.end_time) if log_end_time else entry.end_time
+        trips.append(Trip(pk=trip_id, log_end_time=log_end_time))
+        if len(events) >= BATCH_SIZE:
+            DutyStatusEvent.objects.bulk_create(events)
+            events = []
+    DutyStatusEvent.objects.bulk_create(events)
+    Trip.objects.bulk_update(trips, ['log_end_time'], batch_size=BATCH_SIZE)
+
+
+def events_to_entries(apps, schema_editor):
+    """
+    One entry per status run (not split per day), dated by its start.
+    """
+    Trip = apps.get_model('trips', 'Trip')
+    LogEntry = apps.get_model('trips', 'LogEntry')
+    DutyStatusEvent = apps.get_model('trips', 'DutyStatusEvent')
+
+    log_ends = dict(Trip.objects.values_list('pk', 'log_end_time'))
+    entries = []
+    events = DutyStatusEvent.objects.order_by('trip_id', 'timestamp').iterator(chunk_size=BATCH_SIZE)
+    for trip_id, trip_events in groupby(events, key=attrgetter('trip_id')):
+        trip_events = list(trip_events)
+        ends = [event.timestamp for event in trip_events[1:]] + [log_ends[trip_id]]
+        for event, end_time in zip(trip_events, ends):
+            if end_time is not None:
+                entries.append(LogEntry(
+                    trip_id=trip_id, log_date=timezone.localtime(event.timestamp).date(),
+                    start_time=event.timestamp, end_time=end_time, status=event.status,
+                ))
+    LogEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_audit_findings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='log_end_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DutyStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('status', models.CharField(choices=[('DRIVING', 'Driving'), ('ON_DUTY_NOT_DRIVING', 'On-Duty (Not Driving)'), ('OFF_DUTY', 'Off-Duty'), ('SLEEPER_BERTH', 'Sleeper Berth')], max_length=50)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='trips.trip')),
+            ],
+            options={
+                'ordering': ['timestamp'],
+                'unique_together': {('trip', 'timestamp')},
+            },
+        ),
+        migrations.RunPython(entries_to_events, events_to_entries),
+        migrations.DeleteModel(
+            name='LogEntry',
+        ),
+    ]
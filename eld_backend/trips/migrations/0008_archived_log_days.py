@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_duty_status_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLogDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_date', models.DateField()),
+                ('event_count', models.PositiveIntegerField()),
+                ('events', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_days', to='trips.trip')),
+            ],
+            options={
+                'ordering': ['log_date'],
+                'unique_together': {('trip', 'log_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:46
+
+from django.db import migrations, models
+
+
+def drop_gap_findings(apps, schema_editor):
+    """
+    LOG_GAP can't be found any more: segments built from status changes are contiguous.
+    """
+    AuditFinding = apps.get_model('trips', 'AuditFinding')
+    AuditFinding.objects.filter(rule='LOG_GAP').delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_request_profiles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditfinding',
+            name='rule',
+            field=models.CharField(choices=[('DRIVING_LIMIT', '11-hour driving limit'), ('DUTY_WINDOW', '14-hour duty window'), ('BREAK_REQUIRED', '30-minute break after 8 hours driving'), ('CYCLE_LIMIT', '70-hour/8-day limit'), ('LOG_OVERLAP', 'Duplicate or out-of-order status changes'), ('LOG_AFTER_END', 'Status changes after the end of the log')], max_length=30),
+        ),
+        migrations.RunPython(drop_gap_findings, migrations.RunPython.noop),
+    ]
@@ -46,16 +46,28 @@ class LogEntry(models.Model):
 """
 
 # eld_backend/trips/models.py
+from django.conf import settings
 from django.db import models
 
 class Trip(models.Model):
     current_location = models.CharField(max_length=255)
-    pickup_location = models.CharField(max_length=255)
-    dropoff_location = models.CharField(max_length=255)
+    # Pickup/dropoff may be left blank for multi-stop trips, whose stops are Waypoints
+    pickup_location = models.CharField(max_length=255, blank=True)
+    dropoff_location = models.CharField(max_length=255, blank=True)
     # Add the new field here
     current_cycle_used = models.FloatField(default=0.0) # Set a default value, e.g., 0.0 hours
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # End of the generated log; the last DutyStatusEvent lasts until then
+    log_end_time = models.DateTimeField(null=True, blank=True)
+    # Coordinates of the locations, picked from autocomplete or geocoded once and reused by later
+    # calculations. Cleared when the location text changes without new coordinates.
+    current_latitude = models.FloatField(null=True, blank=True)
+    current_longitude = models.FloatField(null=True, blank=True)
+    pickup_latitude = models.FloatField(null=True, blank=True)
+    pickup_longitude = models.FloatField(null=True, blank=True)
+    dropoff_latitude = models.FloatField(null=True, blank=True)
+    dropoff_longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return f"Trip from {self.current_location} to {self.dropoff_location}"
@@ -66,15 +78,143 @@ class DutyStatus(models.TextChoices):
     OFF_DUTY = 'OFF_DUTY', 'Off-Duty'
     SLEEPER_BERTH = 'SLEEPER_BERTH', 'Sleeper Berth' # If you plan to implement sleeper berth rules
 
-class LogEntry(models.Model):
-    trip = models.ForeignKey(Trip, related_name='log_entries', on_delete=models.CASCADE)
-    log_date = models.DateField()
-    start_time = models.DateTimeField()
-    end_time = models.DateTimeField()
+class DutyStatusEvent(models.Model):
+    """
+    A change of duty status: the driver is in `status` from `timestamp` until the trip's
+    next event, or until Trip.log_end_time for the last one. Only changes are stored;
+    per-day log entries are materialized from them on read (see trips/segments.py).
+    """
+    trip = models.ForeignKey(Trip, related_name='status_events', on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
     status = models.CharField(max_length=50, choices=DutyStatus.choices)
-    
+
+    class Meta:
+        ordering = ['timestamp']
+        unique_together = ('trip', 'timestamp') # Also the index for reading a trip's events in order
+
+    def __str__(self):
+        return f"Trip {self.trip_id}: {self.status} from {self.timestamp:%Y-%m-%d %H:%M}"
+
+
+class ArchivedLogDay(models.Model):
+    """
+    The status changes of one trip-day, moved out of DutyStatusEvent by `manage.py archive_logs`
+    once the day is older than the archive horizon. `events` is a compressed columnar blob
+    (see trips/archive.py); reads merge it back in front of the trip's remaining events.
+    """
+    trip = models.ForeignKey(Trip, related_name='archived_days', on_delete=models.CASCADE)
+    log_date = models.DateField()
+    event_count = models.PositiveIntegerField()
+    events = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['log_date']
+        unique_together = ('trip', 'log_date')
+
+    def __str__(self):
+        return f"Trip {self.trip_id}: {self.event_count} archived status changes on {self.log_date}"
+
+
+class WaypointType(models.TextChoices):
+    PICKUP = 'PICKUP', 'Pickup'
+    DROPOFF = 'DROPOFF', 'Drop-off'
+
+class Waypoint(models.Model):
+    """
+    A stop of a multi-stop trip. The visiting order is optimised when the route is
+    calculated and stored in `sequence`; a pickup is always visited before the
+    drop-offs of the same shipment.
+    """
+    trip = models.ForeignKey(Trip, related_name='waypoints', on_delete=models.CASCADE)
+    location = models.CharField(max_length=255)
+    stop_type = models.CharField(max_length=20, choices=WaypointType.choices, default=WaypointType.DROPOFF)
+    shipment = models.CharField(max_length=50, blank=True, help_text="Pairs pickups with their drop-offs")
+    sequence = models.PositiveIntegerField(default=0)
+    # Geocoded once and reused by later calculations
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
     class Meta:
-        ordering = ['start_time'] # Ensure logs are ordered correctly
+        ordering = ['sequence', 'id']
+
+    def __str__(self):
+        return f"{self.get_stop_type_display()} at {self.location} (Trip {self.trip_id}, #{self.sequence})"
+
+
+class Route(models.Model):
+    """
+    The route calculated for a trip, kept so the map can be shown again without
+    calling ORS or regenerating the logs. Geometry is stored as an encoded polyline.
+    """
+    trip = models.OneToOneField(Trip, related_name='route', on_delete=models.CASCADE)
+    total_distance_km = models.FloatField()
+    total_duration_hours_driving = models.FloatField()
+    encoded_geometry = models.TextField(blank=True, default='')
+    stops = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Log for Trip {self.trip.id} on {self.log_date}: {self.status} from {self.start_time.strftime('%H:%M')} to {self.end_time.strftime('%H:%M')}"
\ No newline at end of file
+        return f"Route for Trip {self.trip_id}: {self.total_distance_km:.1f} km"
+
+
+class HOSRule(models.TextChoices):
+    DRIVING_LIMIT = 'DRIVING_LIMIT', '11-hour driving limit'
+    DUTY_WINDOW = 'DUTY_WINDOW', '14-hour duty window'
+    BREAK_REQUIRED = 'BREAK_REQUIRED', '30-minute break after 8 hours driving'
+    CYCLE_LIMIT = 'CYCLE_LIMIT', '70-hour/8-day limit'
+    LOG_OVERLAP = 'LOG_OVERLAP', 'Duplicate or out-of-order status changes'
+    LOG_AFTER_END = 'LOG_AFTER_END', 'Status changes after the end of the log'
+
+class AuditFinding(models.Model):
+    """
+    An hours-of-service violation found in a trip's stored log by `manage.py audit_hos`.
+    Re-auditing a trip replaces its findings.
+    """
+    trip = models.ForeignKey(Trip, related_name='audit_findings', on_delete=models.CASCADE)
+    rule = models.CharField(max_length=30, choices=HOSRule.choices)
+    occurred_at = models.DateTimeField()
+    observed_hours = models.FloatField()
+    limit_hours = models.FloatField()
+    detail = models.CharField(max_length=255, blank=True)
+    audited_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['trip', 'occurred_at']
+
+    def __str__(self):
+        return f"Trip {self.trip_id}: {self.get_rule_display()} at {self.occurred_at:%Y-%m-%d %H:%M}"
+
+
+class RequestProfile(models.Model):
+    """
+    A profiled trip API request (see trips/profiling.py). Only the newest
+    settings.PROFILE_RING_SIZE are kept.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    action = models.CharField(max_length=100, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    area_ms = models.JSONField(default=dict, help_text="Own time of the functions in each area: ORS client, ORM, serializers, HOS loop...")
+    report = models.TextField(help_text="Call tree and the slowest functions")
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+    @classmethod
+    def trim(cls):
+        """
+        Drops all but the newest PROFILE_RING_SIZE profiles.
+        """
+        from .db_routing import PRIMARY
+        # Read on the primary too: a lagging replica would pick too old a cutoff, or none
+        profiles = cls.objects.using(PRIMARY)
+        oldest_kept = profiles.order_by('-pk').values_list('pk', flat=True)[settings.PROFILE_RING_SIZE - 1:settings.PROFILE_RING_SIZE].first()
+        if oldest_kept is not None:
+            profiles.filter(pk__lt=oldest_kept).delete()
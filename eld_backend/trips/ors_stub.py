@@ -0,0 +1,145 @@
+# eld_backend/trips/ors_stub.py
+"""
+A local stand-in for the OpenRouteService endpoints the backend calls (geocode search,
+HGV directions and the HGV matrix), for load tests that shouldn't depend on, or be
+rate-limited by, the real service.
+
+Locations geocode deterministically to a point in the continental US derived from the
+text, routes are straight lines with road-like distances and durations. Every response
+can be delayed (latency_ms +/- jitter_ms) and a fraction of requests fails with 503.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from .facilities import haversine_km
+
+# Bounding box geocoded locations fall in: (min_lat, max_lat, min_lon, max_lon)
+GEOCODE_BOUNDS = (30.0, 47.0, -120.0, -75.0)
+DETOUR_FACTOR = 1.3 # Road distance relative to the straight line
+SPEED_KMH = 70
+POINTS_PER_LEG = 50 # Geometry vertices per leg, so routes have a realistic payload size
+
+
+def geocode(text):
+    digest = hashlib.sha256(text.strip().lower().encode('utf-8')).digest()
+    min_lat, max_lat, min_lon, max_lon = GEOCODE_BOUNDS
+    lat = min_lat + (max_lat - min_lat) * int.from_bytes(digest[:4], 'big') / 2 ** 32
+    lon = min_lon + (max_lon - min_lon) * int.from_bytes(digest[4:8], 'big') / 2 ** 32
+    return [round(lon, 6), round(lat, 6)]
+
+
+def road_km(origin, destination):
+    return haversine_km(origin[1], origin[0], destination[1], destination[0]) * DETOUR_FACTOR
+
+
+def directions(coordinates):
+    geometry = []
+    for start, end in zip(coordinates, coordinates[1:]):
+        for k in range(POINTS_PER_LEG):
+            fraction = k / POINTS_PER_LEG
+            geometry.append([start[0] + (end[0] - start[0]) * fraction, start[1] + (end[1] - start[1]) * fraction])
+    geometry.append(coordinates[-1])
+    distance_km = sum(road_km(start, end) for start, end in zip(coordinates, coordinates[1:]))
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": geometry},
+            "properties": {"summary": {"distance": distance_km * 1000, "duration": distance_km / SPEED_KMH * 3600}},
+        }],
+    }
+
+
+def matrix(locations):
+    distances = [[road_km(origin, destination) for destination in locations] for origin in locations]
+    durations = [[distance_km / SPEED_KMH * 3600 for distance_km in row] for row in distances]
+    return {"distances": distances, "durations": durations}
+
+
+class StubORSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0, jitter_ms=0, error_rate=0.0):
+        super().__init__(address, StubORSHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.counts = {} # "<endpoint>" / "<endpoint>:error" -> requests served
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        """
+        Serves in a daemon thread. Returns the server; call shutdown() to stop it.
+        """
+        threading.Thread(target=self.serve_forever, name="ors-stub", daemon=True).start()
+        return self
+
+
+class StubORSHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass # Thousands of requests per run would drown the report
+
+    def _send(self, status_code, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, endpoint):
+        """
+        Applies latency and error injection. Returns False if the request was failed.
+        """
+        delay_ms = self.server.latency_ms + random.uniform(-self.server.jitter_ms, self.server.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if random.random() < self.server.error_rate:
+            self.server.count(f"{endpoint}:error")
+            self._send(503, {"error": "Injected failure from the ORS stub."})
+            return False
+        self.server.count(endpoint)
+        return True
+
+    def _json_body(self):
+        return json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/geocode/search':
+            self._send(404, {"error": f"Unknown path {url.path}"})
+            return
+        if not self._simulate('geocode'):
+            return
+        text = parse_qs(url.query).get('text', [''])[0]
+        self._send(200, {"features": [{"geometry": {"type": "Point", "coordinates": geocode(text)}}]})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path.startswith('/v2/directions/'):
+            endpoint, handler, field = 'directions', directions, 'coordinates'
+        elif path.startswith('/v2/matrix/'):
+            endpoint, handler, field = 'matrix', matrix, 'locations'
+        else:
+            self._send(404, {"error": f"Unknown path {path}"})
+            return
+        try:
+            points = self._json_body()[field]
+        except (ValueError, KeyError):
+            self._send(400, {"error": f"Request body must be JSON with '{field}'."})
+            return
+        if self._simulate(endpoint):
+            self._send(200, handler(points))
@@ -0,0 +1,150 @@
+# eld_backend/trips/places.py
+"""
+In-memory prefix index of known places for location autocomplete.
+
+Places come from the gazetteer (see trips/estimate.py) and from coordinates already stored
+on trips and waypoints; places geocoded while the process runs are added as they come in.
+The first source to know a name wins, so the gazetteer is loaded first: stored coordinates
+may have been sent by a client and aren't checked.
+Normalized names are kept in a sorted list, and so are the name suffixes starting at each
+later word before the comma ('louis, mo' for 'st louis, mo'). Both are searched with
+bisect, so a lookup costs O(log n + limit) whatever the index size.
+
+The index is built on first use rather than when the application loads: building it
+queries the database.
+"""
+import bisect
+import threading
+from collections import namedtuple
+from django.db import DatabaseError
+from .estimate import load_gazetteer, normalize_location
+
+MAX_SUGGESTIONS = 10
+MAX_STORED_PLACES = 50000 # Most recent distinct locations read from the database at startup
+
+Place = namedtuple('Place', ['name', 'longitude', 'latitude', 'source'])
+
+
+def _word_keys(key):
+    city, separator, rest = key.partition(', ')
+    words = city.split(' ')
+    return [' '.join(words[i:]) + separator + rest for i in range(1, len(words))]
+
+
+def _prefix_range(entries, prefix, limit):
+    """
+    Normalized names of up to `limit` of the sorted (index key, normalized name) entries
+    whose index key starts with prefix.
+    """
+    i = bisect.bisect_left(entries, (prefix,))
+    matches = []
+    while i < len(entries) and len(matches) < limit and entries[i][0].startswith(prefix):
+        matches.append(entries[i][1])
+        i += 1
+    return matches
+
+
+class PlaceIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = [] # Sorted (normalized name, normalized name), the same shape as _words
+        self._words = [] # Sorted (name suffix from a later word, normalized name)
+        self._places = {} # normalized name -> Place
+
+    def __len__(self):
+        return len(self._places)
+
+    def add(self, name, coords, source):
+        """
+        Adds a place ([lon, lat]) unless one with the same normalized name is already known.
+        """
+        key = normalize_location(name)
+        if not key or coords is None:
+            return
+        with self._lock:
+            if key in self._places:
+                return
+            self._places[key] = Place(name.strip(), coords[0], coords[1], source)
+            bisect.insort(self._names, (key, key))
+            for word_key in _word_keys(key):
+                bisect.insort(self._words, (word_key, key))
+
+    def add_many(self, places):
+        """
+        Bulk load of (name, [lon, lat], source), sorted once at the end.
+        """
+        with self._lock:
+            for name, coords, source in places:
+                key = normalize_location(name)
+                if key and coords is not None and key not in self._places:
+                    self._places[key] = Place(name.strip(), coords[0], coords[1], source)
+                    self._names.append((key, key))
+                    self._words.extend((word_key, key) for word_key in _word_keys(key))
+            self._names.sort()
+            self._words.sort()
+
+    def search(self, query, limit=MAX_SUGGESTIONS):
+        """
+        Places whose name, or a word in it, starts with the query. Name matches come first.
+        """
+        prefix = normalize_location(query)
+        if not prefix:
+            return []
+        with self._lock:
+            keys = _prefix_range(self._names, prefix, limit)
+            if len(keys) < limit:
+                # A name can match on several of its words ('san san ...'), hence the slack
+                word_matches = _prefix_range(self._words, prefix, 2 * (limit - len(keys)))
+                keys = list(dict.fromkeys(keys + word_matches))[:limit]
+            return [self._places[key] for key in keys]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _stored_places():
+    """
+    (name, [lon, lat], 'stored') for locations with coordinates on trips and waypoints.
+    """
+    from .models import Trip, Waypoint
+    for prefix in ('current', 'pickup', 'dropoff'):
+        rows = (
+            Trip.objects.filter(**{f'{prefix}_latitude__isnull': False, f'{prefix}_longitude__isnull': False})
+            .order_by('-pk').values_list(f'{prefix}_location', f'{prefix}_longitude', f'{prefix}_latitude')[:MAX_STORED_PLACES]
+        )
+        for name, longitude, latitude in rows:
+            yield name, [longitude, latitude], 'stored'
+    rows = (
+        Waypoint.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        .order_by('-pk').values_list('location', 'longitude', 'latitude')[:MAX_STORED_PLACES]
+    )
+    for name, longitude, latitude in rows:
+        yield name, [longitude, latitude], 'stored'
+
+
+def get_place_index():
+    """
+    The process-wide index, built on first use.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = PlaceIndex()
+                index.add_many((name, coords, 'gazetteer') for name, coords in load_gazetteer())
+                try:
+                    index.add_many(_stored_places())
+                except DatabaseError as e: # E.g. not migrated yet; the gazetteer still works
+                    print(f"Could not load stored places for autocomplete: {e}")
+                print(f"Loaded {len(index)} places for autocomplete.")
+                _index = index
+    return _index
+
+
+def add_place(name, coords):
+    """
+    Makes a newly geocoded place ([lon, lat]) available to autocomplete in this process.
+    """
+    if _index is not None: # Otherwise it's read from the database when the index is built
+        _index.add(name, coords, 'geocoded')
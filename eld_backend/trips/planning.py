@@ -0,0 +1,143 @@
+# eld_backend/trips/planning.py
+"""
+Route planning for multi-stop trips: stop ordering over a cached distance matrix and
+the leg schedule the HOS log generator drives through.
+"""
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from .facilities import RoutePath, plan_fuel_stops
+from .matrix import get_matrix
+from .models import WaypointType
+
+ORS_DIRECTIONS_PATH = "/v2/directions/driving-hgv/geojson"
+GEOMETRY_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _predecessors(waypoints):
+    """
+    Maps each node (1-based, 0 is the start) to the nodes that must be visited before it:
+    a drop-off comes after every pickup of the same shipment.
+    """
+    pickups_by_shipment = {}
+    for node, waypoint in enumerate(waypoints, start=1):
+        if waypoint.shipment and waypoint.stop_type == WaypointType.PICKUP:
+            pickups_by_shipment.setdefault(waypoint.shipment, set()).add(node)
+    return {
+        node: pickups_by_shipment.get(waypoint.shipment, set())
+        for node, waypoint in enumerate(waypoints, start=1)
+        if waypoint.shipment and waypoint.stop_type == WaypointType.DROPOFF
+    }
+
+
+def _is_feasible(order, predecessors):
+    position = {node: index for index, node in enumerate(order)}
+    return all(position[before] < position[node] for node, required in predecessors.items() for before in required)
+
+
+def _cost(order, durations):
+    previous, total = 0, 0.0
+    for node in order:
+        total += durations[previous][node]
+        previous = node
+    return total
+
+
+def order_stops(durations, predecessors, node_count):
+    """
+    Orders nodes 1..node_count (0 is the fixed start, the route is open-ended) to minimise
+    total driving time while keeping every pickup before its drop-offs.
+    Nearest-neighbour construction, then 2-opt segment reversals until no move improves.
+    """
+    remaining = set(range(1, node_count + 1))
+    order, current = [], 0
+    while remaining:
+        # Only nodes whose pickups have already been visited are eligible
+        eligible = [node for node in remaining if not (predecessors.get(node, set()) & remaining)]
+        current = min(eligible, key=lambda node: durations[current][node])
+        order.append(current)
+        remaining.remove(current)
+
+    best_cost = _cost(order, durations)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for k in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:k + 1][::-1] + order[k + 1:]
+                candidate_cost = _cost(candidate, durations)
+                if candidate_cost < best_cost - 1e-9 and _is_feasible(candidate, predecessors):
+                    order, best_cost, improved = candidate, candidate_cost, True
+    return order
+
+
+def _fetch_geometry(coordinates, api_key):
+    """
+    Road geometry through the ordered stops: one directions request, cached by the
+    coordinate sequence. Falls back to straight lines between stops.
+    """
+    import requests # Imported on first use rather than at worker start
+
+    key = "route-geometry:" + hashlib.sha256(json.dumps(coordinates).encode('utf-8')).hexdigest()
+    geometry = cache.get(key)
+    if geometry is not None:
+        return geometry
+    headers = {
+        "Accept": "application/json, application/geo+json",
+        "Authorization": api_key,
+        "Content-Type": "application/json; charset=utf-8"
+    }
+    body = {"coordinates": coordinates, "units": "km", "radiuses": [-1] * len(coordinates)}
+    try:
+        response = requests.post(settings.ORS_BASE_URL + ORS_DIRECTIONS_PATH, headers=headers, data=json.dumps(body), timeout=30)
+        response.raise_for_status()
+        geometry = response.json()['features'][0]['geometry']['coordinates']
+    except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
+        print(f"Route geometry error with OpenRouteService: {e}. Drawing straight lines between stops.")
+        return coordinates
+    cache.set(key, geometry, GEOMETRY_CACHE_TIMEOUT)
+    return geometry
+
+
+def plan_waypoint_route(start_coords, waypoints, api_key, stop_duration_hours, fueling_interval_km, fueling_duration_hours):
+    """
+    Plans a trip through geocoded waypoints (objects with latitude/longitude), starting at
+    start_coords ([lon, lat]). Sets each waypoint's `sequence` to its position in the
+    optimised order.
+
+    Returns (route_info, waypoint_stops). waypoint_stops lists the on-duty stops in visiting
+    order, each with "at_driving_hours": the cumulative driving time at which it is reached.
+    """
+    coordinates = [start_coords] + [[waypoint.longitude, waypoint.latitude] for waypoint in waypoints]
+    distances, durations = get_matrix(coordinates, api_key)
+    order = order_stops(durations, _predecessors(waypoints), len(waypoints))
+
+    waypoint_stops = []
+    total_distance_km = total_hours = 0.0
+    previous = 0
+    for sequence, node in enumerate(order):
+        waypoint = waypoints[node - 1]
+        waypoint.sequence = sequence
+        total_distance_km += distances[previous][node]
+        total_hours += durations[previous][node]
+        waypoint_stops.append({
+            "type": waypoint.stop_type.lower(),
+            "location": waypoint.location,
+            "duration_hrs": stop_duration_hours,
+            "latitude": waypoint.latitude,
+            "longitude": waypoint.longitude,
+            "at_driving_hours": total_hours,
+        })
+        previous = node
+
+    path_coordinates = _fetch_geometry([coordinates[0]] + [coordinates[node] for node in order], api_key)
+    route_info = {
+        "path_coordinates": path_coordinates,
+        "total_distance_km": total_distance_km,
+        "total_duration_hours_driving": total_hours,
+        "estimated_stops_and_rests": plan_fuel_stops(
+            RoutePath(path_coordinates), total_distance_km, fueling_interval_km, fueling_duration_hours
+        ),
+    }
+    return route_info, waypoint_stops
@@ -0,0 +1,53 @@
+# eld_backend/trips/polyline.py
+"""
+Encoded polyline format (as used by Google Maps, OSRM and ORS) for storing route geometry
+compactly: each coordinate is stored as a varint-style delta from the previous one in
+printable ASCII, typically 4-6 bytes per point instead of ~40 as JSON floats.
+
+Route geometry in this app is [lon, lat] (GeoJSON order); the encoded string holds the
+conventional (lat, lon) pairs and decode() returns [lon, lat] again.
+"""
+
+PRECISION = 5 # ~1 m, plenty for drawing a route on a map
+
+
+def _encode_value(value, output):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        output.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    output.append(chr(value + 63))
+
+
+def encode(path_coordinates, precision=PRECISION):
+    factor = 10 ** precision
+    output = []
+    previous_lat = previous_lon = 0
+    for point in path_coordinates:
+        lat, lon = round(point[1] * factor), round(point[0] * factor)
+        _encode_value(lat - previous_lat, output)
+        _encode_value(lon - previous_lon, output)
+        previous_lat, previous_lon = lat, lon
+    return ''.join(output)
+
+
+def decode(encoded, precision=PRECISION):
+    factor = 10 ** precision
+    path_coordinates = []
+    index = lat = lon = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        path_coordinates.append([lon / factor, lat / factor])
+    return path_coordinates
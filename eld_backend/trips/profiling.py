@@ -0,0 +1,146 @@
+# eld_backend/trips/profiling.py
+"""
+On-demand profiling of TripViewSet requests for staff users.
+
+A staff user adds `X-Profile: 1` or `?profile=1` to any trip endpoint. The request is run
+under cProfile (only the request's own thread: the streamed calculation runs elsewhere
+and isn't covered), and the report is stored as a RequestProfile row, viewable in the
+admin. Only the newest PROFILE_RING_SIZE reports are kept. The response carries the
+report id in X-Profile-Id and the time per area in a Server-Timing header, which the
+browser's network panel shows.
+
+Time per area is the sum of each function's own time, grouped by where the function is
+defined, so the areas add up to the total.
+"""
+import cProfile
+import os
+import pstats
+import sysconfig
+import time
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+TREE_MAX_DEPTH = 25
+TREE_MIN_FRACTION = 0.01 # Calls below 1% of the request's time are left out of the tree
+TOP_FUNCTIONS = 30
+
+_STDLIB = sysconfig.get_paths()['stdlib']
+_TRIPS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (area, fragments of the file path, or of the name of built-in functions, that count
+# towards it), first match wins
+AREAS = (
+    ('ors_client', ('/requests/', '/urllib3/', '/http/client.py', '/ssl.py', '/socket.py', "'_socket.", "'_ssl.")),
+    ('orm', ('/django/db/', '/sqlite3/', "'sqlite3.", 'CursorWrapper.', '/psycopg')),
+    ('serializers', ('/rest_framework/serializers.py', '/rest_framework/fields.py', '/rest_framework/relations.py',
+                     os.path.join(_TRIPS_DIR, 'serializers.py'))),
+    ('hos_loop', (os.path.join(_TRIPS_DIR, 'views.py'),)), # The route and HOS log generation
+    ('trips', (_TRIPS_DIR + os.sep,)),
+    ('django_drf', ('/django/', '/rest_framework/')),
+)
+
+
+def profiling_requested(request):
+    """
+    True for staff users asking for a profile. `request` is a DRF request (authenticated).
+    """
+    flag = request.META.get(PROFILE_HEADER) or request.query_params.get(PROFILE_PARAM)
+    return bool(flag) and flag.lower() not in ('0', 'false') and bool(getattr(request.user, 'is_staff', False))
+
+
+def start():
+    """
+    Starts profiling the current thread. Returns the profiler and start time, or None if
+    another profiler is already running.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError: # Another profiler is active in this thread
+        return None
+    return profiler, time.perf_counter()
+
+
+def _area(func):
+    filename, _, name = func
+    where = name if filename == '~' else filename # Built-ins have no file
+    for area, fragments in AREAS:
+        if any(fragment in where for fragment in fragments):
+            return area
+    if filename.startswith((_STDLIB, '<frozen ')):
+        return 'stdlib'
+    return 'other'
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~': # Built-in functions
+        return name
+    return f"{name} ({os.path.relpath(filename) if filename.startswith(os.getcwd()) else filename}:{line})"
+
+
+def _call_tree(stats, total):
+    """
+    Indented call tree by cumulative time, from the functions nobody in the profile called.
+    """
+    stats.calc_callees()
+    lines = []
+    minimum = total * TREE_MIN_FRACTION
+
+    def walk(func, cumulative, calls, depth, path):
+        lines.append(f"{'  ' * depth}{cumulative * 1000:9.1f} ms {calls:>7}x  {_label(func)}")
+        if depth >= TREE_MAX_DEPTH:
+            return
+        callees = stats.all_callees.get(func, {})
+        # Per-caller entries are (primitive calls, calls, own time, cumulative time)
+        for callee, (_, callee_calls, _, callee_cumulative) in sorted(callees.items(), key=lambda item: -item[1][3]):
+            if callee_cumulative >= minimum and callee not in path:
+                walk(callee, callee_cumulative, callee_calls, depth + 1, path | {callee})
+
+    roots = [func for func, (_, _, _, _, callers) in stats.stats.items() if not callers]
+    for root in sorted(roots, key=lambda func: -stats.stats[func][3]):
+        if stats.stats[root][3] >= minimum:
+            walk(root, stats.stats[root][3], stats.stats[root][1], 0, {root})
+    return "\n".join(lines)
+
+
+def finish(request, response, action, started):
+    """
+    Stops the profiler from start(), stores the report and adds the response headers.
+    """
+    from .models import RequestProfile
+    profiler, started_at = started
+    profiler.disable()
+    duration = time.perf_counter() - started_at
+
+    stats = pstats.Stats(profiler)
+    areas = {}
+    for func, (_, _, own_time, _, _) in stats.stats.items():
+        area = _area(func)
+        areas[area] = areas.get(area, 0.0) + own_time
+    top = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+    report = "\n".join([
+        "Call tree (cumulative time, calls, function)",
+        _call_tree(stats, duration),
+        "",
+        f"Top {TOP_FUNCTIONS} functions by cumulative time (cumulative ms, own ms, calls, function)",
+        *(f"{cumulative * 1000:9.1f} {own * 1000:9.1f} {calls:>7}  {_label(func)}"
+          for func, (_, calls, own, cumulative, _) in top),
+    ])
+
+    profile = RequestProfile.objects.create(
+        user=request.user if request.user.is_authenticated else None,
+        method=request.method,
+        path=request.get_full_path()[:500],
+        action=action or '',
+        status_code=response.status_code,
+        duration_ms=duration * 1000,
+        area_ms={area: round(seconds * 1000, 3) for area, seconds in sorted(areas.items(), key=lambda item: -item[1])},
+        report=report,
+    )
+    RequestProfile.trim()
+    response['X-Profile-Id'] = str(profile.pk)
+    response['Server-Timing'] = ", ".join(
+        [f"{area};dur={ms:.1f}" for area, ms in profile.area_ms.items()] + [f"total;dur={profile.duration_ms:.1f}"]
+    )
+    return response
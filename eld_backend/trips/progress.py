@@ -0,0 +1,65 @@
+# eld_backend/trips/progress.py
+"""
+Server-sent events (text/event-stream) for reporting progress of a long-running task.
+
+stream_events runs the task in a background thread and yields each event the task emits
+as soon as it is emitted, with comment lines in between to keep proxies from timing out
+an idle connection.
+"""
+import json
+import queue
+import threading
+from django.db import connection
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+HEARTBEAT_SECONDS = 15
+_FINISHED = object()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets DRF content negotiation accept `Accept: text/event-stream`. Responses that aren't
+    streams, such as errors raised before the stream starts, are rendered as a single "error"
+    event, so a client reading the stream sees them like errors raised during it.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event('error', data).encode(self.charset)
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
+
+
+def stream_events(task):
+    """
+    Calls task(emit) in a thread, where emit(name, data) sends an event, and yields the
+    formatted events. The task's return value is sent as a final "done" event, or an
+    exception as "error". The task keeps running if the client disconnects.
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            events.put(('done', task(lambda name, data: events.put((name, data)))))
+        except Exception as e: # Reported to the client instead of being lost with the thread
+            print(f"Streamed task failed: {e}")
+            events.put(('error', {"error": str(e)}))
+        finally:
+            connection.close() # This thread's own database connection
+            events.put(_FINISHED)
+
+    threading.Thread(target=run, name="event-stream-task", daemon=True).start()
+    while True:
+        try:
+            event = events.get(timeout=HEARTBEAT_SECONDS)
+        except queue.Empty:
+            yield ": keep-alive\n\n"
+            continue
+        if event is _FINISHED:
+            return
+        yield format_event(*event)
@@ -0,0 +1,99 @@
+# eld_backend/trips/response_cache.py
+"""
+Cached serialized trip detail and logs responses.
+
+Entries are keyed by the trip's updated_at, which every save and log regeneration bumps, so
+a changed trip is never served from an older entry: there is nothing to invalidate, and a
+slow reader that caches what it read before a write only fills the key of the old version.
+Old versions expire after TRIP_RESPONSE_CACHE_TIMEOUT.
+"""
+import threading
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from .models import Trip
+
+# Response kinds that are cached per trip
+DETAIL = 'detail'
+LOGS = 'logs'
+CACHED_KINDS = (DETAIL, LOGS)
+
+# Hit/miss counters of this worker process, keyed by (kind, outcome)
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _response_key(kind, trip_id, version):
+    return f"trip-response:{kind}:{trip_id}:{version.timestamp()}"
+
+
+def _normalize_trip_id(trip_id):
+    """
+    URL kwargs arrive as strings ('7', '07'); only plain integer ids are cached
+    so that every spelling of an id hits the same key.
+    """
+    try:
+        return int(trip_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _count(kind, outcome):
+    # Kept in memory rather than in the cache, so a lookup doesn't cost a cache write
+    with _stats_lock:
+        _stats[kind, outcome] += 1
+
+
+def trip_version(trip_id):
+    """
+    The trip's updated_at (the version its responses are cached under), or None if there is
+    no such trip. A primary key lookup, far cheaper than building the response.
+    """
+    trip_id = _normalize_trip_id(trip_id)
+    if trip_id is None:
+        return None
+    return Trip.objects.filter(pk=trip_id).values_list('updated_at', flat=True).first()
+
+
+def get_response(kind, trip_id, version):
+    """
+    Returns the cached serialized data for a trip response at the given version
+    (see trip_version), or None on a miss.
+    """
+    trip_id = _normalize_trip_id(trip_id)
+    if trip_id is None or version is None:
+        return None
+    data = cache.get(_response_key(kind, trip_id, version))
+    _count(kind, 'hits' if data is not None else 'misses')
+    return data
+
+
+def set_response(kind, trip_id, version, data):
+    """
+    Caches data serialized from the trip at `version`: the updated_at of the trip instance
+    the data was built from.
+    """
+    trip_id = _normalize_trip_id(trip_id)
+    if trip_id is None:
+        return
+    # Data read from a lagging replica is keyed by the older version it was built from, so
+    # clients reading the current version never get it
+    cache.set(_response_key(kind, trip_id, version), data, settings.TRIP_RESPONSE_CACHE_TIMEOUT)
+
+
+def get_stats():
+    """
+    Hit/miss counters per response kind, of the worker process that serves the request.
+    """
+    stats = {}
+    for kind in CACHED_KINDS:
+        hits = _stats[kind, 'hits']
+        misses = _stats[kind, 'misses']
+        lookups = hits + misses
+        stats[kind] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+    stats["backend"] = settings.CACHES['default']['BACKEND']
+    return stats
@@ -0,0 +1,64 @@
+# eld_backend/trips/segments.py
+"""
+Per-day log entries materialized from duty status change events.
+
+A trip's log is stored as DutyStatusEvent rows, one per change of status, and ends at
+Trip.log_end_time. Log entries in the shape the API has always returned (one per status
+run per day, the day's last one ending at 23:59:59.999999) are derived here on read.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from .archive import trip_archived_events
+
+# Attribute names match the LogEntry rows this replaces, so graph/serializer code reads either
+Segment = namedtuple('Segment', ['id', 'log_date', 'start_time', 'end_time', 'status'])
+
+
+def events_from_entries(entries):
+    """
+    Collapses generated log entries (dicts with start_time, end_time and status, in order)
+    into ([(timestamp, status)], end_time): only the entries that change the status remain.
+    Unlogged gaps between entries (e.g. the generator's day rollover) are absorbed by the
+    status before them.
+    """
+    events = []
+    for entry in entries:
+        if not events or events[-1][1] != entry['status']:
+            events.append((entry['start_time'], entry['status']))
+    return events, (entries[-1]['end_time'] if entries else None)
+
+
+def _day_start(moment):
+    local = timezone.localtime(moment)
+    return timezone.make_aware(datetime.combine(local.date(), time.min), local.tzinfo)
+
+
+def materialize(events, end_time):
+    """
+    Splits the status runs between consecutive (timestamp, status) events, the last one
+    running to end_time, at local midnight. Returns [Segment] numbered from 1 in time order.
+    """
+    segments = []
+    if end_time is None:
+        return segments
+    for (start, status), (end, _) in zip(events, list(events[1:]) + [(end_time, None)]):
+        while start < end:
+            next_day = _day_start(start) + timedelta(days=1)
+            if end < next_day:
+                segments.append(Segment(len(segments) + 1, timezone.localtime(start).date(), start, end, status))
+                break
+            day_end = next_day - timedelta(microseconds=1) # datetime.max.time() of the day, like the paper log
+            if day_end > start:
+                segments.append(Segment(len(segments) + 1, timezone.localtime(start).date(), start, day_end, status))
+            start = next_day
+    return segments
+
+
+def get_trip_segments(trip):
+    """
+    The trip's log entries, including archived days. Uses prefetched status_events and
+    archived_days when the queryset has them.
+    """
+    events = trip_archived_events(trip) + [(event.timestamp, event.status) for event in trip.status_events.all()]
+    return materialize(events, trip.log_end_time)
@@ -1,20 +1,113 @@
 # eld_backend/trips/serializers.py
+from django.db import transaction
 from rest_framework import serializers
-from .models import Trip, LogEntry, DutyStatus
+from .models import Trip, DutyStatus, Route, Waypoint
+from .segments import get_trip_segments
+from . import polyline
 
-class LogEntrySerializer(serializers.ModelSerializer):
+class LogEntrySerializer(serializers.Serializer):
+    """
+    A per-day log entry materialized from the trip's status changes (see trips/segments.py).
+    """
+    id = serializers.IntegerField(read_only=True) # Position in the trip's log, from 1
+    log_date = serializers.DateField(read_only=True)
+    start_time = serializers.DateTimeField(read_only=True)
+    end_time = serializers.DateTimeField(read_only=True)
+    status = serializers.ChoiceField(choices=DutyStatus.choices, read_only=True)
     # This will display the human-readable choice in the API output
-    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    status_display = serializers.SerializerMethodField()
 
+    def get_status_display(self, entry):
+        return DutyStatus(entry.status).label
+
+class WaypointSerializer(serializers.ModelSerializer):
     class Meta:
-        model = LogEntry
-        fields = ['id', 'log_date', 'start_time', 'end_time', 'status', 'status_display']
+        model = Waypoint
+        fields = ['id', 'location', 'stop_type', 'shipment', 'sequence', 'latitude', 'longitude']
+        read_only_fields = ['sequence'] # Set by the route optimisation; input order is kept until then
+        extra_kwargs = {
+            'latitude': {'min_value': -90, 'max_value': 90},
+            'longitude': {'min_value': -180, 'max_value': 180},
+        }
+
+
+LOCATION_FIELDS = ('current', 'pickup', 'dropoff') # Each has <name>_location, _latitude and _longitude
+
 
 class TripSerializer(serializers.ModelSerializer):
-    # Nest LogEntrySerializer to include related log entries when fetching a trip
-    log_entries = LogEntrySerializer(many=True, read_only=True)
+    # Nest LogEntrySerializer to include the trip's log entries when fetching a trip
+    log_entries = serializers.SerializerMethodField()
+    # Stops of a multi-stop trip; when given they replace pickup_location/dropoff_location
+    waypoints = WaypointSerializer(many=True, required=False)
 
     class Meta:
         model = Trip
-        fields = ['id', 'current_location', 'pickup_location', 'dropoff_location', 'current_cycle_used', 'created_at', 'updated_at', 'log_entries']
-        read_only_fields = ['created_at', 'updated_at'] # These are auto-managed
\ No newline at end of file
+        fields = [
+            'id', 'current_location', 'pickup_location', 'dropoff_location', 'current_cycle_used', 'created_at', 'updated_at',
+            'current_latitude', 'current_longitude', 'pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude',
+            'waypoints', 'log_entries',
+        ]
+        read_only_fields = ['created_at', 'updated_at'] # These are auto-managed
+        extra_kwargs = {
+            **{f'{name}_latitude': {'min_value': -90, 'max_value': 90} for name in LOCATION_FIELDS},
+            **{f'{name}_longitude': {'min_value': -180, 'max_value': 180} for name in LOCATION_FIELDS},
+        }
+
+    def get_log_entries(self, trip):
+        return LogEntrySerializer(get_trip_segments(trip), many=True).data
+
+    def validate(self, attrs):
+        has_waypoints = bool(attrs.get('waypoints', self.instance.waypoints.exists() if self.instance else False))
+        pickup = attrs.get('pickup_location', getattr(self.instance, 'pickup_location', ''))
+        dropoff = attrs.get('dropoff_location', getattr(self.instance, 'dropoff_location', ''))
+        if not has_waypoints and not (pickup and dropoff):
+            raise serializers.ValidationError("Provide pickup_location and dropoff_location, or a list of waypoints.")
+        for name in LOCATION_FIELDS:
+            latitude, longitude = f'{name}_latitude', f'{name}_longitude'
+            if (latitude in attrs) != (longitude in attrs) or (attrs.get(latitude) is None) != (attrs.get(longitude) is None):
+                raise serializers.ValidationError(f"Provide both {latitude} and {longitude}, or neither.")
+            location = f'{name}_location'
+            if self.instance and latitude not in attrs and attrs.get(location, getattr(self.instance, location)) != getattr(self.instance, location):
+                # Coordinates of the old text would be reused for the new location
+                attrs[latitude] = attrs[longitude] = None
+        return attrs
+
+    def _save_waypoints(self, trip, waypoints):
+        Waypoint.objects.bulk_create([
+            Waypoint(trip=trip, sequence=sequence, **waypoint) for sequence, waypoint in enumerate(waypoints)
+        ])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        waypoints = validated_data.pop('waypoints', [])
+        trip = super().create(validated_data)
+        self._save_waypoints(trip, waypoints)
+        return trip
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        waypoints = validated_data.pop('waypoints', None)
+        trip = super().update(instance, validated_data)
+        if waypoints is not None: # A waypoint list replaces the existing stops
+            trip.waypoints.all().delete()
+            self._save_waypoints(trip, waypoints)
+        return trip
+
+
+class RouteSerializer(serializers.ModelSerializer):
+    # Same field names as the route_info returned by calculate_route_and_logs
+    path_coordinates = serializers.SerializerMethodField()
+    estimated_stops_and_rests = serializers.JSONField(source='stops', read_only=True)
+
+    class Meta:
+        model = Route
+        fields = ['path_coordinates', 'total_distance_km', 'total_duration_hours_driving', 'estimated_stops_and_rests', 'updated_at']
+
+    def get_path_coordinates(self, route):
+        return polyline.decode(route.encoded_geometry)
+
+
+class EncodedRouteSerializer(RouteSerializer):
+    # For map clients that decode polylines themselves; much smaller than the coordinate list
+    class Meta(RouteSerializer.Meta):
+        fields = ['encoded_geometry', 'total_distance_km', 'total_duration_hours_driving', 'estimated_stops_and_rests', 'updated_at']
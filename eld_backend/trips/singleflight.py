@@ -0,0 +1,180 @@
+# eld_backend/trips/singleflight.py
+"""
+Single-flight coordination for calculate_route_and_logs.
+
+Only one calculation per trip runs at a time, across threads and worker processes,
+using an OS file lock. A request whose inputs hash to the same key as a calculation
+that is in flight (or finished moments ago) waits for it and reuses its result
+instead of calling ORS and rewriting the log entries again.
+
+A lock file only exists while a calculation for the trip is running or waited for, and
+result files are swept once they are older than SINGLE_FLIGHT_RESULT_TTL, so the directory
+only holds files of recently calculated trips.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+POLL_INTERVAL_SECONDS = 0.1
+
+
+class SingleFlightTimeout(Exception):
+    """Raised when a waiting request gives up on the calculation in flight."""
+
+
+def _lock_dir():
+    path = settings.SINGLE_FLIGHT_DIR or os.path.join(tempfile.gettempdir(), 'eld-singleflight')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def flight_key(trip):
+    """
+    Trip id plus a hash of every trip field the calculation reads, including the stored
+    coordinates that skip geocoding. The start date is included because logs are laid out
+    from today's date.
+    """
+    inputs = {
+        "created_at": trip.created_at.isoformat(), # Tells apart trips that reuse an id after a database reset
+        "current_location": trip.current_location,
+        "pickup_location": trip.pickup_location,
+        "dropoff_location": trip.dropoff_location,
+        "coordinates": [
+            [getattr(trip, f'{name}_latitude'), getattr(trip, f'{name}_longitude')]
+            for name in ('current', 'pickup', 'dropoff')
+        ],
+        "current_cycle_used": trip.current_cycle_used,
+        "start_date": timezone.localdate().isoformat(),
+        "waypoints": [
+            [waypoint.location, waypoint.stop_type, waypoint.shipment, waypoint.latitude, waypoint.longitude]
+            for waypoint in trip.waypoints.order_by('id')
+        ],
+    }
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return f"{trip.pk}:{digest}"
+
+
+def _try_lock(fd):
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _acquire(lock_path, deadline, trip_id):
+    """
+    Opens and locks the trip's lock file, waiting until the deadline. Returns the locked fd.
+    """
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        while not _try_lock(fd):
+            if time.monotonic() > deadline:
+                os.close(fd)
+                raise SingleFlightTimeout(f"Timed out waiting for the calculation in flight for trip {trip_id}.")
+            time.sleep(POLL_INTERVAL_SECONDS)
+        # The previous holder removes the file when done: a lock on the removed file excludes
+        # nobody who opens the path afterwards, so start over with the current file
+        try:
+            if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        _unlock(fd)
+        os.close(fd)
+
+
+def _release(lock_path, fd):
+    try:
+        os.remove(lock_path) # Before unlocking, so waiters see that it was removed
+    except OSError: # E.g. Windows doesn't remove open files; it's reused next time
+        pass
+    _unlock(fd)
+    os.close(fd)
+
+
+def _remove_expired_results(directory):
+    """
+    Removes result files older than SINGLE_FLIGHT_RESULT_TTL; they can't be reused any more.
+    """
+    cutoff = time.time() - settings.SINGLE_FLIGHT_RESULT_TTL
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.name.endswith('.result.json') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError: # Removed or replaced by another process meanwhile
+                pass
+
+
+def _read_result(result_path, key):
+    try:
+        with open(result_path, encoding='utf-8') as result_file:
+            stored = json.load(result_file)
+    except (OSError, ValueError):
+        return None
+    if stored.get("key") != key:
+        return None
+    if time.time() - stored.get("finished_at", 0) > settings.SINGLE_FLIGHT_RESULT_TTL:
+        return None
+    return stored["data"]
+
+
+def _write_result(result_path, key, data):
+    # Write to a temp file and rename so readers never see a half-written result
+    tmp_path = f"{result_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as result_file:
+        json.dump({"key": key, "finished_at": time.time(), "data": data}, result_file, cls=DjangoJSONEncoder)
+    os.replace(tmp_path, result_path)
+
+
+def run(trip, calculate):
+    """
+    Runs `calculate()` for the trip unless an identical calculation is in flight or
+    has just finished, in which case its result is returned. `calculate` must return
+    JSON-serializable data. Returns (data, shared) where shared is True if the
+    result was reused.
+    """
+    key = flight_key(trip)
+    directory = _lock_dir()
+    base_path = os.path.join(directory, f"trip-{trip.pk}")
+    result_path = f"{base_path}.result.json"
+    lock_path = f"{base_path}.lock"
+
+    fd = _acquire(lock_path, time.monotonic() + settings.SINGLE_FLIGHT_WAIT_SECONDS, trip.pk)
+    try:
+        # The previous lock holder may have just produced exactly what we need
+        data = _read_result(result_path, key)
+        if data is not None:
+            print(f"Reusing in-flight calculation result for trip {trip.pk}.")
+            return data, True
+        data = calculate()
+        # Round-trip through JSON so leader and followers return identical data
+        data = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+        _write_result(result_path, key, data)
+        _remove_expired_results(directory)
+        return data, False
+    finally:
+        _release(lock_path, fd)
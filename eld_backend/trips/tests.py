@@ -1,3 +1,809 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import Trip, Waypoint, Route, DutyStatus, DutyStatusEvent, ArchivedLogDay, RequestProfile
+from .progress import format_event
+from .archive import archive_trips, pack_events, unpack_events
+from .audit import HOSAudit, HOSRules
+from .facilities import Facility, FacilityIndex, RoutePath
+from .graph import build_day_graph
+from .intervals import TripIntervals
+from .planning import order_stops
+from .segments import Segment, get_trip_segments, materialize
+from .management.commands import loadtest
+from .management.commands.profile_startup import parse_importtime
+from . import db_routing, estimate, ors_stub, places, polyline, response_cache, singleflight
+
+offline = requests.exceptions.ConnectionError('offline')
+
+
+@override_settings(SINGLE_FLIGHT_RESULT_TTL=0)
+@mock.patch('requests.post', side_effect=offline)
+@mock.patch('requests.get', side_effect=offline)
+class ConcurrentRegenerationTests(TransactionTestCase):
+    """
+    Parallel calculate_route_and_logs writers and log readers against the real database
+    (a file database with WAL on SQLite). With ORS offline, routes are estimated between
+    gazetteer cities, so every regeneration produces the same status changes and log entries.
+    """
+    WRITERS_PER_TRIP = 3
+    ROUNDS = 4
+    READERS = 4
+
+    def setUp(self):
+        self.trips = [
+            Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX', current_cycle_used=10)
+            for _ in range(2)
+        ]
+
+    def _run_threads(self, targets):
+        errors = []
+
+        def wrapped(target):
+            try:
+                target()
+            except Exception as e: # Collected and asserted on in the main thread
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=wrapped, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=120)
+        self.assertFalse(any(thread.is_alive() for thread in threads), "Threads did not finish")
+        return errors
+
+    def test_parallel_writers_and_readers_make_progress(self, *mocks):
+        client = APIClient()
+        response = client.post(f'/api/trips/{self.trips[0].pk}/calculate_route_and_logs/')
+        self.assertEqual(response.status_code, 200)
+        expected_count = DutyStatusEvent.objects.filter(trip=self.trips[0]).count()
+        self.assertGreater(expected_count, 0)
+        logs = client.get(f'/api/trips/{self.trips[0].pk}/logs/').json()
+        expected_entries = sum(len(entries) for entries in logs.values())
+
+        writes_done = threading.Event()
+        completed_writes = []
+        observed_counts = []
+        observed_api_counts = []
+
+        def writer(trip):
+            def run():
+                writer_client = APIClient()
+                for _ in range(self.ROUNDS):
+                    response = writer_client.post(f'/api/trips/{trip.pk}/calculate_route_and_logs/')
+                    self.assertEqual(response.status_code, 200)
+                    completed_writes.append(trip.pk)
+            return run
+
+        def reader():
+            reader_client = APIClient()
+            while not writes_done.is_set():
+                # A reader must see either no logs yet or a complete set, never a half-written one
+                observed_counts.append(DutyStatusEvent.objects.filter(trip=self.trips[0]).count())
+                response = reader_client.get(f'/api/trips/{self.trips[1].pk}/logs/')
+                self.assertEqual(response.status_code, 200)
+                observed_api_counts.append(sum(len(entries) for entries in response.json().values()))
+
+        writers = [writer(trip) for trip in self.trips for _ in range(self.WRITERS_PER_TRIP)]
+        reader_errors = []
+        reader_threads_done = threading.Thread(
+            target=lambda: reader_errors.extend(self._run_threads([reader] * self.READERS))
+        )
+        reader_threads_done.start()
+        writer_errors = self._run_threads(writers)
+        writes_done.set()
+        reader_threads_done.join(timeout=120)
+
+        self.assertEqual(writer_errors, [])
+        self.assertEqual(reader_errors, [])
+        self.assertEqual(len(completed_writes), len(writers) * self.ROUNDS)
+        self.assertTrue(observed_counts)
+        self.assertEqual(set(observed_counts), {expected_count})
+        self.assertLessEqual(set(observed_api_counts), {0, expected_entries})
+        for trip in self.trips:
+            self.assertEqual(DutyStatusEvent.objects.filter(trip=trip).count(), expected_count)
+
+    def test_sqlite_connections_use_wal(self, *mocks):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite-specific pragmas')
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+        self.client = APIClient()
+
+    def test_saved_trip_is_not_served_from_older_entry(self):
+        url = f'/api/trips/{self.trip.pk}/'
+        self.assertEqual(self.client.get(url).json()['current_cycle_used'], 0)
+        response = self.client.patch(url, {'current_cycle_used': 12}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url).json()['current_cycle_used'], 12)
+
+    def test_stale_write_after_save_only_fills_old_version(self):
+        old_version = self.trip.updated_at
+        stale = {'id': self.trip.pk, 'current_cycle_used': 0}
+        self.trip.current_cycle_used = 5
+        self.trip.save()
+        # A reader that started before the save caches what it read afterwards
+        response_cache.set_response(response_cache.DETAIL, self.trip.pk, old_version, stale)
+        self.assertEqual(self.client.get(f'/api/trips/{self.trip.pk}/').json()['current_cycle_used'], 5)
+
+    def test_hits_are_counted(self):
+        url = f'/api/trips/{self.trip.pk}/logs/'
+        before = response_cache.get_stats()[response_cache.LOGS]
+        self.client.get(url)
+        self.client.get(url)
+        after = response_cache.get_stats()[response_cache.LOGS]
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class DayGraphTests(SimpleTestCase):
+    def test_step_line_and_totals(self):
+        day = date(2026, 3, 2)
+        entries = [
+            Segment(1, day, utc(2026, 3, 2, 0), utc(2026, 3, 2, 8), DutyStatus.OFF_DUTY),
+            Segment(2, day, utc(2026, 3, 2, 8), utc(2026, 3, 2, 9), DutyStatus.ON_DUTY_NOT_DRIVING),
+            Segment(3, day, utc(2026, 3, 2, 9), utc(2026, 3, 2, 17, 30), DutyStatus.DRIVING),
+            Segment(4, day, utc(2026, 3, 2, 17, 30), utc(2026, 3, 2, 23, 59, 59, 999999), DutyStatus.OFF_DUTY),
+        ]
+        graph = build_day_graph(day, entries)
+        # Rows: 0 Off Duty, 1 Sleeper Berth, 2 Driving, 3 On Duty
+        self.assertEqual(graph['vertices'], [[0.0, 0], [8.0, 0], [8.0, 3], [9.0, 3], [9.0, 2], [17.5, 2], [17.5, 0], [24.0, 0]])
+        self.assertEqual(graph['totals'], {'OFF_DUTY': 14.5, 'SLEEPER_BERTH': 0.0, 'DRIVING': 8.5, 'ON_DUTY_NOT_DRIVING': 1.0})
+        self.assertEqual(graph['total_on_duty'], 9.5)
+
+    def test_empty_day_is_off_duty(self):
+        graph = build_day_graph(date(2026, 3, 2), [])
+        self.assertEqual(graph['vertices'], [[0.0, 0], [24.0, 0]])
+        self.assertEqual(graph['total_on_duty'], 0)
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+
+    def test_key_covers_coordinates(self):
+        key = singleflight.flight_key(self.trip)
+        self.trip.pickup_latitude, self.trip.pickup_longitude = 39.7, -105.0
+        self.assertNotEqual(singleflight.flight_key(self.trip), key)
+
+    def test_result_is_shared_and_files_are_cleaned_up(self):
+        with override_settings(SINGLE_FLIGHT_DIR=self.directory, SINGLE_FLIGHT_RESULT_TTL=30):
+            self.assertEqual(singleflight.run(self.trip, lambda: {'n': 1}), ({'n': 1}, False))
+            self.assertEqual(singleflight.run(self.trip, lambda: {'n': 2}), ({'n': 1}, True))
+            self.assertEqual(os.listdir(self.directory), [f'trip-{self.trip.pk}.result.json']) # No lock file left
+            # Results past the TTL are swept by the next calculation
+            old = time.time() - 60
+            os.utime(os.path.join(self.directory, f'trip-{self.trip.pk}.result.json'), (old, old))
+            other = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+            singleflight.run(other, lambda: {'n': 3})
+            self.assertEqual(os.listdir(self.directory), [f'trip-{other.pk}.result.json'])
+
+
+class FacilityTests(SimpleTestCase):
+    def test_nearest_respects_radius_and_types(self):
+        index = FacilityIndex([
+            Facility('Rest Area', 'rest_area', 41.001, -87.0),
+            Facility('Fuel Near', 'fuel', 41.02, -87.0),
+            Facility('Fuel Far', 'fuel', 41.5, -87.0),
+        ])
+        self.assertEqual(index.nearest(41.0, -87.0, 5)[0].name, 'Rest Area')
+        facility, distance_km = index.nearest(41.0, -87.0, 5, types=('fuel',))
+        self.assertEqual(facility.name, 'Fuel Near')
+        self.assertAlmostEqual(distance_km, 2.22, places=2)
+        self.assertEqual(index.nearest(41.3, -87.0, 5, types=('fuel',)), (None, None))
+
+    def test_route_position_is_interpolated(self):
+        path = RoutePath([[-87.0, 41.0], [-87.0, 42.0], [-86.0, 42.0]])
+        latitude, longitude = path.point_at(path.cumulative_km[1] / 2)
+        self.assertAlmostEqual(latitude, 41.5)
+        self.assertAlmostEqual(longitude, -87.0)
+        self.assertEqual(path.point_at(path.length_km + 10), (42.0, -86.0))
+
+
+class PolylineTests(SimpleTestCase):
+    def test_known_encoding(self):
+        # The example from the encoded polyline format documentation, in [lon, lat] order
+        path = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+        self.assertEqual(polyline.encode(path), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(polyline.decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@'), path)
+
+    def test_round_trip_at_precision(self):
+        path = [[-87.629812, 41.878113], [-87.6, 41.9], [-104.990251, 39.739236], [0.0, 0.0], [-0.000004, -0.000006]]
+        decoded = polyline.decode(polyline.encode(path))
+        self.assertEqual(len(decoded), len(path))
+        for (lon, lat), (decoded_lon, decoded_lat) in zip(path, decoded):
+            self.assertAlmostEqual(lon, decoded_lon, places=5)
+            self.assertAlmostEqual(lat, decoded_lat, places=5)
+        self.assertEqual(polyline.decode(polyline.encode([])), [])
+
+
+class StoredRouteTests(TestCase):
+    def setUp(self):
+        self.trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+
+    def test_unknown_trip(self):
+        for trip_id in (self.trip.pk + 1, 'abc'):
+            self.assertEqual(APIClient().get(f'/api/trips/{trip_id}/route/').status_code, 404)
+
+    def test_route_not_calculated(self):
+        response = APIClient().get(f'/api/trips/{self.trip.pk}/route/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('not been calculated', response.json()['error'])
+
+    def test_stored_route(self):
+        path = [[-87.6298, 41.8781], [-104.9903, 39.7392]]
+        Route.objects.create(trip=self.trip, total_distance_km=1700.0, total_duration_hours_driving=20.0,
+                             encoded_geometry=polyline.encode(path))
+        response = APIClient().get(f'/api/trips/{self.trip.pk}/route/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['path_coordinates'], path)
+        response = APIClient().get(f'/api/trips/{self.trip.pk}/route/?geometry=encoded')
+        self.assertEqual(response.json()['encoded_geometry'], polyline.encode(path))
+        self.assertNotIn('path_coordinates', response.json())
+
+
+class StopOrderingTests(SimpleTestCase):
+    # Stops on a line, hours from the start (node 0): node 1 at 3, node 2 at 1, node 3 at 2
+    POSITIONS = [0, 3, 1, 2]
+
+    def durations(self):
+        return [[abs(a - b) for b in self.POSITIONS] for a in self.POSITIONS]
+
+    def cost(self, order):
+        return sum(self.durations()[a][b] for a, b in zip([0] + order, order))
+
+    def test_shortest_order_without_constraints(self):
+        self.assertEqual(order_stops(self.durations(), {}, 3), [2, 3, 1])
+
+    def test_pickup_stays_before_its_dropoff(self):
+        # Node 2 is a drop-off of the shipment picked up at node 1, the furthest stop
+        order = order_stops(self.durations(), {2: {1}}, 3)
+        self.assertLess(order.index(1), order.index(2))
+        self.assertEqual(self.cost(order), 5) # Out to the pickup, then back to the drop-off
+
+
+@override_settings(SINGLE_FLIGHT_RESULT_TTL=0)
+@mock.patch('requests.post', side_effect=offline)
+@mock.patch('requests.get', side_effect=offline)
+class MultiStopCalculationTests(TestCase):
+    CHICAGO, MILWAUKEE, INDIANAPOLIS = [-87.6298, 41.8781], [-87.9065, 43.0389], [-86.1581, 39.7684]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stops_are_logged_when_the_driving_reaches_them(self, *mocks):
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='', dropoff_location='')
+        # Indianapolis is nearer but its drop-off needs the Milwaukee pickup first
+        Waypoint.objects.create(trip=trip, location='Indianapolis, IN', stop_type='DROPOFF', shipment='A')
+        Waypoint.objects.create(trip=trip, location='Milwaukee, WI', stop_type='PICKUP', shipment='A')
+        response = APIClient().post(f'/api/trips/{trip.pk}/calculate_route_and_logs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(trip.waypoints.values_list('location', flat=True)), ['Milwaukee, WI', 'Indianapolis, IN'])
+
+        # Driving hours done when each on-duty stop starts
+        events = list(DutyStatusEvent.objects.filter(trip=trip).values_list('timestamp', 'status'))
+        trip.refresh_from_db()
+        driven, stops_at = 0.0, []
+        for (start, status), end in zip(events, [timestamp for timestamp, _ in events[1:]] + [trip.log_end_time]):
+            if status == DutyStatus.DRIVING:
+                driven += (end - start).total_seconds() / 3600
+            elif status == DutyStatus.ON_DUTY_NOT_DRIVING:
+                stops_at.append(driven)
+        to_pickup = estimate.estimate_leg(self.CHICAGO, self.MILWAUKEE)[1]
+        to_dropoff = to_pickup + estimate.estimate_leg(self.MILWAUKEE, self.INDIANAPOLIS)[1]
+        self.assertEqual(len(stops_at), 2)
+        self.assertAlmostEqual(stops_at[0], to_pickup, delta=1 / 60) # Log times are kept to the second
+        self.assertAlmostEqual(stops_at[1], to_dropoff, delta=1 / 60)
+        stops = [stop['location'] for stop in response.json()['route_info']['estimated_stops_and_rests']
+                 if stop['type'] in ('pickup', 'dropoff')]
+        self.assertEqual(stops, ['Milwaukee, WI', 'Indianapolis, IN'])
+
+
+class WaypointValidationTests(TestCase):
+    def test_coordinates_are_bounded(self):
+        for field, value in (('latitude', 500), ('latitude', -90.5), ('longitude', 180.5)):
+            waypoint = {'location': 'Joliet Yard', 'stop_type': 'PICKUP', 'latitude': 41.52, 'longitude': -88.08, field: value}
+            response = APIClient().post('/api/trips/', {'current_location': 'Chicago, IL', 'waypoints': [waypoint]}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(field, response.json()['waypoints'][0])
+        self.assertFalse(Trip.objects.exists())
+
+
+class IntervalTests(TestCase):
+    EVENTS = [
+        (utc(2026, 3, 2, 0), DutyStatus.OFF_DUTY),
+        (utc(2026, 3, 2, 8), DutyStatus.DRIVING),
+        (utc(2026, 3, 2, 12), DutyStatus.OFF_DUTY),
+    ]
+    END = utc(2026, 3, 2, 18)
+
+    def test_at_boundaries(self):
+        intervals = TripIntervals(materialize(self.EVENTS, self.END))
+        self.assertEqual(intervals.at(utc(2026, 3, 2, 8)).status, DutyStatus.DRIVING) # Start inclusive
+        self.assertEqual(intervals.at(utc(2026, 3, 2, 12)).status, DutyStatus.OFF_DUTY) # End exclusive
+        self.assertIsNone(intervals.at(utc(2026, 3, 1, 23)))
+        self.assertIsNone(intervals.at(self.END))
+
+    def test_overlapping_boundaries(self):
+        intervals = TripIntervals(materialize(self.EVENTS, self.END))
+        statuses = lambda start, end: [segment.status for segment in intervals.overlapping(start, end)]
+        # Windows ending where a run starts, or starting where it ends, don't overlap it
+        self.assertEqual(statuses(utc(2026, 3, 2, 0), utc(2026, 3, 2, 8)), [DutyStatus.OFF_DUTY])
+        self.assertEqual(statuses(utc(2026, 3, 2, 12), utc(2026, 3, 2, 13)), [DutyStatus.OFF_DUTY])
+        self.assertEqual(statuses(utc(2026, 3, 2, 7), utc(2026, 3, 2, 12, 0, 1)), [DutyStatus.OFF_DUTY, DutyStatus.DRIVING, DutyStatus.OFF_DUTY])
+        self.assertEqual(statuses(self.END, utc(2026, 3, 3)), [])
+
+    def test_unencoded_offset_is_accepted(self):
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX', log_end_time=self.END)
+        DutyStatusEvent.objects.bulk_create([DutyStatusEvent(trip=trip, timestamp=timestamp, status=status) for timestamp, status in self.EVENTS])
+        # 15:00+05:00 is 10:00 UTC; without encoding the '+' arrives as a space
+        response = APIClient().get(f'/api/trips/status_at/?trips={trip.pk}&time=2026-03-02T15:00:00+05:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[str(trip.pk)]['status'], DutyStatus.DRIVING)
+
+
+class HOSAuditTests(SimpleTestCase):
+    RULES = HOSRules(
+        max_driving_hours=11, max_duty_window_hours=14, max_cycle_hours=70, cycle_days=8,
+        min_off_duty_hours=10, min_break_hours=0.5, max_driving_before_break_hours=8,
+    )
+
+    def audit(self, events, log_end_time, prior_cycle_hours=0.0):
+        audit = HOSAudit(self.RULES, prior_cycle_hours)
+        audit.feed_events(events, log_end_time)
+        return {finding['rule']: finding for finding in audit.findings}
+
+    def test_compliant_day_has_no_findings(self):
+        events = [(utc(2026, 3, 2, 0), 'OFF_DUTY'), (utc(2026, 3, 2, 8), 'DRIVING'), (utc(2026, 3, 2, 15), 'OFF_DUTY')]
+        self.assertEqual(self.audit(events, utc(2026, 3, 3)), {})
+
+    def test_long_driving_breaks_shift_rules(self):
+        events = [(utc(2026, 3, 2, 6), 'DRIVING'), (utc(2026, 3, 2, 21), 'OFF_DUTY')]
+        findings = self.audit(events, utc(2026, 3, 3))
+        self.assertEqual(set(findings), {'DRIVING_LIMIT', 'DUTY_WINDOW', 'BREAK_REQUIRED'})
+        self.assertEqual(findings['DRIVING_LIMIT']['occurred_at'], utc(2026, 3, 2, 17))
+        self.assertEqual(findings['DRIVING_LIMIT']['observed_hours'], 15)
+        self.assertEqual(findings['BREAK_REQUIRED']['occurred_at'], utc(2026, 3, 2, 14))
+
+    def test_prior_cycle_hours_count_towards_the_cycle(self):
+        events = [(utc(2026, 3, 2, 8), 'ON_DUTY_NOT_DRIVING'), (utc(2026, 3, 2, 10), 'OFF_DUTY')]
+        findings = self.audit(events, utc(2026, 3, 3), prior_cycle_hours=69)
+        self.assertEqual(findings['CYCLE_LIMIT']['observed_hours'], 71)
+        self.assertEqual(findings['CYCLE_LIMIT']['occurred_at'], utc(2026, 3, 2, 9))
+
+    def test_raw_event_stream_checks(self):
+        events = [
+            (utc(2026, 3, 2, 0), 'OFF_DUTY'),
+            (utc(2026, 3, 2, 8), 'DRIVING'),
+            (utc(2026, 3, 2, 8), 'ON_DUTY_NOT_DRIVING'), # Duplicate timestamp
+            (utc(2026, 3, 2, 10), 'OFF_DUTY'),
+            (utc(2026, 3, 3, 2), 'DRIVING'), # After the end of the log
+        ]
+        findings = self.audit(events, utc(2026, 3, 3))
+        self.assertEqual(set(findings), {'LOG_OVERLAP', 'LOG_AFTER_END'})
+        self.assertEqual(findings['LOG_OVERLAP']['occurred_at'], utc(2026, 3, 2, 8))
+        self.assertEqual(findings['LOG_AFTER_END']['observed_hours'], 2)
+        self.assertEqual(self.audit(events[:1], None)['LOG_AFTER_END']['detail'], "The log has no end time")
+
+
+class MaterializeTests(SimpleTestCase):
+    def test_runs_are_split_at_midnight(self):
+        events = [(utc(2026, 3, 2, 20), DutyStatus.DRIVING), (utc(2026, 3, 3, 2), DutyStatus.OFF_DUTY)]
+        segments = materialize(events, utc(2026, 3, 3, 6))
+        self.assertEqual([(segment.log_date, segment.start_time, segment.end_time, segment.status) for segment in segments], [
+            (date(2026, 3, 2), utc(2026, 3, 2, 20), utc(2026, 3, 2, 23, 59, 59, 999999), DutyStatus.DRIVING),
+            (date(2026, 3, 3), utc(2026, 3, 3), utc(2026, 3, 3, 2), DutyStatus.DRIVING),
+            (date(2026, 3, 3), utc(2026, 3, 3, 2), utc(2026, 3, 3, 6), DutyStatus.OFF_DUTY),
+        ])
+        self.assertEqual([segment.id for segment in segments], [1, 2, 3])
+
+    def test_log_ending_at_end_of_day(self):
+        # Generated logs end at 23:59:59.999999, which stays on that day
+        end = utc(2026, 3, 2, 23, 59, 59, 999999)
+        segments = materialize([(utc(2026, 3, 2, 12), DutyStatus.OFF_DUTY)], end)
+        self.assertEqual([(segment.log_date, segment.end_time) for segment in segments], [(date(2026, 3, 2), end)])
+        # A run from that last microsecond doesn't produce an empty segment
+        self.assertEqual(materialize([(end, DutyStatus.DRIVING)], end), [])
+        self.assertEqual(materialize([(utc(2026, 3, 2), DutyStatus.DRIVING)], None), [])
+
+
+class DutyStatusEventMigrationTests(TransactionTestCase):
+    BEFORE = [('trips', '0006_audit_findings')]
+    AFTER = [('trips', '0007_duty_status_events')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_entries_to_events_and_back(self):
+        apps = self.migrate(self.BEFORE)
+        Trip, LogEntry = apps.get_model('trips', 'Trip'), apps.get_model('trips', 'LogEntry')
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+        entries = [
+            (utc(2026, 3, 2, 0), utc(2026, 3, 2, 8), 'OFF_DUTY'),
+            (utc(2026, 3, 2, 8), utc(2026, 3, 2, 12), 'DRIVING'),
+            (utc(2026, 3, 2, 12), utc(2026, 3, 2, 23, 59, 59, 999999), 'DRIVING'), # Same status, no event
+            (utc(2026, 3, 3), utc(2026, 3, 3, 4), 'OFF_DUTY'),
+        ]
+        LogEntry.objects.bulk_create([
+            LogEntry(trip_id=trip.pk, log_date=start.date(), start_time=start, end_time=end, status=status)
+            for start, end, status in entries
+        ])
+
+        apps = self.migrate(self.AFTER)
+        DutyStatusEvent = apps.get_model('trips', 'DutyStatusEvent')
+        self.assertEqual(
+            list(DutyStatusEvent.objects.filter(trip_id=trip.pk).order_by('timestamp').values_list('timestamp', 'status')),
+            [(utc(2026, 3, 2, 0), 'OFF_DUTY'), (utc(2026, 3, 2, 8), 'DRIVING'), (utc(2026, 3, 3), 'OFF_DUTY')],
+        )
+        self.assertEqual(apps.get_model('trips', 'Trip').objects.get(pk=trip.pk).log_end_time, utc(2026, 3, 3, 4))
+
+        apps = self.migrate(self.BEFORE)
+        LogEntry = apps.get_model('trips', 'LogEntry')
+        # One entry per status run, dated by its start
+        self.assertEqual(
+            list(LogEntry.objects.filter(trip_id=trip.pk).order_by('start_time').values_list('log_date', 'start_time', 'end_time', 'status')),
+            [
+                (date(2026, 3, 2), utc(2026, 3, 2, 0), utc(2026, 3, 2, 8), 'OFF_DUTY'),
+                (date(2026, 3, 2), utc(2026, 3, 2, 8), utc(2026, 3, 3), 'DRIVING'),
+                (date(2026, 3, 3), utc(2026, 3, 3), utc(2026, 3, 3, 4), 'OFF_DUTY'),
+            ],
+        )
+
+
+@override_settings(SINGLE_FLIGHT_RESULT_TTL=0)
+@mock.patch('requests.post', side_effect=offline)
+@mock.patch('requests.get', side_effect=offline)
+class CalculateStreamTests(TransactionTestCase):
+    def stream(self, response):
+        return b''.join(response.streaming_content).decode() if response.streaming else response.content.decode()
+
+    def test_streams_progress_then_done(self, *mocks):
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+        response = APIClient().post(f'/api/trips/{trip.pk}/calculate_stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        events = [line[len('event: '):] for line in self.stream(response).splitlines() if line.startswith('event: ')]
+        self.assertEqual(events[:2], ['geocoded', 'routed'])
+        self.assertEqual(events[-2:], ['saved', 'done'])
+        self.assertIn('day', events)
+        self.assertTrue(DutyStatusEvent.objects.filter(trip=trip).exists())
+
+    def test_get_does_not_calculate(self, *mocks):
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+        response = APIClient().get(f'/api/trips/{trip.pk}/calculate_stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 405)
+        self.assertFalse(DutyStatusEvent.objects.filter(trip=trip).exists())
+
+    def test_setup_error_is_an_error_event(self, *mocks):
+        response = APIClient().post('/api/trips/999999/calculate_stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.stream(response), format_event('error', {'detail': 'No Trip matches the given query.'}))
+
+
+@override_settings(DATABASE_REPLICAS=['default']) # Tests have no real replica; 'default' stands in
+class PrimaryPinTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+        self.client = APIClient()
+
+    def test_writes_return_a_pin(self):
+        response = self.client.patch(f'/api/trips/{self.trip.pk}/', {'current_cycle_used': 3}, format='json')
+        self.assertGreater(float(response[db_routing.PIN_HEADER]), time.time())
+        self.assertIn(db_routing.PIN_COOKIE, response.cookies)
+        self.assertNotIn(db_routing.PIN_HEADER, self.client.get(f'/api/trips/{self.trip.pk}/logs/'))
+
+    def test_pinned_reads_skip_the_cache(self):
+        # An entry built by another client from a replica that hadn't caught up yet
+        response_cache.set_response(response_cache.LOGS, self.trip.pk, self.trip.updated_at, {'stale': []})
+        url = f'/api/trips/{self.trip.pk}/logs/'
+        self.assertEqual(self.client.get(url).json(), {'stale': []})
+        expired = f"{time.time() - 1:.3f}"
+        self.assertEqual(self.client.get(url, HTTP_X_PRIMARY_PIN=expired).json(), {'stale': []})
+        pin = f"{time.time() + 5:.3f}"
+        self.assertEqual(self.client.get(url, HTTP_X_PRIMARY_PIN=pin).json(), {})
+        # What the pinned client read from the primary replaces the entry
+        self.assertEqual(self.client.get(url).json(), {})
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1', 'replica_2'])
+    def test_a_request_reads_from_one_replica(self):
+        router = db_routing.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Trip), db_routing.PRIMARY)
+        with db_routing.reading_from_replicas(False):
+            db_routing.allow_replica_reads()
+            replicas = {router.db_for_read(model) for model in (Trip, DutyStatusEvent) for _ in range(20)}
+            self.assertEqual(len(replicas), 1)
+            self.assertEqual(router.db_for_write(Trip), db_routing.PRIMARY)
+        self.assertEqual(router.db_for_read(Trip), db_routing.PRIMARY)
+
+
+class ArchiveTests(TestCase):
+    def test_pack_round_trip(self):
+        events = [
+            (utc(2026, 3, 2, 0), 'OFF_DUTY'),
+            (utc(2026, 3, 2, 8, 0, 0, 1), 'DRIVING'),
+            (utc(2026, 3, 2, 12, 30, 15, 999999), 'ON_DUTY_NOT_DRIVING'),
+            (utc(2026, 3, 2, 13), 'SLEEPER_BERTH'),
+        ]
+        self.assertEqual(unpack_events(pack_events(events)), events)
+        self.assertEqual(unpack_events(memoryview(pack_events(events))), events) # As Postgres returns bytea
+        self.assertEqual(unpack_events(pack_events([])), [])
+
+    def test_archiving_merges_days_and_keeps_the_log(self):
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX', log_end_time=utc(2026, 3, 3, 6))
+        events = [
+            (utc(2026, 3, 2, 0), 'OFF_DUTY'), (utc(2026, 3, 2, 8), 'DRIVING'), (utc(2026, 3, 2, 20), 'OFF_DUTY'),
+            (utc(2026, 3, 3, 1), 'DRIVING'),
+        ]
+        DutyStatusEvent.objects.bulk_create([DutyStatusEvent(trip=trip, timestamp=timestamp, status=status) for timestamp, status in events])
+        before = get_trip_segments(Trip.objects.get(pk=trip.pk))
+
+        # First the morning, then the rest of the day, which is merged into the same row
+        self.assertEqual(archive_trips([trip.pk], utc(2026, 3, 2, 12)), (1, 2))
+        self.assertEqual(archive_trips([trip.pk], utc(2026, 3, 3)), (1, 1))
+        day = ArchivedLogDay.objects.get(trip=trip)
+        self.assertEqual((day.log_date, day.event_count), (date(2026, 3, 2), 3))
+        self.assertEqual(unpack_events(day.events), events[:3])
+        self.assertEqual(list(DutyStatusEvent.objects.filter(trip=trip).values_list('timestamp', flat=True)), [utc(2026, 3, 3, 1)])
+        self.assertEqual(get_trip_segments(Trip.objects.get(pk=trip.pk)), before)
+        self.assertEqual(archive_trips([trip.pk], utc(2026, 3, 3)), (0, 0))
+
+
+class OfflineEstimateTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_locations_are_normalized(self):
+        self.assertEqual(estimate.normalize_location(' St. Louis,  MO 63101, USA '), 'st louis, mo')
+        self.assertEqual(estimate.normalize_location('Chicago'), 'chicago')
+
+    def test_locate_from_gazetteer(self):
+        self.assertEqual(estimate.locate('Chicago, IL, USA'), [-87.6298, 41.8781])
+        self.assertEqual(estimate.locate('denver'), [-104.9903, 39.7392]) # Unambiguous city name
+        self.assertIsNone(estimate.locate('Portland')) # Oregon or Maine
+        self.assertIsNone(estimate.locate('Nowhere Yard'))
+
+    def test_earlier_geocodes_win(self):
+        estimate.remember_location('Shipper Yard, Joliet', [-88.08, 41.52])
+        self.assertEqual(estimate.locate('shipper yard, joliet'), [-88.08, 41.52])
+
+    def test_route_estimate(self):
+        self.assertAlmostEqual(estimate.detour_factor(0), 1.4)
+        self.assertAlmostEqual(estimate.detour_factor(175), 1.25)
+        self.assertAlmostEqual(estimate.detour_factor(5000), 1.15)
+        road_km, hours = estimate.estimate_leg([-87.6298, 41.8781], [-104.9903, 39.7392])
+        self.assertAlmostEqual(road_km, 1477.9 * 1.15, delta=5) # Great-circle Chicago-Denver is ~1478 km
+        self.assertAlmostEqual(hours, 30 / estimate.URBAN_SPEED_KMH + (road_km - 30) / estimate.HIGHWAY_SPEED_KMH)
+        route = estimate.estimate_route([[-87.6298, 41.8781], [-104.9903, 39.7392], [-96.797, 32.7767]])
+        self.assertTrue(route['estimated'])
+        self.assertEqual(len(route['path_coordinates']), 3)
+        self.assertGreater(route['total_distance_km'], road_km)
+
+
+@override_settings(SINGLE_FLIGHT_RESULT_TTL=0)
+@mock.patch('requests.post', side_effect=offline)
+@mock.patch('requests.get', side_effect=offline)
+class OfflineCalculationTests(TestCase):
+    def test_unreachable_ors_falls_back_to_an_estimate(self, *mocks):
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+        response = APIClient().post(f'/api/trips/{trip.pk}/calculate_route_and_logs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['route_info']['estimated'])
+        self.assertTrue(DutyStatusEvent.objects.filter(trip=trip).exists())
+
+    def test_multi_stop_trip_starts_at_the_current_location(self, *mocks):
+        trip = Trip.objects.create(current_location='New York, NY', pickup_location='', dropoff_location='')
+        for location, stop_type in (('Chicago, IL', 'PICKUP'), ('Denver, CO', 'DROPOFF'), ('Dallas, TX', 'DROPOFF')):
+            Waypoint.objects.create(trip=trip, location=location, stop_type=stop_type, shipment='A')
+        response = APIClient().post(f'/api/trips/{trip.pk}/calculate_route_and_logs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.json()['route_info']['total_distance_km'], 1000 + 1500 + 1000) # New York-Chicago is ~1150 km
+        statuses = list(DutyStatusEvent.objects.filter(trip=trip).values_list('status', flat=True))
+        self.assertEqual(statuses[:2], [DutyStatus.OFF_DUTY, DutyStatus.DRIVING]) # The pickup comes after driving to Chicago
+
+    def test_unknown_location_is_unprocessable(self, *mocks):
+        trip = Trip.objects.create(current_location='Chicago, IL', pickup_location='Nowhere Yard', dropoff_location='Dallas, TX')
+        response = APIClient().post(f'/api/trips/{trip.pk}/calculate_route_and_logs/')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('Nowhere Yard', response.json()['error'])
+
+
+class PlaceIndexTests(TestCase):
+    def setUp(self):
+        self.index = places.PlaceIndex()
+        self.index.add_many([
+            ('St. Louis, MO', [-90.1994, 38.627], 'gazetteer'),
+            ('Salt Lake City, UT', [-111.891, 40.7608], 'gazetteer'),
+            ('San Antonio, TX', [-98.4936, 29.4241], 'gazetteer'),
+        ])
+        self.index.add('Louisville, KY', [-85.7585, 38.2527], 'geocoded')
+
+    def names(self, query, limit=places.MAX_SUGGESTIONS):
+        return [place.name for place in self.index.search(query, limit)]
+
+    def test_prefix_lookup(self):
+        self.assertEqual(self.names('sa'), ['Salt Lake City, UT', 'San Antonio, TX'])
+        self.assertEqual(self.names('san antonio, t'), ['San Antonio, TX'])
+        self.assertEqual(self.names('sa', limit=1), ['Salt Lake City, UT'])
+        self.assertEqual(self.names(' , '), [])
+
+    def test_later_words_match_after_names(self):
+        self.assertEqual(self.names('lou'), ['Louisville, KY', 'St. Louis, MO'])
+        self.assertEqual(self.names('lake city'), ['Salt Lake City, UT'])
+
+    def test_first_source_wins(self):
+        self.index.add('st louis, mo', [0.0, 0.0], 'geocoded')
+        self.assertEqual(self.index.search('st louis')[0].source, 'gazetteer')
+        self.assertEqual(len(self.index), 4)
+
+    @mock.patch.object(places, '_index', None)
+    def test_gazetteer_wins_over_stored_coordinates(self):
+        Trip.objects.create(current_location='Chicago, IL', current_longitude=0.0, current_latitude=0.0,
+                            pickup_location='Joliet Yard', pickup_longitude=-88.08, pickup_latitude=41.52,
+                            dropoff_location='Dallas, TX')
+        index = places.get_place_index()
+        chicago = index.search('chicago, il')[0]
+        self.assertEqual((chicago.longitude, chicago.latitude, chicago.source), (-87.6298, 41.8781, 'gazetteer'))
+        self.assertEqual(index.search('joliet')[0].source, 'stored')
+
+    def test_geocode_keys_are_cache_safe(self):
+        key = estimate._geocode_key(' St. Louis,  MO 63101, USA ')
+        self.assertEqual(key, estimate._geocode_key('st louis, mo'))
+        self.assertRegex(key, r'^geocode:[0-9a-f]{64}$')
+
+
+@override_settings(PROFILE_RING_SIZE=2)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Trip.objects.create(current_location='Chicago, IL', pickup_location='Denver, CO', dropoff_location='Dallas, TX')
+
+    def login(self, is_staff):
+        user = get_user_model().objects.create_user('staff' if is_staff else 'driver', is_staff=is_staff)
+        self.client.force_authenticate(user)
+
+    def test_staff_requests_are_profiled(self):
+        self.login(is_staff=True)
+        response = self.client.get('/api/trips/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.action, profile.status_code), ('list', 200))
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn('orm', profile.area_ms)
+
+    def test_other_requests_are_not(self):
+        self.login(is_staff=False)
+        for response in (self.client.get('/api/trips/', HTTP_X_PROFILE='1'),
+                         APIClient().get('/api/trips/?profile=1')):
+            self.assertNotIn('X-Profile-Id', response)
+            self.assertNotIn('Server-Timing', response)
+        self.login(is_staff=True)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/trips/', HTTP_X_PROFILE='0'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_only_the_newest_profiles_are_kept(self):
+        self.login(is_staff=True)
+        ids = [int(self.client.get('/api/trips/?profile=1')['X-Profile-Id']) for _ in range(4)]
+        self.assertEqual(sorted(RequestProfile.objects.values_list('pk', flat=True)), ids[-2:])
+
+
+class StartupProfileTests(SimpleTestCase):
+    IMPORTTIME = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     rest_framework.status",
+        "import time:      1858 |       1978 |   rest_framework.views",
+        "some other output",
+    ])
+
+    def test_parse_importtime(self):
+        self.assertEqual(parse_importtime(self.IMPORTTIME), [
+            ('rest_framework.status', 120, 120, 2),
+            ('rest_framework.views', 1858, 1978, 1),
+        ])
+
+    def test_fresh_boot_serves_without_the_database(self):
+        # The child interpreters get a database of their own, which booting must not even open
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        database = os.path.join(directory, 'startup.sqlite3')
+        output = StringIO()
+        with mock.patch.dict(os.environ, {'DATABASE_URL': f'sqlite:///{database}'}):
+            call_command('profile_startup', '--json', '--runs', '1', '--top', '3', stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['status'], '200 OK')
+        self.assertEqual(report['db_connections'], {'boot': 0, 'first_response': 0})
+        self.assertFalse(os.path.exists(database))
+        self.assertGreaterEqual(report['time_to_first_response'], report['phases']['total'])
+        self.assertIn('trips', report['apps'])
+        self.assertEqual(len(report['modules_ms']), 3)
+
+
+class LoadtestTests(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 11))
+        self.assertEqual([loadtest.percentile(values, p) for p in (50, 95, 99, 100)], [5, 10, 10, 10])
+        self.assertEqual(loadtest.percentile(values, 1), 1)
+        self.assertEqual(loadtest.percentile([7], 99), 7)
+        self.assertIsNone(loadtest.percentile([], 50))
+
+    def test_summarize(self):
+        summary = loadtest.summarize([(0.4, True), (0.1, True), (0.3, False), (0.2, True)], 2.0)
+        self.assertEqual((summary['requests'], summary['errors'], summary['throughput_rps']), (4, 1, 2.0))
+        self.assertEqual(summary['latency_ms'], {'p50': 200.0, 'p95': 400.0, 'p99': 400.0, 'mean': 250.0, 'max': 400.0})
+        empty = loadtest.summarize([], 2.0)
+        self.assertEqual(empty['requests'], 0)
+        self.assertEqual(set(empty['latency_ms'].values()), {None})
+
+    def test_compare_counts_regressions_beyond_the_threshold(self):
+        def level(flows_per_second, p95s):
+            return {'concurrency': 4, 'flows_per_second': flows_per_second,
+                    'endpoints': {endpoint: {'latency_ms': {'p95': p95}} for endpoint, p95 in p95s.items()}}
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        baseline = os.path.join(directory, 'baseline.json')
+        with open(baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'revision': 'abc123', 'levels': [level(10.0, {'create': 50.0, 'calculate': 100.0})]}, baseline_file)
+        # Throughput down 15%, calculate p95 up 5%, create p95 up 20%; logs has no baseline
+        report = {'levels': [level(8.5, {'create': 60.0, 'calculate': 105.0, 'logs': 30.0})]}
+        command = loadtest.Command(stdout=StringIO())
+        self.assertEqual(command._compare(report, baseline, 10.0), 2)
+        self.assertEqual(command._compare(report, baseline, 25.0), 0)
+
+    def test_ors_stub_error_injection(self):
+        for error_rate, expected_status, counted in ((1.0, 503, 'geocode:error'), (0.0, 200, 'geocode')):
+            stub = ors_stub.StubORSServer(('127.0.0.1', 0), error_rate=error_rate).start()
+            self.addCleanup(stub.server_close)
+            self.addCleanup(stub.shutdown)
+            response = requests.get(f'{stub.url}/geocode/search', params={'text': 'Chicago, IL'}, timeout=5)
+            self.assertEqual(response.status_code, expected_status)
+            self.assertEqual(stub.counts, {counted: 1})
+        self.assertEqual(response.json()['features'][0]['geometry']['coordinates'], ors_stub.geocode('Chicago, IL'))
+
+    def test_flow_trips_can_be_located_offline(self):
+        cache.clear()
+        for _ in range(20):
+            trip = loadtest.flow_trip()
+            locations = [trip['current_location'], trip['pickup_location'], trip['dropoff_location']]
+            self.assertEqual(len(set(locations)), 3)
+            for location in locations:
+                self.assertIsNotNone(estimate.locate(location), location)
@@ -2,14 +2,24 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Trip, LogEntry, DutyStatus
-from .serializers import TripSerializer, LogEntrySerializer
+from rest_framework.renderers import JSONRenderer
+from .models import Trip, DutyStatus, DutyStatusEvent, Route, Waypoint
+from .serializers import TripSerializer, LogEntrySerializer, RouteSerializer, EncodedRouteSerializer
+from .graph import get_trip_graphs
+from .facilities import RoutePath, snap_stop, plan_fuel_stops
+from .planning import plan_waypoint_route
+from .segments import events_from_entries, get_trip_segments, materialize
+from .progress import EventStreamRenderer, stream_events
+from . import response_cache, singleflight, polyline, intervals, db_routing, estimate, places, profiling
 from datetime import datetime, timedelta, date
-import requests
 import json
 import os
+import re
 from django.conf import settings # Import settings
 from django.utils import timezone # Import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
+from django.http import StreamingHttpResponse
 
 # --- Constants for HOS (Hours of Service) Rules ---
 # These should ideally be configurable or come from a rules engine
@@ -19,10 +29,23 @@ MAX_ON_DUTY_HOURS_CYCLE = 70 # For 8-day cycle
 CYCLE_DAYS = 8
 MIN_OFF_DUTY_HOURS = 10 # Minimum off-duty between shifts
 MIN_BREAK_HOURS = 0.5 # 30-minute break after 8 hours driving
+MAX_DRIVING_HOURS_BEFORE_BREAK = 8 # Driving allowed before that break is required
 PICKUP_DROPOFF_HOURS = 1 # 1 hour for pickup and 1 hour for drop-off
 FUELING_INTERVAL_KM = 1000 # Fueling at least once every 1,000 miles (converted to KM)
 FUELING_DURATION_HOURS = 0.5 # Duration for a fueling stop
 
+AUTOCOMPLETE_MIN_CHARS = 2
+AUTOCOMPLETE_MAX_AGE_SECONDS = 300 # Browsers reuse suggestions for a prefix typed again
+
+# A UTC offset whose '+' arrived as a space because the query string wasn't URL-encoded,
+# e.g. ?time=2026-03-02T10:00:00 05:00
+UNENCODED_OFFSET = re.compile(r'(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?) (\d{2}(?::?\d{2})?)$')
+
+# Read-only actions that may be served from a read replica (see trips/db_routing.py)
+REPLICA_READ_ACTIONS = ('list', 'retrieve', 'logs', 'graph', 'route', 'status_at', 'segments')
+# Actions that write a trip; the client then reads from the primary for PRIMARY_PIN_SECONDS
+PRIMARY_PIN_ACTIONS = ('create', 'update', 'partial_update', 'destroy', 'calculate_route_and_logs', 'calculate_stream')
+
 # Add this helper function to handle naive datetimes
 def get_aware_datetime(naive_dt):
     if timezone.is_aware(naive_dt):
@@ -31,13 +54,178 @@ def get_aware_datetime(naive_dt):
     return timezone.make_aware(naive_dt, timezone.get_current_timezone())
 
 class TripViewSet(viewsets.ModelViewSet):
-    queryset = Trip.objects.all().order_by('-created_at')
+    queryset = Trip.objects.all().order_by('-created_at').prefetch_related('archived_days', 'status_events') # Log entries are built from these
     serializer_class = TripSerializer
 
+    def dispatch(self, request, *args, **kwargs):
+        with db_routing.reading_from_replicas(False):
+            return super().dispatch(request, *args, **kwargs)
+
+    _profile = None # Set while a staff user's request is being profiled
+    _pinned = False # Set when the client wrote recently and must read what it wrote
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Clients that wrote within the last PRIMARY_PIN_SECONDS read from the primary
+        self._pinned = bool(settings.DATABASE_REPLICAS) and db_routing.is_pinned(request)
+        if (settings.DATABASE_REPLICAS and request.method in ('GET', 'HEAD')
+                and self.action in REPLICA_READ_ACTIONS and not self._pinned):
+            db_routing.allow_replica_reads()
+        if profiling.profiling_requested(request):
+            self._profile = profiling.start()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and self.action in PRIMARY_PIN_ACTIONS and response.status_code < 400:
+            db_routing.pin_to_primary(response)
+        if self._profile is not None:
+            if hasattr(response, 'render'):
+                response.render() # Rendering (JSON encoding) counts towards the serializers
+            started, self._profile = self._profile, None
+            profiling.finish(request, response, self.action, started)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        # Serialized trip detail (with nested log entries) is served from cache when possible,
+        # keyed by the trip's current version. Pinned clients skip it: an entry may have been
+        # built from a replica that hadn't caught up with their write.
+        cached_data = None
+        if not self._pinned:
+            version = response_cache.trip_version(kwargs.get('pk'))
+            cached_data = response_cache.get_response(response_cache.DETAIL, kwargs.get('pk'), version)
+        if cached_data is not None:
+            return Response(cached_data, status=status.HTTP_200_OK)
+        trip = self.get_object()
+        data = self.get_serializer(trip).data
+        response_cache.set_response(response_cache.DETAIL, trip.pk, trip.updated_at, data)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """
+        Returns hit/miss counters of the trip response cache.
+        """
+        return Response(response_cache.get_stats(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Suggests known places starting with ?q= (up to ?limit=), from the in-memory place index.
+        Send a picked place's coordinates as <current|pickup|dropoff>_latitude/_longitude
+        with the trip, and calculating it skips geocoding that location.
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', places.MAX_SUGGESTIONS)), places.MAX_SUGGESTIONS))
+        except ValueError:
+            return Response({"error": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        suggestions = []
+        if len(query.strip()) >= AUTOCOMPLETE_MIN_CHARS:
+            suggestions = [
+                {"name": place.name, "latitude": place.latitude, "longitude": place.longitude, "source": place.source}
+                for place in places.get_place_index().search(query, limit)
+            ]
+        response = Response(suggestions, status=status.HTTP_200_OK)
+        response['Cache-Control'] = f'max-age={AUTOCOMPLETE_MAX_AGE_SECONDS}'
+        return response
+
+    def _parse_interval_query(self, request, *time_params):
+        """
+        Reads ?trips=1,2,3 and the given ISO datetime parameters. A '+hh:mm' offset may be
+        sent unencoded (it arrives as ' hh:mm'). Returns (trip_ids, [datetimes]) or raises ValueError with a message for the client.
+        """
+        try:
+            trip_ids = [int(trip_id) for trip_id in request.query_params.get('trips', '').split(',') if trip_id.strip()]
+        except ValueError:
+            raise ValueError("trips must be a comma-separated list of trip ids.")
+        if not trip_ids:
+            raise ValueError("trips is required, e.g. ?trips=1,2,3.")
+        if len(trip_ids) > intervals.MAX_TRIPS_PER_QUERY:
+            raise ValueError(f"At most {intervals.MAX_TRIPS_PER_QUERY} trips per query.")
+
+        moments = []
+        for param in time_params:
+            value = request.query_params.get(param)
+            if value:
+                value = UNENCODED_OFFSET.sub(r'\1+\2', value.strip())
+            try:
+                moment = parse_datetime(value) if value else None
+            except ValueError:
+                moment = None
+            if moment is None:
+                raise ValueError(f"{param} must be an ISO 8601 datetime.")
+            moments.append(get_aware_datetime(moment))
+        return trip_ids, moments
+
+    @action(detail=False, methods=['get'])
+    def status_at(self, request):
+        """
+        Returns the duty status segment each trip is in at ?time=, for ?trips=1,2,3.
+        Trips without a segment at that time map to null; unknown trips are omitted.
+        """
+        try:
+            trip_ids, (moment,) = self._parse_interval_query(request, 'time')
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(intervals.status_at(trip_ids, moment), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def segments(self, request):
+        """
+        Returns the duty status segments overlapping [?start=, ?end=) for each of ?trips=1,2,3.
+        """
+        try:
+            trip_ids, (start, end) = self._parse_interval_query(request, 'start', 'end')
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if end <= start:
+            return Response({"error": "end must be after start."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(intervals.segments_overlapping(trip_ids, start, end), status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
     def calculate_route_and_logs(self, request, pk=None):
         trip = self.get_object()
 
+        # Double-clicks and retries for the same trip share one calculation instead of
+        # each calling ORS and rewriting the log entries.
+        try:
+            data, shared = singleflight.run(trip, lambda: self._calculate_route_and_logs(trip))
+        except singleflight.SingleFlightTimeout as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except estimate.RouteUnavailable as e:
+            return Response({"error": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = Response(data, status=status.HTTP_200_OK)
+        response['X-Single-Flight'] = 'shared' if shared else 'computed'
+        return response
+
+    @action(detail=True, methods=['post'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def calculate_stream(self, request, pk=None):
+        """
+        Runs the same calculation as calculate_route_and_logs and streams its progress as
+        server-sent events: "geocoded", "routed", one "day" event per day with that day's log
+        entries as soon as it is scheduled, "saved", then "done" with the usual response body
+        (or "error"). POST only, since it rewrites the trip's logs: read the stream with
+        fetch() rather than EventSource. With `Accept: text/event-stream`, errors before the
+        stream starts (e.g. an unknown trip) are sent as a single "error" event too.
+        """
+        trip = self.get_object()
+
+        def calculate(emit):
+            # A calculation already running for this trip is joined; only "done" is sent then
+            data, shared = singleflight.run(trip, lambda: self._calculate_route_and_logs(trip, progress=emit))
+            return data
+
+        response = StreamingHttpResponse(stream_events(calculate), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+        return response
+
+    def _calculate_route_and_logs(self, trip, progress=None):
+        import requests # Imported on first calculation rather than at worker start
+
+        # progress(event, data), when given, is told about each phase as it completes
+        report = progress or (lambda event, data: None)
+
         # Initialize current_time here, before it's used in route_info population
         start_date = timezone.localdate()
         current_time = get_aware_datetime(datetime.combine(start_date, datetime.min.time()))
@@ -46,7 +234,7 @@ class TripViewSet(viewsets.ModelViewSet):
         ORS_API_KEY = settings.ORS_API_KEY
 
         # --- 1. Route Calculation (OpenRouteService Integration) ---
-        base_url = "https://api.openrouteservice.org"
+        base_url = settings.ORS_BASE_URL
 
         # Step 1.1: Geocoding (Convert locations to coordinates)
         # Using the ORS Geocoding API (Pelias)
@@ -73,6 +261,8 @@ class TripViewSet(viewsets.ModelViewSet):
                     # Coordinates are typically [longitude, latitude] in GeoJSON
                     coords = data['features'][0]['geometry']['coordinates']
                     print(f"Geocoded '{location_name}' to {coords}")
+                    estimate.remember_location(location_name, coords) # For offline estimates
+                    places.add_place(location_name, coords) # And for autocomplete
                     return coords # [longitude, latitude]
                 else:
                     print(f"No geocoding results found for '{location_name}'.")
@@ -81,36 +271,147 @@ class TripViewSet(viewsets.ModelViewSet):
                 print(f"Geocoding error for '{location_name}': {e}")
                 return None
 
-        pickup_coords = geocode_location(trip.pickup_location)
-        dropoff_coords = geocode_location(trip.dropoff_location)
+        # Multi-stop trips are routed through their waypoints instead of pickup/dropoff
+        waypoints = list(trip.waypoints.all())
+        waypoint_stops = [] # On-duty stops at waypoints, keyed by cumulative driving hours
+
+        geocoded_fields = [] # Trip coordinates to store, so later calculations skip geocoding
+
+        def locate_trip_location(name):
+            # Coordinates picked from autocomplete or stored by an earlier calculation come first
+            latitude, longitude = getattr(trip, f'{name}_latitude'), getattr(trip, f'{name}_longitude')
+            if latitude is not None and longitude is not None:
+                return [longitude, latitude]
+            coords = geocode_location(getattr(trip, f'{name}_location'))
+            if coords:
+                setattr(trip, f'{name}_longitude', coords[0])
+                setattr(trip, f'{name}_latitude', coords[1])
+                geocoded_fields.extend([f'{name}_latitude', f'{name}_longitude'])
+            return coords
+
+        pickup_coords = locate_trip_location('pickup') if not waypoints else None
+        dropoff_coords = locate_trip_location('dropoff') if not waypoints else None
         # Assuming trip.current_location is the starting point for the route calculation
         # If not, you might need to use `pickup_coords` as the first point.
-        current_coords = geocode_location(trip.current_location)
+        current_coords = locate_trip_location('current')
+        # A start ORS couldn't geocode is looked up in earlier geocodes and the gazetteer
+        current_coords = current_coords or estimate.locate(trip.current_location)
+
+        if waypoints:
+            # Geocode only waypoints without stored coordinates, and keep them for next time
+            newly_geocoded = []
+            for waypoint in waypoints:
+                if waypoint.latitude is None or waypoint.longitude is None:
+                    coords = geocode_location(waypoint.location)
+                    if coords:
+                        waypoint.longitude, waypoint.latitude = coords[0], coords[1]
+                        newly_geocoded.append(waypoint)
+            if newly_geocoded:
+                Waypoint.objects.bulk_update(newly_geocoded, ['latitude', 'longitude'])
+            # Stops ORS couldn't geocode are placed offline, for this calculation only
+            for waypoint in waypoints:
+                if waypoint.latitude is None or waypoint.longitude is None:
+                    coords = estimate.locate(waypoint.location)
+                    if coords:
+                        print(f"Located waypoint '{waypoint.location}' offline at {coords}.")
+                        waypoint.longitude, waypoint.latitude = coords[0], coords[1]
+        else:
+            # So are the pickup and dropoff
+            pickup_coords = pickup_coords or estimate.locate(trip.pickup_location)
+            dropoff_coords = dropoff_coords or estimate.locate(trip.dropoff_location)
+            if not (pickup_coords and dropoff_coords):
+                missing = [location for location, coords in ((trip.pickup_location, pickup_coords), (trip.dropoff_location, dropoff_coords)) if not coords]
+                raise estimate.RouteUnavailable(f"Could not locate {' or '.join(repr(location) for location in missing)}.")
+            if not current_coords:
+                print(f"Could not locate '{trip.current_location}'. The route starts at the pickup.")
+                current_coords = pickup_coords
+
+        report("geocoded", {
+            "current_location": current_coords, # [lon, lat], or None if not found
+            "pickup_location": pickup_coords,
+            "dropoff_location": dropoff_coords,
+            "waypoints": [
+                {"id": waypoint.id, "location": waypoint.location, "latitude": waypoint.latitude, "longitude": waypoint.longitude}
+                for waypoint in waypoints
+            ],
+        })
 
         route_info = {} # Initialize route_info
+        route_path = None # Set when a real route geometry is available, to place stops along it
 
         # Storing geocoded coordinates for pickup and dropoff to use in stops_and_rests
         pickup_lat, pickup_lon = (pickup_coords[1], pickup_coords[0]) if pickup_coords else (None, None)
         dropoff_lat, dropoff_lon = (dropoff_coords[1], dropoff_coords[0]) if dropoff_coords else (None, None)
 
-        if not (pickup_coords and dropoff_coords and current_coords):
-            # Fallback to simulated data if geocoding fails for any required location
-            print("Geocoding failed for one or more locations (current, pickup, or dropoff). Falling back to simulated route data.")
-            simulated_route_info = {
-                "path_coordinates": [
-                    [-1.286389, 36.817223], # Nairobi (lon, lat)
-                    [-0.091702, 34.767936], # Kisumu (lon, lat)
-                    [-4.043740, 39.668205]  # Mombasa (lon, lat)
-                ],
-                "total_distance_km": 1000, # Example total distance
-                "total_duration_hours_driving": 15, # Example total driving hours
-                "estimated_stops_and_rests": [
-                    {"type": "rest", "location": "Somewhere along the route", "duration_hrs": 2, "latitude": -0.091702, "longitude": 34.767936}, # Example coords for rest
-                    {"type": "fuel", "location": "Mid-way point", "duration_hrs": 0.5, "latitude": -0.091702, "longitude": 34.767936} # Example coords for fuel
-                ]
-            }
-            route_info = simulated_route_info
-        else:
+        if waypoints:
+            routable = [waypoint for waypoint in waypoints if waypoint.latitude is not None and waypoint.longitude is not None]
+            skipped = [waypoint for waypoint in waypoints if waypoint not in routable]
+            for waypoint in skipped:
+                print(f"Could not geocode waypoint '{waypoint.location}'. It is left out of the route.")
+            if routable:
+                if not current_coords:
+                    # Without a known start, the route starts at the first requested stop
+                    print(f"Could not locate '{trip.current_location}'. The route starts at the first stop.")
+                    current_coords = [routable[0].longitude, routable[0].latitude]
+                route_info, waypoint_stops = plan_waypoint_route(
+                    current_coords, routable, ORS_API_KEY,
+                    PICKUP_DROPOFF_HOURS, FUELING_INTERVAL_KM, FUELING_DURATION_HOURS
+                )
+                route_path = RoutePath(route_info["path_coordinates"])
+                # Unroutable stops keep their place after the planned ones
+                for sequence, waypoint in enumerate(skipped, start=len(routable)):
+                    waypoint.sequence = sequence
+                print(f"Planned multi-stop route through {len(routable)} waypoints.")
+
+        def plan_route_stops(path_coordinates, total_distance_km, total_duration_hours_driving):
+            # Dynamically calculate estimated stops and rests based on route and HOS
+            dynamic_stops_and_rests = []
+
+            # Add pickup/dropoff times with their coordinates
+            dynamic_stops_and_rests.append({
+                "type": "pickup",
+                "location": trip.pickup_location,
+                "duration_hrs": PICKUP_DROPOFF_HOURS,
+                "time": current_time.isoformat(), # Use current_time as start of pickup
+                "latitude": pickup_lat,
+                "longitude": pickup_lon
+            })
+            # Add dropoff time, assuming it's at the end of the calculated route
+            # You might want to assign a more precise time later in the HOS logic
+            dynamic_stops_and_rests.append({
+                "type": "dropoff",
+                "location": trip.dropoff_location,
+                "duration_hrs": PICKUP_DROPOFF_HOURS,
+                "time": (current_time + timedelta(hours=total_duration_hours_driving)).isoformat(), # Approximate time
+                "latitude": dropoff_lat,
+                "longitude": dropoff_lon
+            })
+
+            # Add fueling stops every 1000 km, placed at the nearest real fuel station
+            # within the corridor around that point of the route (if a dataset is loaded)
+            route_path = RoutePath(path_coordinates)
+            dynamic_stops_and_rests.extend(
+                plan_fuel_stops(route_path, total_distance_km, FUELING_INTERVAL_KM, FUELING_DURATION_HOURS)
+            )
+
+            # Sort stops by approximate occurrence (e.g., distance or time) for better representation
+            # This is simplified; a full implementation would integrate them into the route segments.
+            # For now, just order the list.
+            return route_path, dynamic_stops_and_rests
+
+        def estimated_route_info():
+            # Degraded mode: great-circle legs with a detour factor at HGV speeds (see trips/estimate.py)
+            route_info = estimate.estimate_route([current_coords, pickup_coords, dropoff_coords])
+            route_path, route_info["estimated_stops_and_rests"] = plan_route_stops(
+                route_info["path_coordinates"], route_info["total_distance_km"], route_info["total_duration_hours_driving"]
+            )
+            print(f"Estimated route offline: {route_info['total_distance_km']:.0f} km, {route_info['total_duration_hours_driving']:.1f} h driving.")
+            return route_path, route_info
+
+        # route_info is already set when a multi-stop route was planned above
+        if not route_info and waypoints:
+            raise estimate.RouteUnavailable("Could not locate any of the trip's waypoints.")
+        elif not route_info:
             # Step 1.2: Routing (Calculate route using ORS Directions API)
             # Coordinates for ORS are [longitude, latitude]
             coordinates = [current_coords, pickup_coords, dropoff_coords]
@@ -142,45 +443,7 @@ class TripViewSet(viewsets.ModelViewSet):
                     total_duration_seconds = summary['duration'] # Duration in seconds
                     total_duration_hours_driving = total_duration_seconds / 3600
 
-                    # Dynamically calculate estimated stops and rests based on route and HOS
-                    dynamic_stops_and_rests = []
-
-                    # Add pickup/dropoff times with their coordinates
-                    dynamic_stops_and_rests.append({
-                        "type": "pickup",
-                        "location": trip.pickup_location,
-                        "duration_hrs": PICKUP_DROPOFF_HOURS,
-                        "time": current_time.isoformat(), # Use current_time as start of pickup
-                        "latitude": pickup_lat,
-                        "longitude": pickup_lon
-                    })
-                    # Add dropoff time, assuming it's at the end of the calculated route
-                    # You might want to assign a more precise time later in the HOS logic
-                    dynamic_stops_and_rests.append({
-                        "type": "dropoff",
-                        "location": trip.dropoff_location,
-                        "duration_hrs": PICKUP_DROPOFF_HOURS,
-                        "time": (current_time + timedelta(hours=total_duration_hours_driving)).isoformat(), # Approximate time
-                        "latitude": dropoff_lat,
-                        "longitude": dropoff_lon
-                    })
-
-                    # Add fueling stops every 1000 km
-                    for i in range(1, int(total_distance_km // FUELING_INTERVAL_KM) + 1):
-                        approx_location = f"Route Km {i * FUELING_INTERVAL_KM}" # More precise location would require interpolating path_coordinates
-                        # For now, just use pickup_coords as a placeholder for fuel stops, or find a point along the route
-                        # A more advanced implementation would interpolate coordinates along route_geometry
-                        dynamic_stops_and_rests.append({
-                            "type": "fuel",
-                            "location": approx_location,
-                            "duration_hrs": FUELING_DURATION_HOURS,
-                            "latitude": pickup_lat, # Using pickup_lat/lon as a placeholder
-                            "longitude": pickup_lon  # Using pickup_lat/lon as a placeholder
-                        })
-                    
-                    # Sort stops by approximate occurrence (e.g., distance or time) for better representation
-                    # This is simplified; a full implementation would integrate them into the route segments.
-                    # For now, just order the list.
+                    route_path, dynamic_stops_and_rests = plan_route_stops(route_geometry, total_distance_km, total_duration_hours_driving)
 
                     route_info = {
                         "path_coordinates": route_geometry, # This is [lon, lat]
@@ -190,42 +453,23 @@ class TripViewSet(viewsets.ModelViewSet):
                     }
                     print("Route calculated successfully from OpenRouteService.")
                 else:
-                    print("No routing results found from OpenRouteService. Falling back to simulated data.")
-                    # Fallback if ORS fails or returns no features
-                    route_info = {
-                        "path_coordinates": [
-                            [-1.286389, 36.817223], # Nairobi (lon, lat)
-                            [-0.091702, 34.767936], # Kisumu (lon, lat)
-                            [-4.043740, 39.668205]  # Mombasa (lon, lat)
-                        ],
-                        "total_distance_km": 1000,
-                        "total_duration_hours_driving": 15,
-                        "estimated_stops_and_rests": [
-                            {"type": "rest", "location": "Somewhere along the route", "duration_hrs": 2, "latitude": -0.091702, "longitude": 34.767936},
-                            {"type": "fuel", "location": "Mid-way point", "duration_hrs": 0.5, "latitude": -0.091702, "longitude": 34.767936}
-                        ]
-                    }
+                    print("No routing results found from OpenRouteService. Falling back to an offline estimate.")
+                    route_path, route_info = estimated_route_info()
 
             except requests.exceptions.RequestException as e:
-                print(f"Routing error with OpenRouteService: {e}. Falling back to simulated data.")
-                # Fallback on error
-                route_info = {
-                    "path_coordinates": [
-                        [-1.286389, 36.817223], # Nairobi (lon, lat)
-                        [-0.091702, 34.767936], # Kisumu (lon, lat)
-                        [-4.043740, 39.668205]  # Mombasa (lon, lat)
-                    ],
-                    "total_distance_km": 1000,
-                    "total_duration_hours_driving": 15,
-                    "estimated_stops_and_rests": [
-                        {"type": "rest", "location": "Somewhere along the route", "duration_hrs": 2, "latitude": -0.091702, "longitude": 34.767936},
-                        {"type": "fuel", "location": "Mid-way point", "duration_hrs": 0.5, "latitude": -0.091702, "longitude": 34.767936}
-                    ]
-                }
+                print(f"Routing error with OpenRouteService: {e}. Falling back to an offline estimate.")
+                route_path, route_info = estimated_route_info()
+
+        report("routed", {
+            "path_coordinates": route_info.get("path_coordinates", []),
+            "total_distance_km": route_info.get("total_distance_km", 0),
+            "total_duration_hours_driving": route_info.get("total_duration_hours_driving", 0),
+            "estimated": route_info.get("estimated", False),
+        })
 
         # --- 2. ELD Log Generation (HOS Logic) ---
         # Now, the HOS logic will use the 'total_distance_km' and 'total_duration_hours_driving'
-        # from the 'route_info' which is populated either by ORS or the fallback simulated data.
+        # from the 'route_info' which is populated either by ORS or the offline estimate.
 
         total_trip_distance_km = route_info["total_distance_km"]
         total_driving_hours_needed = route_info["total_duration_hours_driving"]
@@ -237,9 +481,6 @@ class TripViewSet(viewsets.ModelViewSet):
         # and enforce breaks. Pickup/dropoff will be handled at the start/end.
         # total_non_driving_on_duty_hours = sum(stop["duration_hrs"] for stop in estimated_stops_and_rests) # This line now needs adjustment
 
-        # Delete existing logs for this trip before regenerating
-        trip.log_entries.all().delete()
-
         # Initialize current time and date for logging
         # current_time is already initialized at the start of the method.
         # start_date = timezone.localdate() # This is now redundant
@@ -252,6 +493,26 @@ class TripViewSet(viewsets.ModelViewSet):
         log_entries_to_create = [] # Batch creation for efficiency
         dynamic_calculated_stops_and_rests = [] # To capture actual breaks and stops from HOS logic
 
+        reported_days = set()
+        def report_completed_days(before_date=None):
+            """
+            Reports the log entries of each day that can no longer change (every day before
+            before_date, or all days), once per day, in the shape of the logs action.
+            """
+            if progress is None:
+                return
+            entries_by_day = {}
+            for entry in materialize(*events_from_entries(log_entries_to_create)):
+                entries_by_day.setdefault(entry.log_date, []).append(entry)
+            for day, entries in sorted(entries_by_day.items()):
+                if day not in reported_days and (before_date is None or day < before_date):
+                    reported_days.add(day)
+                    report("day", {
+                        "day": len(reported_days),
+                        "date": day.isoformat(),
+                        "log_entries": LogEntrySerializer(entries, many=True).data,
+                    })
+
         current_date = start_date # Initialize current_date
 
         # Add initial OFF_DUTY segment until start of "work day"
@@ -265,27 +526,63 @@ class TripViewSet(viewsets.ModelViewSet):
         })
         current_time = initial_off_duty_end
 
-        # Add initial pickup time
-        pickup_start_time = current_time
-        pickup_end_time = current_time + timedelta(hours=PICKUP_DROPOFF_HOURS)
-        log_entries_to_create.append({
-            'trip': trip,
-            'log_date': pickup_start_time.date(),
-            'start_time': pickup_start_time,
-            'end_time': pickup_end_time,
-            'status': DutyStatus.ON_DUTY_NOT_DRIVING
-        })
-        dynamic_calculated_stops_and_rests.append({
-            "type": "pickup",
-            "location": trip.pickup_location,
-            "duration_hrs": PICKUP_DROPOFF_HOURS,
-            "time": pickup_start_time.isoformat(),
-            "latitude": pickup_lat, # Include geocoded latitude
-            "longitude": pickup_lon # Include geocoded longitude
-        })
-        on_duty_hours_today += PICKUP_DROPOFF_HOURS
-        on_duty_hours_cycle += PICKUP_DROPOFF_HOURS
-        current_time = pickup_end_time
+        if not waypoint_stops:
+            # Single pickup/dropoff trips log the pickup before driving. Multi-stop trips
+            # log each waypoint's stop when the driving reaches it (see arrive_at_waypoints).
+            pickup_start_time = current_time
+            pickup_end_time = current_time + timedelta(hours=PICKUP_DROPOFF_HOURS)
+            log_entries_to_create.append({
+                'trip': trip,
+                'log_date': pickup_start_time.date(),
+                'start_time': pickup_start_time,
+                'end_time': pickup_end_time,
+                'status': DutyStatus.ON_DUTY_NOT_DRIVING
+            })
+            dynamic_calculated_stops_and_rests.append({
+                "type": "pickup",
+                "location": trip.pickup_location,
+                "duration_hrs": PICKUP_DROPOFF_HOURS,
+                "time": pickup_start_time.isoformat(),
+                "latitude": pickup_lat, # Include geocoded latitude
+                "longitude": pickup_lon # Include geocoded longitude
+            })
+            on_duty_hours_today += PICKUP_DROPOFF_HOURS
+            on_duty_hours_cycle += PICKUP_DROPOFF_HOURS
+            current_time = pickup_end_time
+
+        def arrive_at_waypoints():
+            """
+            Logs the on-duty stop at every waypoint reached by the driving done so far.
+            Returns True if any stop was logged.
+            """
+            nonlocal current_time, on_duty_hours_today, on_duty_hours_cycle, driving_hours_this_trip
+            arrived = False
+            while waypoint_stops and driving_hours_this_trip >= waypoint_stops[0]["at_driving_hours"] - 1e-6:
+                stop = waypoint_stops.pop(0)
+                driving_hours_this_trip = max(driving_hours_this_trip, stop["at_driving_hours"]) # Absorb float drift
+                stop_end_time = current_time + timedelta(hours=stop["duration_hrs"])
+                log_entries_to_create.append({
+                    'trip': trip,
+                    'log_date': current_time.date(),
+                    'start_time': current_time,
+                    'end_time': stop_end_time,
+                    'status': DutyStatus.ON_DUTY_NOT_DRIVING
+                })
+                dynamic_calculated_stops_and_rests.append({
+                    "type": stop["type"],
+                    "location": stop["location"],
+                    "duration_hrs": stop["duration_hrs"],
+                    "time": current_time.isoformat(),
+                    "latitude": stop["latitude"],
+                    "longitude": stop["longitude"]
+                })
+                on_duty_hours_today += stop["duration_hrs"]
+                on_duty_hours_cycle += stop["duration_hrs"]
+                current_time = stop_end_time
+                arrived = True
+            return arrived
+
+        arrive_at_waypoints() # Stops at the starting location, if any
 
         next_fuel_stop_km = FUELING_INTERVAL_KM # Track next fueling point
 
@@ -310,6 +607,7 @@ class TripViewSet(viewsets.ModelViewSet):
                     })
                 
                 current_date = current_time.date() # Update current_date for the loop
+                report_completed_days(before_date=current_date)
                 on_duty_hours_today = 0.0 # Reset for new day
 
                 # Ensure 10 hours off duty before next driving shift starts
@@ -332,12 +630,14 @@ class TripViewSet(viewsets.ModelViewSet):
                 total_driving_hours_needed - driving_hours_this_trip, # Remaining trip driving
                 MAX_DRIVING_HOURS_DAY - (on_duty_hours_today if current_time.date() == start_date else 0), # Simplified 11-hour rule for day
                 MAX_ON_DUTY_HOURS_DAY - on_duty_hours_today, # 14-hour rule
-                MAX_ON_DUTY_HOURS_CYCLE - on_duty_hours_cycle # 70-hour rule
+                MAX_ON_DUTY_HOURS_CYCLE - on_duty_hours_cycle, # 70-hour rule
+                # Multi-stop trips: stop driving at the next waypoint
+                waypoint_stops[0]["at_driving_hours"] - driving_hours_this_trip if waypoint_stops else float('inf')
             )
 
             # Ensure 30-minute break if driving more than 8 consecutive hours (simplified)
             # This is a basic implementation. Real HOS is more complex for break placement.
-            if driving_hours_this_trip > 0 and (on_duty_hours_today > 8 and on_duty_hours_today - drive_duration_hours <= 8):
+            if driving_hours_this_trip > 0 and (on_duty_hours_today > MAX_DRIVING_HOURS_BEFORE_BREAK and on_duty_hours_today - drive_duration_hours <= MAX_DRIVING_HOURS_BEFORE_BREAK):
                 break_start = current_time
                 break_end = break_start + timedelta(hours=MIN_BREAK_HOURS)
                 log_entries_to_create.append({
@@ -347,15 +647,19 @@ class TripViewSet(viewsets.ModelViewSet):
                     'end_time': break_end,
                     'status': DutyStatus.OFF_DUTY # Break is off-duty
                 })
-                # Add placeholder coordinates for rest stops
-                dynamic_calculated_stops_and_rests.append({
+                rest_stop = {
                     "type": "rest",
                     "location": f"Break on {break_start.date()}",
                     "duration_hrs": MIN_BREAK_HOURS,
                     "time": break_start.isoformat(),
-                    "latitude": pickup_lat, # Using pickup_lat/lon as a placeholder
-                    "longitude": pickup_lon # Using pickup_lat/lon as a placeholder
-                })
+                    "latitude": pickup_lat, # Placeholder when there is no route geometry
+                    "longitude": pickup_lon
+                }
+                if route_path:
+                    # Position along the route is proportional to the driving done so far
+                    distance_along_path_km = route_path.length_km * driving_hours_this_trip / total_driving_hours_needed
+                    snap_stop(rest_stop, route_path, distance_along_path_km)
+                dynamic_calculated_stops_and_rests.append(rest_stop)
                 current_time = break_end
                 on_duty_hours_today += MIN_BREAK_HOURS # Breaks contribute to 14-hour window
                 on_duty_hours_cycle += MIN_BREAK_HOURS
@@ -389,10 +693,13 @@ class TripViewSet(viewsets.ModelViewSet):
                     # If no driving possible, move to off-duty or next day
                     pass # Handled by the off-duty logic below
 
+            if arrive_at_waypoints():
+                continue # Keep driving towards the next stop if today's hours allow
+
             # If driving finished, or hit limits, go off-duty until the next day or new shift
             if driving_hours_this_trip < total_driving_hours_needed:
                 # Add OFF_DUTY for remaining time in current day
-                if current_time.date() == current_date and current_time.hour < 23:
+                if current_time.date() == current_date:
                     off_duty_start = current_time
                     off_duty_end = get_aware_datetime(datetime.combine(current_time.date(), datetime.max.time())) # End of day
                     if off_duty_end > off_duty_start: # Ensure segment has duration
@@ -424,23 +731,7 @@ class TripViewSet(viewsets.ModelViewSet):
                     'end_time': end_of_last_logged_day,
                     'status': DutyStatus.OFF_DUTY
                 })
-
-        # Create all log entries in bulk
-        LogEntry.objects.bulk_create([
-            LogEntry(
-                trip=entry['trip'],
-                log_date=entry['log_date'],
-                start_time=entry['start_time'],
-                end_time=entry['end_time'],
-                status=entry['status']
-            ) for entry in log_entries_to_create
-        ])
-
-        print(f"Generated {len(log_entries_to_create)} log entries.")
-
-        # After generating, re-fetch the trip to include the new log entries in the response
-        trip.refresh_from_db()
-        serializer = self.get_serializer(trip)
+        report_completed_days()
 
         # Merge dynamically calculated stops from HOS with initial ORS-derived stops
         # Ensure unique stops or add logic for detailed merging if necessary.
@@ -460,25 +751,89 @@ class TripViewSet(viewsets.ModelViewSet):
         unique_stops.sort(key=lambda x: x.get("time", ""))
         route_info["estimated_stops_and_rests"] = unique_stops
 
+        # Only status changes are stored; the per-day entries are materialized on read
+        status_events, log_end_time = events_from_entries(log_entries_to_create)
+
+        # Replace the trip's logs in one transaction so concurrent readers never see a
+        # half-written set. The trip row is locked (SELECT ... FOR UPDATE on Postgres;
+        # SQLite takes its write lock at BEGIN IMMEDIATE) so regenerations queue up.
+        with transaction.atomic():
+            Trip.objects.select_for_update().only('pk').get(pk=trip.pk)
 
-        return Response({
-            "message": "Route and ELD logs calculated successfully using OpenRouteService.",
+            # Delete existing logs for this trip before regenerating
+            trip.status_events.all().delete()
+            trip.archived_days.all().delete()
+
+            # Create all status changes in bulk
+            DutyStatusEvent.objects.bulk_create([
+                DutyStatusEvent(trip=trip, timestamp=timestamp, status=status_value)
+                for timestamp, status_value in status_events
+            ])
+
+            if waypoints:
+                Waypoint.objects.bulk_update(waypoints, ['sequence']) # Optimised visiting order
+
+            # Keep the route so it can be served again by the route action without recalculating
+            Route.objects.update_or_create(trip=trip, defaults={
+                "total_distance_km": route_info.get("total_distance_km", 0),
+                "total_duration_hours_driving": route_info.get("total_duration_hours_driving", 0),
+                "encoded_geometry": polyline.encode(route_info.get("path_coordinates", [])),
+                "stops": route_info.get("estimated_stops_and_rests", []),
+            })
+
+            # Store where the log ends, and bump the trip version so caches keyed on updated_at
+            # (cached responses, graph geometry) are retired
+            trip.log_end_time = log_end_time
+            trip.save(update_fields=['updated_at', 'log_end_time'] + geocoded_fields)
+
+        print(f"Generated {len(log_entries_to_create)} log entries ({len(status_events)} status changes).")
+        report("saved", {"days": len(reported_days), "status_changes": len(status_events)})
+
+        # After generating, re-fetch the trip to include the new log entries in the response
+        trip.refresh_from_db()
+        serializer = self.get_serializer(trip)
+
+        return {
+            "message": (
+                "Route and ELD logs calculated using an offline route estimate (OpenRouteService was unavailable)."
+                if route_info.get("estimated") else "Route and ELD logs calculated successfully using OpenRouteService."
+            ),
             "route_info": {
                 "path_coordinates": route_info.get("path_coordinates", []),
                 "total_distance_km": route_info.get("total_distance_km", 0),
                 "total_duration_hours_driving": route_info.get("total_duration_hours_driving", 0),
-                "estimated_stops_and_rests": route_info.get("estimated_stops_and_rests", [])
+                "estimated_stops_and_rests": route_info.get("estimated_stops_and_rests", []),
+                "estimated": route_info.get("estimated", False), # True when ORS couldn't route the trip
             },
             "trip_details": serializer.data
-        }, status=status.HTTP_200_OK)
+        }
+
+    @action(detail=True, methods=['get'])
+    def route(self, request, pk=None):
+        """
+        Returns the stored route of a trip (distance, duration, stops and geometry) without
+        calling ORS. Pass ?geometry=encoded to get the geometry as an encoded polyline.
+        """
+        trip = self.get_object() # An unknown trip is a 404 like everywhere else
+        route = Route.objects.filter(trip=trip).first()
+        if route is None:
+            return Response({"error": "Route has not been calculated for this trip yet."}, status=status.HTTP_404_NOT_FOUND)
+        serializer_class = EncodedRouteSerializer if request.query_params.get('geometry') == 'encoded' else RouteSerializer
+        return Response(serializer_class(route).data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['get'])
     def logs(self, request, pk=None):
         """
         Returns all log entries for a specific trip, grouped by date.
         """
+        cached_logs = None
+        if not self._pinned: # See retrieve
+            cached_logs = response_cache.get_response(response_cache.LOGS, pk, response_cache.trip_version(pk))
+        if cached_logs is not None:
+            return Response(cached_logs, status=status.HTTP_200_OK)
+
         trip = self.get_object()
-        log_entries = trip.log_entries.all().order_by('log_date', 'start_time')
+        log_entries = get_trip_segments(trip)
 
         # Group log entries by date for easier frontend rendering
         logs_by_date = {}
@@ -488,4 +843,27 @@ class TripViewSet(viewsets.ModelViewSet):
                 logs_by_date[date_str] = []
             logs_by_date[date_str].append(LogEntrySerializer(entry).data)
 
-        return Response(logs_by_date, status=status.HTTP_200_OK)
\ No newline at end of file
+        response_cache.set_response(response_cache.LOGS, trip.pk, trip.updated_at, logs_by_date)
+        return Response(logs_by_date, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def graph(self, request, pk=None):
+        """
+        Returns the precomputed duty graph geometry (step-line vertices and per-row
+        totals) for each day of a trip, or for a single day with ?date=YYYY-MM-DD.
+        """
+        trip = self.get_object()
+        graphs = get_trip_graphs(trip)
+
+        date_param = request.query_params.get('date')
+        if not date_param:
+            return Response(graphs, status=status.HTTP_200_OK)
+
+        try:
+            requested_date = date.fromisoformat(date_param)
+        except ValueError:
+            return Response({"error": "Invalid date. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        day_graph = graphs.get(requested_date.isoformat())
+        if day_graph is None:
+            return Response({"error": f"No logs for {requested_date.isoformat()}."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(day_graph, status=status.HTTP_200_OK)